@@ -1,12 +1,21 @@
 # Copyright Epic Games, Inc. All Rights Reserved.
 
+import re as _re
 import sys as _sys
+import ast as _ast
 import json as _json
+import zlib as _zlib
+import base64 as _base64
 import uuid as _uuid
 import time as _time
+import heapq as _heapq
+import types as _types
+import collections as _collections
 import socket as _socket
 import logging as _logging
+import selectors as _selectors
 import threading as _threading
+from concurrent import futures as _futures
 
 def hello():
     _logging.debug("Hello from remote")
@@ -20,9 +29,30 @@ _TYPE_OPEN_CONNECTION = 'open_connection'  # Open a TCP command connection with
 _TYPE_CLOSE_CONNECTION = 'close_connection'  # Close any active TCP command connection (UDP)
 _TYPE_COMMAND = 'command'  # Execute a remote Python command (TCP)
 _TYPE_COMMAND_RESULT = 'command_result'  # Result of executing a remote Python command (TCP)
+_TYPE_DIRECTORY_REGISTER = 'directory_register'  # Register remote nodes with a directory service (UDP unicast, not part of the UE protocol)
+_TYPE_DIRECTORY_QUERY = 'directory_query'  # Request the remote nodes registered with a directory service (UDP unicast, not part of the UE protocol)
+_TYPE_DIRECTORY_NODES = 'directory_nodes'  # The remote nodes registered with a directory service, in response to a query (UDP unicast, not part of the UE protocol)
 
 _NODE_PING_SECONDS = 1  # Number of seconds to wait before sending another "ping" message to discover remote notes
 _NODE_TIMEOUT_SECONDS = 5  # Number of seconds to wait before timing out a remote node that was discovered via UDP and has stopped sending "pong" responses
+_NODE_PING_BURST_SECONDS = (0, 0.05, 0.15, 0.35)  # Offsets (from the start of discovery) at which to send the initial burst of "ping" messages, before settling into `_NODE_PING_SECONDS`
+_BROADCAST_RECEIVE_BYTES = 65536  # Number of bytes to request from the UDP sockets per receive call (the largest possible datagram)
+_NODE_PING_HISTORY = 8  # Number of recently sent "ping" messages to match "pong" responses against when measuring round-trip times
+_NODE_RTT_SMOOTHING = 0.2  # Weight given to each new "ping" round-trip sample in the smoothed round-trip time of a remote node
+_NODE_HEALTH_RTT_SECONDS = 0.005  # Smoothed round-trip time (in seconds) at which the health score of a remote node is 0.5
+_NODE_INDEX_KEYS = ('project_name', 'engine_version', 'machine')  # The "pong" fields that remote nodes are indexed by
+_COMMAND_RECEIVE_CHUNK_BYTES = 65536  # Number of bytes to request from the TCP command socket per receive call
+_COMMAND_PIPELINE_DEPTH = 32  # Default number of "command" messages that may be sent ahead of their "command_result" when running a batch of commands
+_COMMAND_HANDSHAKE_TIMEOUT_SECONDS = 30  # Default number of seconds to wait for the remote party to connect a command connection
+_COMMAND_HANDSHAKE_RETRY_SECONDS = 0.05  # Number of seconds to wait before the first re-broadcast of "open_connection" (this doubles after each re-broadcast)
+_COMMAND_HANDSHAKE_MAX_RETRY_SECONDS = 2  # Maximum number of seconds to wait between re-broadcasts of "open_connection"
+_SESSION_KEEPALIVE_SECONDS = 10  # Default number of idle seconds after which a session sends a no-op command to keep its command connection warm
+_SESSION_KEEPALIVE_TIMEOUT_SECONDS = 5  # Default number of seconds to wait for the result of a keep-alive command before considering the connection half-open
+_SESSION_RECONNECT_TIMEOUT_SECONDS = 30  # Default number of seconds a session waits for a matching remote node to reappear when reconnecting
+_SESSION_CONNECT_TIMEOUT_SECONDS = 5  # Default number of seconds a session waits for each candidate remote node to connect when reconnecting
+_SESSION_MATCH_KEYS = ('project_name', 'project_root', 'engine_version', 'engine_root')  # The "pong" fields that a replacement remote node must share with the original one for a session to reconnect to it
+_POOL_MAX_WORKERS = 32  # Default number of commands that a connection pool will run in parallel
+_COMPRESS_THRESHOLD_BYTES = 16384  # Size (in bytes) above which a command or result is sent compressed, when compression is requested
 
 DEFAULT_MULTICAST_TTL = 0  # Multicast TTL (0 is limited to the local host, 1 is limited to the local subnet)
 DEFAULT_MULTICAST_GROUP_ENDPOINT = ('239.0.0.1',
@@ -30,6 +60,9 @@ DEFAULT_MULTICAST_GROUP_ENDPOINT = ('239.0.0.1',
 DEFAULT_MULTICAST_BIND_ADDRESS = '0.0.0.0'  # The adapter address that the UDP multicast socket should bind to, or 0.0.0.0 to bind to all adapters (must match the "Multicast Bind Address" setting in the Python plugin)
 DEFAULT_COMMAND_ENDPOINT = ('127.0.0.1',
                             6776)  # The endpoint tuple for the TCP command connection hosted by this client (that the remote client will connect to)
+DEFAULT_DIRECTORY_ENDPOINT = None  # The endpoint tuple of a directory service to query for remote nodes over unicast (in addition to multicast discovery), or None to only use multicast
+DEFAULT_MULTICAST_DISCOVERY = True  # Whether to send "ping" messages to the multicast group to discover remote nodes (this can be disabled when a directory service is used)
+DEFAULT_RECEIVE_BUFFER_SIZE = 2097152  # The receive buffer size (in bytes) of the TCP command socket (should match the "Remote Execution Receive Buffer Size" setting in the Python plugin)
 
 # Execution modes (these must match the names given to LexToString for EPythonCommandExecutionMode in IPythonScriptPlugin.h)
 MODE_EXEC_FILE = 'ExecuteFile'  # Execute the Python command as a file. This allows you to execute either a literal Python script containing multiple statements, or a file with optional arguments
@@ -47,6 +80,84 @@ class RemoteExecutionConfig(object):
         self.multicast_group_endpoint = DEFAULT_MULTICAST_GROUP_ENDPOINT
         self.multicast_bind_address = DEFAULT_MULTICAST_BIND_ADDRESS
         self.command_endpoint = DEFAULT_COMMAND_ENDPOINT
+        self.receive_buffer_size = DEFAULT_RECEIVE_BUFFER_SIZE
+        self.directory_endpoint = DEFAULT_DIRECTORY_ENDPOINT
+        self.multicast_discovery = DEFAULT_MULTICAST_DISCOVERY
+
+
+class RemoteExecutionTimeoutError(RuntimeError):
+    '''
+    Raised when a command doesn't complete before its timeout.
+    '''
+
+
+class RemoteExecutionCancelledError(RuntimeError):
+    '''
+    Raised when a command is cancelled (see `CancellationToken`) before it completes.
+    '''
+
+
+class CancellationToken(object):
+    '''
+    A token that can cancel the commands it was given to, from any thread. Once cancelled, a token stays cancelled.
+    A cancelled command stops waiting for its result, and the result is discarded when it arrives, before the result of the next command on the same connection.
+    Call `close` once the token is no longer needed, to free the socket it uses to wake waiting commands (this is also done when the token is garbage collected).
+    '''
+
+    def __init__(self):
+        self._cancelled = False
+        self._lock = _threading.Lock()
+        self._wake_socket = None
+        self._wake_send_socket = None
+
+    @property
+    def cancelled(self):
+        '''
+        Check whether this token has been cancelled.
+
+        Returns:
+            bool: True if this token has been cancelled, False otherwise.
+        '''
+        return self._cancelled
+
+    def cancel(self):
+        '''
+        Cancel every command waiting on this token, and any command given this token in the future.
+        '''
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            if self._wake_send_socket:
+                self._wake_send_socket.send(b'\0')
+
+    def close(self):
+        '''
+        Close the socket used to wake commands waiting on this token (the token can still be used afterwards, and opens a new socket if needed).
+        '''
+        with self._lock:
+            if self._wake_socket is not None:
+                self._wake_socket.close()
+                self._wake_send_socket.close()
+                self._wake_socket = None
+                self._wake_send_socket = None
+
+    def __del__(self):
+        self.close()
+
+    def _get_wake_socket(self):
+        '''
+        Get a socket that becomes readable once this token is cancelled, so that it can be waited on alongside a command socket.
+
+        Returns:
+            socket.socket: The socket.
+        '''
+        with self._lock:
+            if self._wake_socket is None:
+                self._wake_socket, self._wake_send_socket = _socket.socketpair()
+                if self._cancelled:
+                    self._wake_send_socket.send(b'\0')
+            return self._wake_socket
 
 
 class RemoteExecution(object):
@@ -62,6 +173,9 @@ class RemoteExecution(object):
         self._broadcast_connection = None
         self._command_connection = None
         self._node_id = str(_uuid.uuid4())
+        self._node_found_callbacks = []
+        self._node_lost_callbacks = []
+        self._node_callbacks_lock = _threading.Lock()
 
     @property
     def remote_nodes(self):
@@ -73,11 +187,43 @@ class RemoteExecution(object):
         '''
         return self._broadcast_connection.remote_nodes if self._broadcast_connection else []
 
+    def select_nodes(self, project=None, engine=None, machine=None, idle=None):
+        '''
+        Find the discovered remote "nodes" (UE4 instances running Python) matching the given criteria, using an index of their "pong" data.
+
+        Args:
+            project (string): The project name to match, or None for any project.
+            engine (string): The engine version to match, or None for any engine version.
+            machine (string): The machine name to match, or None for any machine.
+            idle (bool): True to only find nodes that this session has no commands in flight on, False to only find busy nodes, or None for either.
+
+        Returns:
+            list: A dict for each matching node containg the node ID and the other data, healthiest (lowest round-trip time) first.
+        '''
+        nodes = self._broadcast_connection.nodes if self._broadcast_connection else None
+        if nodes is None:
+            return []
+        criteria = dict((key, value) for key, value in (('project_name', project), ('engine_version', engine), ('machine', machine)) if value is not None)
+        return nodes.select_nodes(criteria, idle)
+
+    def get_node_health(self, remote_node_id):
+        '''
+        Get the measured health of a discovered remote node.
+
+        Args:
+            remote_node_id (string): The ID of the remote node.
+
+        Returns:
+            dict: The smoothed "ping" round-trip time in seconds ("rtt"), the health score from 0 to 1 ("health"), and the number of commands this session has in flight on the node ("commands_in_flight"), or None if the node isn't known.
+        '''
+        nodes = self._broadcast_connection.nodes if self._broadcast_connection else None
+        return nodes.get_node_health(remote_node_id) if nodes is not None else None
+
     def start(self):
         '''
         Start the remote execution session. This will begin the discovey process for remote "nodes" (UE4 instances running Python).
         '''
-        self._broadcast_connection = _RemoteExecutionBroadcastConnection(self._config, self._node_id)
+        self._broadcast_connection = _RemoteExecutionBroadcastConnection(self._config, self._node_id, self._handle_node_found, self._handle_node_lost)
         self._broadcast_connection.open()
 
     def stop(self):
@@ -89,6 +235,103 @@ class RemoteExecution(object):
             self._broadcast_connection.close()
             self._broadcast_connection = None
 
+    def add_node_found_callback(self, callback):
+        '''
+        Add a callback to be invoked when a remote "node" (a UE4 instance running Python) is discovered.
+        Callbacks are invoked from the discovery thread, so should return quickly.
+
+        Args:
+            callback (callable): The function to call, with the dict containing the node ID and the other data of the discovered node.
+        '''
+        with self._node_callbacks_lock:
+            self._node_found_callbacks = self._node_found_callbacks + [callback]
+
+    def remove_node_found_callback(self, callback):
+        '''
+        Remove a callback previously added with `add_node_found_callback`.
+
+        Args:
+            callback (callable): The function to remove.
+        '''
+        with self._node_callbacks_lock:
+            self._node_found_callbacks = [c for c in self._node_found_callbacks if c != callback]
+
+    def add_node_lost_callback(self, callback):
+        '''
+        Add a callback to be invoked when a remote "node" (a UE4 instance running Python) times out.
+        Callbacks are invoked from the discovery thread, so should return quickly.
+
+        Args:
+            callback (callable): The function to call, with the dict containing the node ID and the other data of the lost node.
+        '''
+        with self._node_callbacks_lock:
+            self._node_lost_callbacks = self._node_lost_callbacks + [callback]
+
+    def remove_node_lost_callback(self, callback):
+        '''
+        Remove a callback previously added with `add_node_lost_callback`.
+
+        Args:
+            callback (callable): The function to remove.
+        '''
+        with self._node_callbacks_lock:
+            self._node_lost_callbacks = [c for c in self._node_lost_callbacks if c != callback]
+
+    def wait_for_node(self, predicate=None, timeout=None):
+        '''
+        Wait for a remote "node" (a UE4 instance running Python) to be discovered, without polling `remote_nodes`.
+
+        Args:
+            predicate (callable): A function taking the dict containing the node ID and the other data, and returning True if that node is acceptable, or None to accept any node.
+            timeout (float): The maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            dict: The node ID and the other data of the first acceptable node, or None if no acceptable node was discovered before the timeout.
+        '''
+        found = []
+        found_event = _threading.Event()
+
+        def _on_node_found(node):
+            if not found_event.is_set() and (predicate is None or predicate(node)):
+                found.append(node)
+                found_event.set()
+
+        # Register before checking the existing nodes so that a node discovered in between can't be missed
+        self.add_node_found_callback(_on_node_found)
+        try:
+            for node in self.remote_nodes:
+                _on_node_found(node)
+            found_event.wait(timeout)
+        finally:
+            self.remove_node_found_callback(_on_node_found)
+        return found[0] if found else None
+
+    def _handle_node_found(self, node):
+        '''
+        Invoke the node found callbacks for a newly discovered remote node.
+
+        Args:
+            node (dict): The node ID and the other data of the discovered node.
+        '''
+        for callback in self._node_found_callbacks:
+            try:
+                callback(node)
+            except Exception as e:
+                _logger.error('Node found callback failed: {0}'.format(str(e)))
+
+    def _handle_node_lost(self, node):
+        '''
+        Invoke the node lost callbacks for a timed-out remote node.
+
+        Args:
+            node (dict): The node ID and the other data of the lost node.
+        '''
+        for callback in self._node_lost_callbacks:
+            try:
+                callback(node)
+            except Exception as e:
+                _logger.error('Node lost callback failed: {0}'.format(str(e)))
+
     def has_command_connection(self):
         '''
         Check whether the remote execution session has an active command connection.
@@ -98,15 +341,20 @@ class RemoteExecution(object):
         '''
         return self._command_connection is not None
 
-    def open_command_connection(self, remote_node_id):
+    def open_command_connection(self, remote_node_id, timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
         '''
         Open a command connection to the given remote "node" (a UE4 instance running Python), closing any command connection that may currently be open.
 
         Args:
             remote_node_id (string): The ID of the remote node (this can be obtained by querying `remote_nodes`).
+            timeout (float): The maximum number of seconds to wait for the remote node to connect.
+
+        Returns:
+            dict: The time taken by each phase of the handshake (see `_RemoteExecutionCommandConnection.handshake_timing`).
         '''
         self._command_connection = _RemoteExecutionCommandConnection(self._config, self._node_id, remote_node_id)
-        self._command_connection.open(self._broadcast_connection)
+        self._command_connection.open(self._broadcast_connection, timeout)
+        return self._command_connection.handshake_timing
 
     def close_command_connection(self):
         '''
@@ -116,7 +364,21 @@ class RemoteExecution(object):
             self._command_connection.close(self._broadcast_connection)
             self._command_connection = None
 
-    def run_command(self, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False):
+    def reset_command_connection(self, timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
+        '''
+        Close the current command connection and open a new one to the same remote node, discarding the results of any commands that timed out or were cancelled.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait for the remote node to connect.
+
+        Returns:
+            dict: The time taken by each phase of the handshake (see `_RemoteExecutionCommandConnection.handshake_timing`).
+        '''
+        remote_node_id = self._command_connection.remote_node_id
+        self.close_command_connection()
+        return self.open_command_connection(remote_node_id, timeout)
+
+    def run_command(self, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, compress=False, timeout=None, cancel_token=None):
         '''
         Run a command remotely based on the current command connection.
 
@@ -125,68 +387,729 @@ class RemoteExecution(object):
             unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
             exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
             raise_on_failure (bool): True to raise a RuntimeError if the command fails on the remote target.
+            compress (bool): True to send the command compressed if it is large, and (for MODE_EVAL_STATEMENT) to have a large result sent back compressed. This works with a stock remote party, as the command is wrapped in a small bootstrap that decompresses it.
+            timeout (float): The maximum number of seconds to wait for the command to complete, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command while it is waiting for its result, or None.
 
         Returns:
             dict: The result from running the remote command (see `command_result` from the protocol definition).
         '''
-        data = self._command_connection.run_command(command, unattended, exec_mode)
+        deadline = _time_now() + timeout if timeout is not None else None
+        self._reset_broken_command_connection(deadline)
+        if compress:
+            data = _decompress_result(self._command_connection.run_command(_compress_command(command, exec_mode), unattended, exec_mode, deadline, cancel_token), exec_mode)
+        else:
+            data = self._command_connection.run_command(command, unattended, exec_mode, deadline, cancel_token)
         if raise_on_failure and not data['success']:
             raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
         return data
 
+    def run_commands(self, commands, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, max_in_flight=_COMMAND_PIPELINE_DEPTH):
+        '''
+        Run a batch of commands remotely based on the current command connection.
+        The commands are written back-to-back onto the command connection without waiting for each result, so the cost of a round trip is paid once per batch rather than once per command.
+
+        Args:
+            commands (iterable): The Python commands to run remotely, in order.
+            unattended (bool): True to run these commands in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            raise_on_failure (bool): True to raise a RuntimeError if a command fails on the remote target.
+            max_in_flight (int): The maximum number of commands that may be awaiting a result at any one time, or None for no limit.
+
+        Returns:
+            generator: The results from running the remote commands, in the same order as the commands (see `command_result` from the protocol definition).
+        '''
+        self._reset_broken_command_connection()
+        results = self._command_connection.run_commands(commands, unattended, exec_mode, max_in_flight)
+        try:
+            for data in results:
+                if raise_on_failure and not data['success']:
+                    raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
+                yield data
+        finally:
+            results.close()
+
+
+    def _reset_broken_command_connection(self, deadline=None):
+        '''
+        Reset the command connection if a command was abandoned part way through being sent, as the remote party can't make sense of anything else sent on it.
+
+        Args:
+            deadline (float): The timestamp by which the command that needs the connection must complete, or None to wait up to the handshake timeout.
+        '''
+        if not self._command_connection.is_broken:
+            return
+        if deadline is None:
+            self.reset_command_connection()
+            return
+        try:
+            self.reset_command_connection(max(deadline - _time_now(), 0))
+        except RemoteExecutionTimeoutError:
+            raise
+        except RuntimeError as e:
+            if _time_now() < deadline:
+                raise
+            raise RemoteExecutionTimeoutError('Command timed out waiting for the command connection to reset! {0}'.format(e))
+
+
+class RemoteExecutionSession(object):
+    '''
+    A persistent command connection to a remote "node" (a UE4 instance running Python), that keeps itself warm and reconnects transparently if it drops.
+    The session uses its own command connection (on an ephemeral port), so it can be used alongside any command connection opened on the remote execution session.
+
+    While idle, a no-op command is run every `keepalive_seconds` to keep the connection warm and to detect half-open sockets.
+    When the connection is lost, the session reconnects to the same node ID if it is still discovered, or otherwise to a node whose "pong" data matches the original node for each of `match_keys` (eg, an editor restarted on the same project).
+
+    Args:
+        remote_execution (RemoteExecution): The started remote execution session used to discover the remote nodes.
+        remote_node_id (string): The ID of the remote node to connect to (this can be obtained by querying `remote_nodes`).
+        keepalive_seconds (float): The number of idle seconds after which a keep-alive command is sent, or None to disable keep-alive.
+        keepalive_timeout (float): The number of seconds to wait for the result of a keep-alive command.
+        reconnect_timeout (float): The number of seconds to wait for a matching remote node when reconnecting.
+        connect_timeout (float): The number of seconds to wait for each candidate remote node to connect, before trying another matching node.
+        match_keys (tuple): The "pong" data fields that a replacement remote node must match.
+    '''
+
+    def __init__(self, remote_execution, remote_node_id, keepalive_seconds=_SESSION_KEEPALIVE_SECONDS, keepalive_timeout=_SESSION_KEEPALIVE_TIMEOUT_SECONDS,
+                 reconnect_timeout=_SESSION_RECONNECT_TIMEOUT_SECONDS, connect_timeout=_SESSION_CONNECT_TIMEOUT_SECONDS, match_keys=_SESSION_MATCH_KEYS):
+        self._remote_execution = remote_execution
+        self._remote_node_id = remote_node_id
+        self._keepalive_seconds = keepalive_seconds
+        self._keepalive_timeout = keepalive_timeout
+        self._reconnect_timeout = reconnect_timeout
+        self._connect_timeout = connect_timeout
+        self._match_data = {}
+        for node in remote_execution.remote_nodes:
+            if node['node_id'] == remote_node_id:
+                self._match_data = dict((key, node[key]) for key in match_keys if key in node)
+        self._connection = None
+        self._connection_lock = _threading.RLock()  # Held while the command connection is used
+        self._reconnect_lock = _threading.Lock()  # Held while the command connection is opened, so the keep-alive thread can reconnect without holding the connection lock
+        self._last_used = _time_now()
+        self._running = True
+        self._wake_event = _threading.Event()
+        self._keepalive_thread = None
+        self._ensure_connected()
+        if keepalive_seconds:
+            self._keepalive_thread = _threading.Thread(target=self._run_keepalive_thread)
+            self._keepalive_thread.daemon = True
+            self._keepalive_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def remote_node_id(self):
+        '''
+        Get the ID of the remote node that this session is currently connected to (this changes if the session reconnects to a different node).
+
+        Returns:
+            string: The ID of the remote node.
+        '''
+        return self._remote_node_id
+
+    def close(self):
+        '''
+        Close this session, and its command connection.
+        '''
+        self._running = False
+        self._wake_event.set()
+        if self._keepalive_thread:
+            self._keepalive_thread.join()
+            self._keepalive_thread = None
+        with self._connection_lock:
+            self._disconnect()
+
+    def run_command(self, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, idempotent=False, compress=False, timeout=None, cancel_token=None):
+        '''
+        Run a command remotely on this session, connecting (or reconnecting) first if needed.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            raise_on_failure (bool): True to raise a RuntimeError if the command fails on the remote target.
+            idempotent (bool): True if the command is safe to run more than once, so that it can be replayed on a new connection if the connection drops while it is in flight.
+            compress (bool): True to send the command compressed if it is large, and (for MODE_EVAL_STATEMENT) to have a large result sent back compressed (see `RemoteExecution.run_command`).
+            timeout (float): The maximum number of seconds to wait for the command to complete, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command while it is waiting for its result, or None.
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition).
+        '''
+        deadline = _time_now() + timeout if timeout is not None else None
+        if compress:
+            command = _compress_command(command, exec_mode)
+        with self._connection_lock:
+            self._ensure_connected(deadline)
+            try:
+                data = self._connection.run_command(command, unattended, exec_mode, deadline, cancel_token)
+            except (RemoteExecutionTimeoutError, RemoteExecutionCancelledError):
+                # The command is still running (or queued) on the remote party, so it is never replayed, and the connection is only replaced if it can't be drained
+                if self._connection.is_broken:
+                    self._disconnect()
+                raise
+            except (RuntimeError, _socket.error):
+                # The command may or may not have run before the connection dropped, so it can only be replayed if it is safe to run again
+                self._disconnect()
+                if not idempotent:
+                    raise
+                _logger.debug('Replaying command on new connection to remote node after connection to {0} dropped'.format(self._remote_node_id))
+                self._ensure_connected(deadline)
+                try:
+                    data = self._connection.run_command(command, unattended, exec_mode, deadline, cancel_token)
+                except (RemoteExecutionTimeoutError, RemoteExecutionCancelledError):
+                    if self._connection.is_broken:
+                        self._disconnect()
+                    raise
+                except (RuntimeError, _socket.error):
+                    self._disconnect()
+                    raise
+            self._last_used = _time_now()
+        if compress:
+            _decompress_result(data, exec_mode)
+        if raise_on_failure and not data['success']:
+            raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
+        return data
+
+    def _ensure_connected(self, command_deadline=None):
+        '''
+        Open the command connection if it isn't open, finding the remote node to (re)connect to.
+
+        Args:
+            command_deadline (float): The timestamp by which the command that needs the connection must complete, or None to wait up to the reconnect timeout.
+        '''
+        if self._connection:
+            return
+        if not self._reconnect_lock.acquire(timeout=max(command_deadline - _time_now(), 0) if command_deadline is not None else -1):
+            raise RemoteExecutionTimeoutError('Command timed out waiting for the session to reconnect!')
+        try:
+            if not self._connection:
+                self._connect(command_deadline)
+        finally:
+            self._reconnect_lock.release()
+
+    def _connect(self, command_deadline=None):
+        '''
+        Open the command connection, finding the remote node to (re)connect to (the reconnect lock must be held).
+
+        Args:
+            command_deadline (float): The timestamp by which the command that needs the connection must complete, or None to wait up to the reconnect timeout.
+        '''
+        # A node that has just died stays discovered until it times out, so any node that fails to connect is skipped in favor of other matching nodes
+        deadline = _time_now() + self._reconnect_timeout
+        if command_deadline is not None and command_deadline < deadline:
+            deadline = command_deadline
+        failed_node_ids = set()
+        while True:
+            node = self._remote_execution.wait_for_node(
+                lambda node: node['node_id'] not in failed_node_ids and self._is_matching_node(node), max(deadline - _time_now(), 0))
+            if not node:
+                if deadline == command_deadline:
+                    raise RemoteExecutionTimeoutError('Command timed out waiting for the session to reconnect!')
+                raise RuntimeError('Failed to find a remote node to connect the session to!')
+            connection = _RemoteExecutionCommandConnection(self._remote_execution._config, self._remote_execution._node_id, node['node_id'], ephemeral_port=True)
+            try:
+                connection.open(self._remote_execution._broadcast_connection, min(self._connect_timeout, max(deadline - _time_now(), 0)))
+                break
+            except RuntimeError:
+                connection.close(self._remote_execution._broadcast_connection)
+                failed_node_ids.add(node['node_id'])
+        connection._command_channel_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_KEEPALIVE, 1)
+        self._connection = connection
+        self._remote_node_id = node['node_id']
+        self._last_used = _time_now()
+
+    def _is_matching_node(self, node):
+        '''
+        Check whether the given remote node can be used by this session.
+
+        Args:
+            node (dict): The node ID and the other data of the remote node.
+
+        Returns:
+            bool: True if the node is the original node, or matches its "pong" data, False otherwise.
+        '''
+        if node['node_id'] == self._remote_node_id:
+            return True
+        return bool(self._match_data) and all(node.get(key) == value for key, value in self._match_data.items())
+
+    def _disconnect(self):
+        '''
+        Close the command connection, if it is open.
+        '''
+        if self._connection:
+            broadcast_connection = self._remote_execution._broadcast_connection
+            if broadcast_connection:
+                self._connection.close(broadcast_connection)
+            self._connection = None
+
+    def _run_keepalive_thread(self):
+        '''
+        Main loop for the keep-alive thread that runs a no-op command whenever the session has been idle for `keepalive_seconds`.
+        '''
+        while self._running:
+            self._wake_event.wait(max(self._last_used + self._keepalive_seconds - _time_now(), 0))
+            if not self._running:
+                break
+            with self._connection_lock:
+                if not self._connection:
+                    # There is nothing to keep warm until the next command reconnects
+                    self._last_used = _time_now()
+                    continue
+                if (self._last_used + self._keepalive_seconds) > _time_now():
+                    continue
+                try:
+                    self._connection.run_command('None', True, MODE_EVAL_STATEMENT, _time_now() + self._keepalive_timeout)
+                    self._last_used = _time_now()
+                    continue
+                except (RuntimeError, _socket.error):
+                    # A timeout or error means the connection is half-open or dropped, so reconnect now rather than on the next command
+                    _logger.debug('Keep-alive failed for remote node {0}, reconnecting'.format(self._remote_node_id))
+                    self._disconnect()
+            # The connection lock is released while reconnecting, so a command only waits for the reconnect if it needs the connection
+            try:
+                self._ensure_connected()
+            except Exception as e:
+                _logger.debug('Failed to reconnect to remote node: {0}'.format(str(e)))
+                self._last_used = _time_now()
+
+
+class RemoteExecutionPool(object):
+    '''
+    A pool of command connections to many remote "nodes" (UE4 instances running Python) at once, that can fan commands out to them in parallel.
+    Each command connection listens on its own ephemeral port, and connections are opened on first use and kept open until closed.
+
+    Args:
+        remote_execution (RemoteExecution): The started remote execution session used to discover the remote nodes.
+        max_workers (int): The maximum number of commands to run in parallel.
+        connect_timeout (float): The maximum number of seconds to wait for a remote node to connect each command connection.
+    '''
+
+    def __init__(self, remote_execution, max_workers=_POOL_MAX_WORKERS, connect_timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
+        self._remote_execution = remote_execution
+        self._connect_timeout = connect_timeout
+        self._connections = {}
+        self._connection_locks = {}
+        self._connections_lock = _threading.Lock()
+        self._executor = _futures.ThreadPoolExecutor(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def remote_node_ids(self):
+        '''
+        Get the IDs of the remote nodes that currently have an open command connection in this pool.
+
+        Returns:
+            list: A list of node IDs.
+        '''
+        with self._connections_lock:
+            return list(self._connections.keys())
+
+    def open_command_connections(self, remote_node_ids):
+        '''
+        Open command connections to the given remote nodes in parallel, skipping any that are already open.
+
+        Args:
+            remote_node_ids (list): The IDs of the remote nodes (these can be obtained by querying `remote_nodes`).
+
+        Returns:
+            dict: The exception raised while opening the connection, keyed by the ID of each remote node that failed to connect.
+        '''
+        pending = dict((remote_node_id, self._executor.submit(self._get_command_connection, remote_node_id)) for remote_node_id in remote_node_ids)
+        errors = {}
+        for remote_node_id, future in pending.items():
+            error = future.exception()
+            if error is not None:
+                errors[remote_node_id] = error
+        return errors
+
+    def close_command_connection(self, remote_node_id):
+        '''
+        Close the command connection to the given remote node, if it is open.
+
+        Args:
+            remote_node_id (string): The ID of the remote node.
+        '''
+        with self._connections_lock:
+            connection = self._connections.pop(remote_node_id, None)
+            connection_lock = self._connection_locks.pop(remote_node_id, None)
+        if connection:
+            with connection_lock:
+                connection.close(self._remote_execution._broadcast_connection)
+
+    def close(self):
+        '''
+        Close all of the command connections in this pool.
+        '''
+        for remote_node_id in self.remote_node_ids:
+            self.close_command_connection(remote_node_id)
+        self._executor.shutdown()
+
+    def run_command(self, remote_node_id, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, compress=False, timeout=None, cancel_token=None):
+        '''
+        Run a command remotely on the given remote node, opening a command connection to it if needed.
+
+        Args:
+            remote_node_id (string): The ID of the remote node.
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            raise_on_failure (bool): True to raise a RuntimeError if the command fails on the remote target.
+            compress (bool): True to send the command compressed if it is large, and (for MODE_EVAL_STATEMENT) to have a large result sent back compressed (see `RemoteExecution.run_command`).
+            timeout (float): The maximum number of seconds to wait for the command to complete, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command while it is waiting for its result, or None.
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition).
+        '''
+        deadline = _time_now() + timeout if timeout is not None else None
+        if compress:
+            command = _compress_command(command, exec_mode)
+        connection, connection_lock = self._get_command_connection(remote_node_id)
+        with connection_lock:
+            try:
+                data = connection.run_command(command, unattended, exec_mode, deadline, cancel_token)
+            except (RemoteExecutionTimeoutError, RemoteExecutionCancelledError):
+                # The abandoned result is drained before the next command, so the connection is only reopened if it can't be drained
+                if connection.is_broken:
+                    self._discard_command_connection(remote_node_id, connection)
+                raise
+            except Exception:
+                # The connection can't be trusted to be aligned with its results any more, so reopen it on next use
+                self._discard_command_connection(remote_node_id, connection)
+                raise
+        if compress:
+            _decompress_result(data, exec_mode)
+        if raise_on_failure and not data['success']:
+            raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
+        return data
+
+    def map(self, command, remote_node_ids, unattended=True, exec_mode=MODE_EXEC_FILE, timeout=None, cancel_token=None):
+        '''
+        Run a command remotely on each of the given remote nodes in parallel, and gather the results.
+
+        Args:
+            command (string): The Python command to run remotely.
+            remote_node_ids (list): The IDs of the remote nodes to run the command on.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            timeout (float): The maximum number of seconds to wait for the command to complete on each node, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command on every node while it is waiting for its results, or None.
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition), keyed by remote node ID.
+                  If the command couldn't be run on a node, its result has "success" set to False, and the exception that was raised as "error".
+        '''
+        pending = dict((remote_node_id, self._executor.submit(self.run_command, remote_node_id, command, unattended, exec_mode,
+                                                                         timeout=timeout, cancel_token=cancel_token)) for remote_node_id in remote_node_ids)
+        results = {}
+        for remote_node_id, future in pending.items():
+            error = future.exception()
+            if error is None:
+                results[remote_node_id] = future.result()
+            else:
+                results[remote_node_id] = {
+                    'success': False,
+                    'command': command,
+                    'result': str(error),
+                    'output': [],
+                    'error': error,
+                }
+        return results
+
+    def run_on_all(self, command, unattended=True, exec_mode=MODE_EXEC_FILE, timeout=None, cancel_token=None):
+        '''
+        Run a command remotely on every currently discovered remote node in parallel, and gather the results.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            timeout (float): The maximum number of seconds to wait for the command to complete on each node, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command on every node, or None.
+
+        Returns:
+            dict: The result from running the remote command, keyed by remote node ID (see `map`).
+        '''
+        return self.map(command, [node['node_id'] for node in self._remote_execution.remote_nodes], unattended, exec_mode, timeout, cancel_token)
+
+    def _get_command_connection(self, remote_node_id):
+        '''
+        Get the command connection to the given remote node, opening it if needed.
+
+        Args:
+            remote_node_id (string): The ID of the remote node.
+
+        Returns:
+            tuple: The command connection, and the lock that must be held while using it.
+        '''
+        with self._connections_lock:
+            connection_lock = self._connection_locks.setdefault(remote_node_id, _threading.Lock())
+        with connection_lock:
+            with self._connections_lock:
+                connection = self._connections.get(remote_node_id)
+            if not connection:
+                connection = _RemoteExecutionCommandConnection(self._remote_execution._config, self._remote_execution._node_id, remote_node_id, ephemeral_port=True)
+                try:
+                    connection.open(self._remote_execution._broadcast_connection, self._connect_timeout)
+                except Exception:
+                    connection.close(self._remote_execution._broadcast_connection)
+                    raise
+                with self._connections_lock:
+                    self._connections[remote_node_id] = connection
+                    self._connection_locks[remote_node_id] = connection_lock
+        return connection, connection_lock
+
+    def _discard_command_connection(self, remote_node_id, connection):
+        '''
+        Close the given command connection, so that a new one is opened to the remote node on next use.
+
+        Args:
+            remote_node_id (string): The ID of the remote node.
+            connection (_RemoteExecutionCommandConnection): The command connection to discard.
+        '''
+        with self._connections_lock:
+            if self._connections.get(remote_node_id) is connection:
+                del self._connections[remote_node_id]
+                del self._connection_locks[remote_node_id]
+        connection.close(self._remote_execution._broadcast_connection)
+
 
 class _RemoteExecutionNode(object):
     '''
     A discovered remote "node" (aka, a UE4 instance running Python).
 
     Args:
+        node_id (str): The ID of the remote node.
         data (dict): The data representing this node (from its "pong" reponse).
         now (float): The timestamp at which this node was last seen.
     '''
 
-    def __init__(self, data, now=None):
-        self.data = data
-        self._last_pong = _time_now(now)
+    __slots__ = ('node_id', 'data', 'deadline', 'view', 'rtt', 'answered_ping_time', 'commands_in_flight', 'relay_endpoint')
+
+    def __init__(self, node_id, data, now=None):
+        self.node_id = node_id
+        self.data = data
+        self.deadline = _time_now(now) + _NODE_TIMEOUT_SECONDS  # The timestamp at which this node times out, unless it sends another "pong" response
+        self.view = _types.MappingProxyType(_make_node_dict(node_id, data))  # The read-only dict describing this node, which `remote_nodes` copies
+        self.rtt = None  # The smoothed "ping" round-trip time (in seconds), or None if it hasn't been measured
+        self.answered_ping_time = None  # The send time of the latest "ping" this node is taken to have answered, or None if it hasn't answered one
+        self.commands_in_flight = 0  # The number of commands this session is running on the node
+        self.relay_endpoint = None  # The endpoint of the directory registrar that relays messages to this node, if it was found through a directory service
+
+    @property
+    def health(self):
+        '''
+        Get the health score of this remote node, from its smoothed round-trip time.
+
+        Returns:
+            float: The score, from 1 (instant responses) towards 0 (slow responses), or 0 if the round-trip time hasn't been measured.
+        '''
+        rtt = self.rtt
+        return _NODE_HEALTH_RTT_SECONDS / (_NODE_HEALTH_RTT_SECONDS + rtt) if rtt is not None else 0.0
+
+    def add_rtt_sample(self, rtt):
+        '''
+        Add a round-trip time sample to the smoothed round-trip time.
+
+        Args:
+            rtt (float): The round-trip time (in seconds).
+        '''
+        self.rtt = rtt if self.rtt is None else self.rtt + (rtt - self.rtt) * _NODE_RTT_SMOOTHING
+
+    def answer_ping(self, ping_times, pong_time):
+        '''
+        Match a "pong" response with the oldest "ping" this node hasn't answered yet, and add its round-trip time sample.
+        A "pong" doesn't say which "ping" it answers, so if a "ping" or "pong" was lost, the match is with an earlier "ping" than the one answered. A match more than a ping interval old is taken to be one of these: it adds no sample, and
+        the node is taken to have answered the latest "ping" instead, so a late response can never score better than a prompt one.
+
+        Args:
+            ping_times (iterable): The `time.perf_counter` timestamps at which the recent "ping" messages were sent, oldest first.
+            pong_time (float): The `time.perf_counter` timestamp at which the "pong" response was received.
+        '''
+        unanswered_ping_times = [ping_time for ping_time in ping_times if self.answered_ping_time is None or ping_time > self.answered_ping_time]
+        if not unanswered_ping_times:
+            return
+        rtt = pong_time - unanswered_ping_times[0]
+        if rtt > _NODE_PING_SECONDS:
+            self.answered_ping_time = unanswered_ping_times[-1]
+            return
+        self.answered_ping_time = unanswered_ping_times[0]
+        self.add_rtt_sample(rtt)
+
+    def should_timeout(self, now=None):
+        '''
+        Check to see whether this remote node should be considered timed-out.
+
+        Args:
+            now (float): The current timestamp.
+
+        Returns:
+            bool: True of the node has exceeded the timeout limit (`_NODE_TIMEOUT_SECONDS`), False otherwise.
+        '''
+        return self.deadline < _time_now(now)
+
+
+class _RemoteExecutionNodeIndex(object):
+    '''
+    An immutable index of remote nodes by their "pong" data (see `_NODE_INDEX_KEYS`), built alongside each snapshot of the nodes.
+
+    Args:
+        nodes (tuple): The remote nodes (as _RemoteExecutionNode).
+    '''
+
+    __slots__ = ('nodes', 'by_key')
 
-    def should_timeout(self, now=None):
+    def __init__(self, nodes=()):
+        self.nodes = nodes
+        self.by_key = {}
+        for key in _NODE_INDEX_KEYS:
+            key_index = {}
+            for node in nodes:
+                key_index.setdefault(node.view.get(key), []).append(node)
+            self.by_key[key] = dict((value, tuple(key_nodes)) for value, key_nodes in key_index.items())
+
+    def select(self, criteria, idle=None):
         '''
-        Check to see whether this remote node should be considered timed-out.
+        Find the remote nodes matching the given "pong" data.
 
         Args:
-            now (float): The current timestamp.
+            criteria (dict): The values to match, keyed by "pong" field (each must be one of `_NODE_INDEX_KEYS`).
+            idle (bool): True to only find nodes with no commands in flight, False to only find nodes with commands in flight, or None for either.
 
         Returns:
-            bool: True of the node has exceeded the timeout limit (`_NODE_TIMEOUT_SECONDS`), False otherwise.
+            list: The matching nodes (as _RemoteExecutionNode), healthiest first.
         '''
-        return (self._last_pong + _NODE_TIMEOUT_SECONDS) < _time_now(now)
+        candidates = self.nodes
+        for key, value in criteria.items():
+            key_nodes = self.by_key[key].get(value, ())
+            if len(key_nodes) < len(candidates):
+                candidates = key_nodes
+        matches = [node for node in candidates if all(node.view.get(key) == value for key, value in criteria.items())
+                   and (idle is None or (node.commands_in_flight == 0) == idle)]
+        matches.sort(key=lambda node: node.health, reverse=True)
+        return matches
 
 
 class _RemoteExecutionBroadcastNodes(object):
     '''
     A thread-safe set of remote execution "nodes" (UE4 instances running Python).
+    Time-outs are tracked with a heap of deadlines, so a "pong" response costs O(1) and expiring nodes costs O(log n) each, and the read-only node dicts are kept in a snapshot that is only rebuilt when the set of nodes (or their data) changes.
+
+    Args:
+        on_node_found (callable): Called with the node ID and the other data (as a dict) when a node is added to this set, or None.
+        on_node_lost (callable): Called with the node ID and the other data (as a dict) when a node is timed-out of this set, or None.
     '''
 
-    def __init__(self):
+    def __init__(self, on_node_found=None, on_node_lost=None):
         self._remote_nodes = {}
-        self._remote_nodes_lock = _threading.RLock()
+        self._remote_nodes_lock = _threading.Lock()
+        # A heap of (deadline, sequence, node) entries, with at most one entry per node. Each entry's deadline is at or before the node's actual deadline (a "pong" response only moves the
+        # deadline of the node, not its entry), so an expired entry is re-pushed with the node's actual deadline if the node has been seen since
+        self._deadline_heap = []
+        self._deadline_sequence = 0
+        self._snapshot = ()
+        self._snapshot_version = 0
+        self._index = _RemoteExecutionNodeIndex()
+        self._on_node_found = on_node_found
+        self._on_node_lost = on_node_lost
 
     @property
     def remote_nodes(self):
         '''
         Get the current set of discovered remote "nodes" (UE4 instances running Python).
+        Each call copies the nodes from the current snapshot, so callers are free to modify them.
 
         Returns:
             list: A list of dicts containg the node ID and the other data.
         '''
+        return [dict(view) for view in self._snapshot]
+
+    @property
+    def snapshot_version(self):
+        '''
+        Get the version of the `remote_nodes` snapshot, which increases every time the set of nodes (or their data) changes.
+
+        Returns:
+            int: The snapshot version.
+        '''
+        return self._snapshot_version
+
+    def select_nodes(self, criteria, idle=None):
+        '''
+        Find the remote nodes matching the given "pong" data, using the index of the current snapshot.
+
+        Args:
+            criteria (dict): The values to match, keyed by "pong" field (each must be one of `_NODE_INDEX_KEYS`).
+            idle (bool): True to only find nodes with no commands in flight, False to only find nodes with commands in flight, or None for either.
+
+        Returns:
+            list: A dict for each matching node, healthiest first.
+        '''
+        return [dict(node.view) for node in self._index.select(criteria, idle)]
+
+    def get_node_health(self, node_id):
+        '''
+        Get the measured health of a remote node.
+
+        Args:
+            node_id (str): The ID of the remote node.
+
+        Returns:
+            dict: The smoothed round-trip time in seconds ("rtt"), the health score ("health") and the number of commands in flight ("commands_in_flight"), or None if the node isn't known.
+        '''
+        node = self._remote_nodes.get(node_id)
+        if node is None:
+            return None
+        return {'rtt': node.rtt, 'health': node.health, 'commands_in_flight': node.commands_in_flight}
+
+    def get_relay_endpoint(self, node_id):
+        '''
+        Get the endpoint of the directory registrar that relays messages to a remote node.
+
+        Args:
+            node_id (str): The ID of the remote node.
+
+        Returns:
+            tuple: The endpoint, or None if the node wasn't found through a directory service.
+        '''
+        node = self._remote_nodes.get(node_id)
+        return node.relay_endpoint if node is not None else None
+
+    def command_started(self, node_id):
+        '''
+        Record that a command has been sent to a remote node (so that it isn't considered idle).
+
+        Args:
+            node_id (str): The ID of the remote node.
+        '''
+        with self._remote_nodes_lock:
+            node = self._remote_nodes.get(node_id)
+            if node is not None:
+                node.commands_in_flight += 1
+
+    def command_finished(self, node_id):
+        '''
+        Record that a command sent to a remote node has finished (or been abandoned).
+
+        Args:
+            node_id (str): The ID of the remote node.
+        '''
         with self._remote_nodes_lock:
-            remote_nodes_list = []
-            for node_id, node in self._remote_nodes.items():
-                remote_node_data = dict(node.data)
-                remote_node_data['node_id'] = node_id
-                remote_nodes_list.append(remote_node_data)
-            return remote_nodes_list
+            node = self._remote_nodes.get(node_id)
+            if node is not None and node.commands_in_flight:
+                node.commands_in_flight -= 1
 
-    def update_remote_node(self, node_id, node_data, now=None):
+    def update_remote_node(self, node_id, node_data, now=None, ping_times=None, pong_time=None, relay_endpoint=None):
         '''
         Update a remote node, replacing any existing data.
 
@@ -194,12 +1117,40 @@ class _RemoteExecutionBroadcastNodes(object):
             node_id (str): The ID of the remote node (from its "pong" reponse).
             node_data (dict): The data representing this node (from its "pong" reponse).
             now (float): The timestamp at which this node was last seen.
+            ping_times (iterable): The `time.perf_counter` timestamps at which the recent "ping" messages were sent (oldest first), to measure the round-trip time of a "pong" response against, or None if it isn't measured.
+            pong_time (float): The `time.perf_counter` timestamp at which the "pong" response was received (required with `ping_times`).
+            relay_endpoint (tuple): The endpoint of the directory registrar that relays messages to this node, or None if it was seen through multicast.
         '''
         now = _time_now(now)
         with self._remote_nodes_lock:
-            if node_id not in self._remote_nodes:
+            previous_node = node = self._remote_nodes.get(node_id)
+            is_new_node = node is None
+            if node is not None and node.data == node_data:
+                node.deadline = now + _NODE_TIMEOUT_SECONDS
+                if ping_times is not None:
+                    node.answer_ping(ping_times, pong_time)
+                if relay_endpoint is not None:
+                    node.relay_endpoint = relay_endpoint
+                return
+            if is_new_node:
                 _logger.debug('Found Node {0}: {1}'.format(node_id, node_data))
-            self._remote_nodes[node_id] = _RemoteExecutionNode(node_data, now)
+            node = self._remote_nodes[node_id] = _RemoteExecutionNode(node_id, node_data, now)
+            if previous_node is not None:
+                node.rtt = previous_node.rtt
+                node.answered_ping_time = previous_node.answered_ping_time
+                node.commands_in_flight = previous_node.commands_in_flight
+                node.relay_endpoint = previous_node.relay_endpoint
+            if ping_times is not None:
+                node.answer_ping(ping_times, pong_time)
+            if relay_endpoint is not None:
+                node.relay_endpoint = relay_endpoint
+            self._push_deadline(node)
+            self._publish_snapshot()
+        if is_new_node:
+            if _metrics_sink is not None:
+                _metrics_sink.count('remote_execution_nodes_found_total')
+            if self._on_node_found:
+                self._on_node_found(dict(node.view))
 
     def timeout_remote_nodes(self, now=None):
         '''
@@ -209,11 +1160,55 @@ class _RemoteExecutionBroadcastNodes(object):
             now (float): The current timestamp.
         '''
         now = _time_now(now)
+        lost_nodes = []
         with self._remote_nodes_lock:
-            for node_id, node in list(self._remote_nodes.items()):
-                if node.should_timeout(now):
-                    _logger.debug('Lost Node {0}: {1}'.format(node_id, node.data))
-                    del self._remote_nodes[node_id]
+            while self._deadline_heap and self._deadline_heap[0][0] < now:
+                node = _heapq.heappop(self._deadline_heap)[2]
+                if self._remote_nodes.get(node.node_id) is not node:
+                    continue  # The node was replaced (and its replacement has its own entry)
+                if not node.should_timeout(now):
+                    self._push_deadline(node)
+                    continue
+                _logger.debug('Lost Node {0}: {1}'.format(node.node_id, node.data))
+                del self._remote_nodes[node.node_id]
+                lost_nodes.append(dict(node.view))
+            if lost_nodes:
+                self._publish_snapshot()
+        if lost_nodes and _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_nodes_lost_total', len(lost_nodes))
+        if self._on_node_lost:
+            for lost_node in lost_nodes:
+                self._on_node_lost(lost_node)
+
+    def next_timeout(self):
+        '''
+        Get the earliest time at which a remote node may time-out, if it doesn't send another "pong" response.
+        This can be earlier than the actual next time-out (if that node has been seen since), which only costs an extra call to `timeout_remote_nodes`.
+
+        Returns:
+            float: The timestamp of the next time-out, or None if there are no remote nodes.
+        '''
+        deadline_heap = self._deadline_heap
+        return deadline_heap[0][0] if deadline_heap else None
+
+    def _push_deadline(self, node):
+        '''
+        Add a heap entry for the current deadline of a node (the lock must be held).
+
+        Args:
+            node (_RemoteExecutionNode): The node.
+        '''
+        self._deadline_sequence += 1
+        _heapq.heappush(self._deadline_heap, (node.deadline, self._deadline_sequence, node))
+
+    def _publish_snapshot(self):
+        '''
+        Rebuild the `remote_nodes` snapshot after the set of nodes changed (the lock must be held).
+        '''
+        nodes = tuple(self._remote_nodes.values())
+        self._index = _RemoteExecutionNodeIndex(nodes)
+        self._snapshot = tuple(node.view for node in nodes)
+        self._snapshot_version += 1
 
 
 class _RemoteExecutionBroadcastConnection(object):
@@ -223,15 +1218,23 @@ class _RemoteExecutionBroadcastConnection(object):
     Args:
         config (RemoteExecutionConfig): Configuration controlling the connection settings.
         node_id (string): The ID of the local "node" (this session).
+        on_node_found (callable): Called with the node ID and the other data (as a dict) when a remote node is discovered, or None.
+        on_node_lost (callable): Called with the node ID and the other data (as a dict) when a remote node times out, or None.
     '''
 
-    def __init__(self, config, node_id):
+    def __init__(self, config, node_id, on_node_found=None, on_node_lost=None):
         self._config = config
         self._node_id = node_id
+        self._on_node_found = on_node_found
+        self._on_node_lost = on_node_lost
         self._nodes = None
         self._running = False
         self._broadcast_socket = None
         self._broadcast_listen_thread = None
+        self._selector = None
+        self._wake_sockets = None
+        self._directory_socket = None
+        self._ping_times = _collections.deque(maxlen=_NODE_PING_HISTORY)  # The `time.perf_counter` timestamps at which the recent "ping" messages were sent
 
     @property
     def remote_nodes(self):
@@ -243,13 +1246,23 @@ class _RemoteExecutionBroadcastConnection(object):
         '''
         return self._nodes.remote_nodes if self._nodes else []
 
+    @property
+    def nodes(self):
+        '''
+        Get the set of discovered remote "nodes", which is replaced each time the connection is opened.
+
+        Returns:
+            _RemoteExecutionBroadcastNodes: The set of remote nodes, or None if the connection isn't open.
+        '''
+        return self._nodes
+
     def open(self):
         '''
         Open the UDP based messaging and discovery connection. This will begin the discovey process for remote "nodes" (UE4 instances running Python).
         '''
         self._running = True
-        self._last_ping = None
-        self._nodes = _RemoteExecutionBroadcastNodes()
+        self._ping_schedule = [_time_now() + offset for offset in _NODE_PING_BURST_SECONDS]
+        self._nodes = _RemoteExecutionBroadcastNodes(self._on_node_found, self._on_node_lost)
         self._init_broadcast_socket()
         self._init_broadcast_listen_thread()
 
@@ -258,29 +1271,42 @@ class _RemoteExecutionBroadcastConnection(object):
         Close the UDP based messaging and discovery connection. This will end the discovey process for remote "nodes" (UE4 instances running Python).
         '''
         self._running = False
+        if self._wake_sockets:
+            self._wake_sockets[1].send(b'\0')
         if self._broadcast_listen_thread:
             self._broadcast_listen_thread.join()
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+        if self._wake_sockets:
+            for wake_socket in self._wake_sockets:
+                wake_socket.close()
+            self._wake_sockets = None
         if self._broadcast_socket:
             self._broadcast_socket.close()
             self._broadcast_socket = None
+        if self._directory_socket:
+            self._directory_socket.close()
+            self._directory_socket = None
         self._nodes = None
 
     def _init_broadcast_socket(self):
         '''
-        Initialize the UDP based broadcast socket based on the current configuration.
-        '''
-        self._broadcast_socket = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM,
-                                                _socket.IPPROTO_UDP)  # UDP/IP socket
-        if hasattr(_socket, 'SO_REUSEPORT'):
-            self._broadcast_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1)
-        else:
-            self._broadcast_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
-        self._broadcast_socket.bind((self._config.multicast_bind_address, self._config.multicast_group_endpoint[1]))
-        self._broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_MULTICAST_LOOP, 1)
-        self._broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_MULTICAST_TTL, self._config.multicast_ttl)
-        self._broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_ADD_MEMBERSHIP, _socket.inet_aton(
-            self._config.multicast_group_endpoint[0]) + _socket.inet_aton('0.0.0.0'))
-        self._broadcast_socket.settimeout(0.1)
+        Initialize the UDP based broadcast socket based on the current configuration, and register it (along with a socket used to wake the listen thread) with a selector.
+        '''
+        self._broadcast_socket = _create_broadcast_socket(self._config)
+        self._broadcast_socket.setblocking(False)
+        self._wake_sockets = _socket.socketpair()
+        self._wake_sockets[0].setblocking(False)
+        self._selector = _selectors.DefaultSelector()
+        self._selector.register(self._broadcast_socket, _selectors.EVENT_READ)
+        self._selector.register(self._wake_sockets[0], _selectors.EVENT_READ)
+        if self._config.directory_endpoint:
+            # Directory responses are unicast, so they need a port of our own (the multicast port is shared by every client and remote node on this machine)
+            self._directory_socket = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM, _socket.IPPROTO_UDP)
+            self._directory_socket.bind((self._config.multicast_bind_address, 0))
+            self._directory_socket.setblocking(False)
+            self._selector.register(self._directory_socket, _selectors.EVENT_READ)
 
     def _init_broadcast_listen_thread(self):
         '''
@@ -293,23 +1319,46 @@ class _RemoteExecutionBroadcastConnection(object):
     def _run_broadcast_listen_thread(self):
         '''
         Main loop for the listen thread that handles processing discovery messages.
+        The thread sleeps in the selector until data arrives, or until the next "ping" or node time-out is due.
         '''
         while self._running:
-            # Receive and process all pending data
-            while True:
-                try:
-                    data = self._broadcast_socket.recv(4096)
-                except _socket.timeout:
-                    data = None
-                if data:
-                    self._handle_data(data)
-                else:
-                    break
             # Run tick logic
             now = _time_now()
             self._broadcast_ping(now)
             self._nodes.timeout_remote_nodes(now)
-            _time.sleep(0.1)
+            # Wait for data, or for the next tick
+            wake_time = self._ping_schedule[0]
+            next_timeout = self._nodes.next_timeout()
+            if next_timeout is not None:
+                wake_time = min(wake_time, next_timeout)
+            for key, _events in self._selector.select(max(wake_time - _time_now(), 0)):
+                if key.fileobj is self._broadcast_socket:
+                    self._receive_broadcast_data(self._broadcast_socket)
+                elif key.fileobj is self._directory_socket:
+                    self._receive_broadcast_data(self._directory_socket)
+                else:
+                    try:
+                        self._wake_sockets[0].recv(4096)
+                    except (_socket.error, OSError):
+                        pass
+
+    def _receive_broadcast_data(self, udp_socket):
+        '''
+        Receive and process all pending data on a UDP socket.
+
+        Args:
+            udp_socket (socket.socket): The socket to receive from (the broadcast socket, or the directory socket).
+        '''
+        while True:
+            try:
+                data = udp_socket.recv(_BROADCAST_RECEIVE_BYTES)
+            except (_socket.error, OSError):
+                break
+            if not data:
+                break
+            if _metrics_sink is not None:
+                _metrics_sink.count('remote_execution_udp_bytes_received_total', len(data))
+            self._handle_data(data)
 
     def _broadcast_message(self, message):
         '''
@@ -318,31 +1367,69 @@ class _RemoteExecutionBroadcastConnection(object):
         Args:
             message (_RemoteExecutionMessage): The message to broadcast.
         '''
-        self._broadcast_socket.sendto(message.to_json_bytes(), self._config.multicast_group_endpoint)
+        data = message.to_json_bytes()
+        self._broadcast_socket.sendto(data, self._config.multicast_group_endpoint)
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_udp_bytes_sent_total', len(data))
+
+    def _send_message(self, message, endpoint):
+        '''
+        Send the given message over UDP unicast to a single endpoint.
+
+        Args:
+            message (_RemoteExecutionMessage): The message to send.
+            endpoint (tuple): The endpoint to send the message to.
+        '''
+        data = message.to_json_bytes()
+        (self._directory_socket or self._broadcast_socket).sendto(data, endpoint)
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_udp_bytes_sent_total', len(data))
+
+    def _send_to_node(self, message, remote_node_id):
+        '''
+        Send the given message to a remote node, through the directory registrar that relays messages to it if it was found through a directory service, or otherwise over multicast.
+
+        Args:
+            message (_RemoteExecutionMessage): The message to send.
+            remote_node_id (string): The ID of the remote node.
+        '''
+        relay_endpoint = self._nodes.get_relay_endpoint(remote_node_id) if self._nodes else None
+        if relay_endpoint:
+            self._send_message(message, relay_endpoint)
+        else:
+            self._broadcast_message(message)
 
     def _broadcast_ping(self, now=None):
         '''
-        Broadcast a "ping" message over the UDP socket to anything that might be listening.
+        Broadcast a "ping" message over the UDP socket to anything that might be listening, and query the directory service (if any).
 
         Args:
             now (float): The current timestamp.
         '''
         now = _time_now(now)
-        if not self._last_ping or ((self._last_ping + _NODE_PING_SECONDS) < now):
-            self._last_ping = now
-            self._broadcast_message(_RemoteExecutionMessage(_TYPE_PING, self._node_id))
-
-    def broadcast_open_connection(self, remote_node_id):
+        if self._ping_schedule[0] <= now:
+            self._ping_schedule = [ping_time for ping_time in self._ping_schedule[1:] if ping_time > now] or [now + _NODE_PING_SECONDS]
+            if self._config.multicast_discovery:
+                self._broadcast_message(_RemoteExecutionMessage(_TYPE_PING, self._node_id))
+                self._ping_times.append(_time.perf_counter())
+                if _metrics_sink is not None:
+                    _metrics_sink.count('remote_execution_pings_sent_total')
+            if self._config.directory_endpoint:
+                self._send_message(_RemoteExecutionMessage(_TYPE_DIRECTORY_QUERY, self._node_id), self._config.directory_endpoint)
+
+    def broadcast_open_connection(self, remote_node_id, command_endpoint=None):
         '''
         Broadcast an "open_connection" message over the UDP socket to be handled by the specified remote node.
 
         Args:
             remote_node_id (string): The ID of the remote node that we want to open a command connection with.
+            command_endpoint (tuple): The endpoint tuple that the remote node should connect to, or None to use the command endpoint from the configuration.
         '''
-        self._broadcast_message(_RemoteExecutionMessage(_TYPE_OPEN_CONNECTION, self._node_id, remote_node_id, {
-            'command_ip': self._config.command_endpoint[0],
-            'command_port': self._config.command_endpoint[1],
-        }))
+        command_endpoint = command_endpoint or self._config.command_endpoint
+        self._send_to_node(_RemoteExecutionMessage(_TYPE_OPEN_CONNECTION, self._node_id, remote_node_id, {
+            'command_ip': command_endpoint[0],
+            'command_port': command_endpoint[1],
+        }), remote_node_id)
 
     def broadcast_close_connection(self, remote_node_id):
         '''
@@ -351,11 +1438,11 @@ class _RemoteExecutionBroadcastConnection(object):
         Args:
             remote_node_id (string): The ID of the remote node that we want to close a command connection with.
         '''
-        self._broadcast_message(_RemoteExecutionMessage(_TYPE_CLOSE_CONNECTION, self._node_id, remote_node_id))
+        self._send_to_node(_RemoteExecutionMessage(_TYPE_CLOSE_CONNECTION, self._node_id, remote_node_id), remote_node_id)
 
     def _handle_data(self, data):
         '''
-        Handle data received from the UDP broadcast socket.
+        Handle data received from a UDP socket.
 
         Args:
             data (bytes): The raw bytes received from the socket.
@@ -366,7 +1453,7 @@ class _RemoteExecutionBroadcastConnection(object):
 
     def _handle_message(self, message):
         '''
-        Handle a message received from the UDP broadcast socket.
+        Handle a message received from a UDP socket.
 
         Args:
             message (_RemoteExecutionMessage): The message received from the socket.
@@ -376,6 +1463,9 @@ class _RemoteExecutionBroadcastConnection(object):
         if message.type_ == _TYPE_PONG:
             self._handle_pong_message(message)
             return
+        if message.type_ == _TYPE_DIRECTORY_NODES:
+            self._handle_directory_nodes_message(message)
+            return
         _logger.debug('Unhandled remote execution message type "{0}"'.format(message.type_))
 
     def _handle_pong_message(self, message):
@@ -385,7 +1475,20 @@ class _RemoteExecutionBroadcastConnection(object):
         Args:
             message (_RemoteExecutionMessage): The message received from the socket.
         '''
-        self._nodes.update_remote_node(message.source, message.data)
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_pongs_received_total')
+        # A "pong" is addressed to the node that sent the "ping", so it answers one of our recent "ping" messages (see `_RemoteExecutionNode.answer_ping`)
+        self._nodes.update_remote_node(message.source, message.data, ping_times=tuple(self._ping_times), pong_time=_time.perf_counter())
+
+    def _handle_directory_nodes_message(self, message):
+        '''
+        Handle a "directory_nodes" message received from the directory service, merging its remote nodes with those discovered through multicast.
+
+        Args:
+            message (_RemoteExecutionMessage): The message received from the socket.
+        '''
+        for entry in (message.data or {}).get('nodes', ()):
+            self._nodes.update_remote_node(entry['node_id'], entry.get('data'), relay_endpoint=tuple(entry['relay_endpoint']))
 
 
 class _RemoteExecutionCommandConnection(object):
@@ -396,25 +1499,74 @@ class _RemoteExecutionCommandConnection(object):
         config (RemoteExecutionConfig): Configuration controlling the connection settings.
         node_id (string): The ID of the local "node" (this session).
         remote_node_id (string): The ID of the remote "node" (the UE4 instance running Python).
+        ephemeral_port (bool): True to listen on a port picked by the OS rather than the port of the configured command endpoint, so that several command connections can be open at once.
     '''
 
-    def __init__(self, config, node_id, remote_node_id):
+    def __init__(self, config, node_id, remote_node_id, ephemeral_port=False):
         self._config = config
         self._node_id = node_id
         self._remote_node_id = remote_node_id
+        self._command_endpoint = (config.command_endpoint[0], 0) if ephemeral_port else config.command_endpoint
         self._command_listen_socket = None
         self._command_channel_socket = _socket.socket()  # This type is only here to appease PyLint
+        self._command_channel_reader = _RemoteExecutionMessageReader()
+        self._command_receive_buffer = bytearray(_COMMAND_RECEIVE_CHUNK_BYTES)
+        self._command_selector = None
+        self._broadcast_nodes = None
+        self._unreceived_results = 0  # Number of commands sent whose result hasn't been received (non-zero between commands if a command timed out or was cancelled)
+        self._broken = False  # True if a command was abandoned part way through being sent, so the connection can't be used again
+        self._handshake_timing = {}
+
+    @property
+    def remote_node_id(self):
+        '''
+        Get the ID of the remote "node" that this command connection is open with.
+
+        Returns:
+            string: The ID of the remote node.
+        '''
+        return self._remote_node_id
+
+    @property
+    def is_broken(self):
+        '''
+        Check whether a command was abandoned part way through being sent, so the connection must be reopened before it can be used again.
+
+        Returns:
+            bool: True if the connection is broken, False otherwise.
+        '''
+        return self._broken
+
+    @property
+    def handshake_timing(self):
+        '''
+        Get the time taken by each phase of the last handshake of this command connection.
+
+        Returns:
+            dict: The number of seconds spent setting up the listen socket ("listen") and waiting for the remote party to connect ("accept"), along with the "total", and the number of "open_connection" broadcasts ("attempts").
+        '''
+        return dict(self._handshake_timing)
 
-    def open(self, broadcast_connection):
+    def open(self, broadcast_connection, timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
         '''
         Open the TCP based command connection, and wait to accept the connection from the remote party.
 
         Args:
             broadcast_connection (_RemoteExecutionBroadcastConnection): The broadcast connection to send UDP based messages over.
+            timeout (float): The maximum number of seconds to wait for the remote party to connect.
         '''
-        self._nodes = _RemoteExecutionBroadcastNodes()
-        self._init_command_listen_socket()
-        self._try_accept(broadcast_connection)
+        handshake = _RemoteExecutionHandshake(timeout)
+        self._broadcast_nodes = broadcast_connection.nodes
+        try:
+            self._init_command_listen_socket()
+            handshake.listening()
+            self._try_accept(broadcast_connection, handshake)
+            handshake.accepted()
+        except Exception:
+            handshake.failed()
+            raise
+        finally:
+            self._handshake_timing = handshake.timing
 
     def close(self, broadcast_connection):
         '''
@@ -424,6 +1576,9 @@ class _RemoteExecutionCommandConnection(object):
             broadcast_connection (_RemoteExecutionBroadcastConnection): The broadcast connection to send UDP based messages over.
         '''
         broadcast_connection.broadcast_close_connection(self._remote_node_id)
+        if self._command_selector:
+            self._command_selector.close()
+            self._command_selector = None
         if self._command_channel_socket:
             self._command_channel_socket.close()
             self._command_channel_socket = None
@@ -431,49 +1586,223 @@ class _RemoteExecutionCommandConnection(object):
             self._command_listen_socket.close()
             self._command_listen_socket = None
 
-    def run_command(self, command, unattended, exec_mode):
+    def run_command(self, command, unattended, exec_mode, deadline=None, cancel_token=None):
         '''
         Run a command on the remote party.
+        If the command times out or is cancelled, its result is left unreceived, and is discarded before the next command is sent.
 
         Args:
             command (string): The Python command to run remotely.
             unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
             exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            deadline (float): The timestamp by which the command must complete, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command while it is waiting, or None.
 
         Returns:
             dict: The result from running the remote command (see `command_result` from the protocol definition).
         '''
-        self._send_message(_RemoteExecutionMessage(_TYPE_COMMAND, self._node_id, self._remote_node_id, {
+        if self._broken:
+            raise RuntimeError('Command connection was abandoned part way through sending a command, and must be reopened!')
+        start_time = _time.perf_counter()
+        broadcast_nodes = self._broadcast_nodes
+        if broadcast_nodes is not None:
+            broadcast_nodes.command_started(self._remote_node_id)
+        try:
+            self._discard_unreceived_results(deadline, cancel_token)
+            self._send_message(self._make_command_message(command, unattended, exec_mode), deadline, cancel_token)
+            self._unreceived_results += 1
+            result = self._receive_message(_TYPE_COMMAND_RESULT, deadline, cancel_token)
+            self._unreceived_results -= 1
+        except RemoteExecutionTimeoutError:
+            if _metrics_sink is not None:
+                _metrics_sink.count('remote_execution_command_timeouts_total')
+            raise
+        except RemoteExecutionCancelledError:
+            if _metrics_sink is not None:
+                _metrics_sink.count('remote_execution_command_cancellations_total')
+            raise
+        finally:
+            if broadcast_nodes is not None:
+                broadcast_nodes.command_finished(self._remote_node_id)
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_commands_total')
+            _record_command_result(start_time, result.data)
+        return result.data
+
+    def run_commands(self, commands, unattended, exec_mode, max_in_flight):
+        '''
+        Run a batch of commands on the remote party, pipelining the "command" messages ahead of their results.
+
+        Args:
+            commands (iterable): The Python commands to run remotely, in order.
+            unattended (bool): True to run these commands in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            max_in_flight (int): The maximum number of commands that may be awaiting a result at any one time, or None for no limit.
+
+        Returns:
+            generator: The results from running the remote commands, in the same order as the commands (see `command_result` from the protocol definition).
+        '''
+        if self._broken:
+            raise RuntimeError('Command connection was abandoned part way through sending a command, and must be reopened!')
+        self._discard_unreceived_results()
+        commands = iter(commands)
+        in_flight = 0
+        send_times = _collections.deque()  # The time each command in flight was sent, oldest first (results arrive in the same order)
+        broadcast_nodes = self._broadcast_nodes
+        if broadcast_nodes is not None:
+            broadcast_nodes.command_started(self._remote_node_id)
+        try:
+            while True:
+                # Top up the pipeline with as many commands as the window allows, using a single send
+                pending = []
+                while max_in_flight is None or in_flight + len(pending) < max_in_flight:
+                    try:
+                        command = next(commands)
+                    except StopIteration:
+                        break
+                    pending.append(self._make_command_message(command, unattended, exec_mode).to_json_bytes())
+                if pending:
+                    data = b''.join(pending)
+                    self._command_channel_socket.sendall(data)
+                    in_flight += len(pending)
+                    send_times.extend([_time.perf_counter()] * len(pending))
+                    if _metrics_sink is not None:
+                        _metrics_sink.count('remote_execution_tcp_bytes_sent_total', len(data))
+                        _metrics_sink.count('remote_execution_commands_total', len(pending))
+                if not in_flight:
+                    return
+                result = self._receive_message(_TYPE_COMMAND_RESULT)
+                in_flight -= 1
+                send_time = send_times.popleft()
+                if _metrics_sink is not None:
+                    _record_command_result(send_time, result.data)
+                yield result.data
+        except GeneratorExit:
+            # Drain the results of any commands still in flight (as the caller stopped iterating early) so that the connection stays aligned for the next command
+            while in_flight:
+                self._receive_message(_TYPE_COMMAND_RESULT)
+                in_flight -= 1
+            raise
+        finally:
+            if broadcast_nodes is not None:
+                broadcast_nodes.command_finished(self._remote_node_id)
+
+    def _make_command_message(self, command, unattended, exec_mode):
+        '''
+        Make a "command" message to be sent to the remote party.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+
+        Returns:
+            _RemoteExecutionMessage: The message to send.
+        '''
+        return _RemoteExecutionMessage(_TYPE_COMMAND, self._node_id, self._remote_node_id, {
             'command': command,
             'unattended': unattended,
             'exec_mode': exec_mode,
-        }))
-        result = self._receive_message(_TYPE_COMMAND_RESULT)
-        return result.data
+        })
 
-    def _send_message(self, message):
+    def _send_message(self, message, deadline=None, cancel_token=None):
         '''
         Send the given message over the TCP socket to the remote party.
 
         Args:
             message (_RemoteExecutionMessage): The message to send.
+            deadline (float): The timestamp by which the message must be sent, or None to wait forever.
+            cancel_token (CancellationToken): A token that cancels the message if it is cancelled before the message is sent, or None.
+        '''
+        data = message.to_json_bytes()
+        if cancel_token is not None and cancel_token.cancelled:
+            raise RemoteExecutionCancelledError('Command was cancelled before it was sent!')
+        if deadline is None:
+            self._command_channel_socket.sendall(data)
+        else:
+            remaining = deadline - _time_now()
+            if remaining <= 0:
+                raise RemoteExecutionTimeoutError('Command timed out before it was sent!')
+            self._command_channel_socket.settimeout(remaining)
+            try:
+                self._command_channel_socket.sendall(data)
+            except _socket.timeout:
+                self._broken = True
+                raise RemoteExecutionTimeoutError('Command timed out while it was being sent!')
+            finally:
+                self._command_channel_socket.settimeout(None)
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_tcp_bytes_sent_total', len(data))
+
+    def _discard_unreceived_results(self, deadline=None, cancel_token=None):
+        '''
+        Receive and discard the results of any commands that timed out or were cancelled, so that the next result received belongs to the next command sent.
+
+        Args:
+            deadline (float): The timestamp by which the results must be received, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel waiting for the results, or None.
+        '''
+        while self._unreceived_results:
+            self._receive_message(_TYPE_COMMAND_RESULT, deadline, cancel_token)
+            self._unreceived_results -= 1
+
+    def _wait_for_data(self, deadline, cancel_token):
         '''
-        self._command_channel_socket.sendall(message.to_json_bytes())
+        Wait for data to arrive on the TCP socket.
 
-    def _receive_message(self, expected_type):
+        Args:
+            deadline (float): The timestamp to stop waiting at, or None to wait forever.
+            cancel_token (CancellationToken): A token that stops the wait when cancelled, or None.
+        '''
+        if self._command_selector is None:
+            self._command_selector = _selectors.DefaultSelector()
+            self._command_selector.register(self._command_channel_socket, _selectors.EVENT_READ)
+        wake_socket = cancel_token._get_wake_socket() if cancel_token is not None else None
+        if wake_socket is not None:
+            self._command_selector.register(wake_socket, _selectors.EVENT_READ)
+        try:
+            while True:
+                if cancel_token is not None and cancel_token.cancelled:
+                    raise RemoteExecutionCancelledError('Command was cancelled while waiting for its result!')
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - _time_now()
+                    if timeout <= 0:
+                        raise RemoteExecutionTimeoutError('Remote party failed to send the command result in time!')
+                for key, _events in self._command_selector.select(timeout):
+                    if key.fileobj is self._command_channel_socket:
+                        return
+        finally:
+            if wake_socket is not None:
+                self._command_selector.unregister(wake_socket)
+
+    def _receive_message(self, expected_type, deadline=None, cancel_token=None):
         '''
         Receive a message over the TCP socket from the remote party.
+        A message that is only partly received when the wait times out or is cancelled is kept, and completed by the next receive.
 
         Args:
             expected_type (string): The type of message we expect to receive.
+            deadline (float): The timestamp by which the message must be received, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel waiting for the message, or None.
 
         Returns:
             The message that was received.
         '''
-        data = self._command_channel_socket.recv(4096)
-        if data:
+        json_bytes = self._command_channel_reader.next_document()
+        while json_bytes is None:
+            if deadline is not None or cancel_token is not None:
+                self._wait_for_data(deadline, cancel_token)
+            received = self._command_channel_socket.recv_into(self._command_receive_buffer)
+            if not received:
+                break
+            if _metrics_sink is not None:
+                _metrics_sink.count('remote_execution_tcp_bytes_received_total', received)
+            self._command_channel_reader.feed(memoryview(self._command_receive_buffer)[:received])
+            json_bytes = self._command_channel_reader.next_document()
+        if json_bytes is not None:
             message = _RemoteExecutionMessage(None, None)
-            if message.from_json_bytes(data) and message.passes_receive_filter(
+            if message.from_json_bytes(json_bytes) and message.passes_receive_filter(
                     self._node_id) and message.type_ == expected_type:
                 return message
         raise RuntimeError('Remote party failed to send a valid response!')
@@ -488,26 +1817,125 @@ class _RemoteExecutionCommandConnection(object):
             self._command_listen_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1)
         else:
             self._command_listen_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
-        self._command_listen_socket.bind(self._config.command_endpoint)
-        self._command_listen_socket.listen(1)
-        self._command_listen_socket.settimeout(5)
+        self._command_listen_socket.bind(self._command_endpoint)
+        self._command_endpoint = self._command_listen_socket.getsockname()
+        self._command_listen_socket.listen(4)
 
-    def _try_accept(self, broadcast_connection):
+    def _try_accept(self, broadcast_connection, handshake):
         '''
-        Wait to accept a connection on the TCP based command connection. This makes 6 attempts to receive a connection, waiting for 5 seconds between each attempt (30 seconds total).
+        Wait to accept a connection on the TCP based command connection, re-broadcasting "open_connection" on the schedule of the given handshake.
 
         Args:
             broadcast_connection (_RemoteExecutionBroadcastConnection): The broadcast connection to send UDP based messages over.
+            handshake (_RemoteExecutionHandshake): The handshake being made.
+        '''
+        channel_socket = None
+        while channel_socket is None:
+            wait_deadline = handshake.next_attempt()
+            broadcast_connection.broadcast_open_connection(self._remote_node_id, self._command_endpoint)
+            channel_socket = self._accept_before(wait_deadline)
+        # The remote party replaces its connection for each "open_connection" it handles, so if it handled several broadcasts at once, the newest connection already queued is the one to keep
+        newer_channel_socket = self._accept_before(0)
+        while newer_channel_socket is not None:
+            channel_socket.close()
+            channel_socket = newer_channel_socket
+            newer_channel_socket = self._accept_before(0)
+        # Stop accepting (and re-broadcasting) once connected, rather than waiting for any late duplicate connection
+        self._command_listen_socket.close()
+        self._command_listen_socket = None
+        self._command_channel_socket = channel_socket
+        self._command_channel_socket.setblocking(True)
+        self._command_channel_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_RCVBUF, self._config.receive_buffer_size)
+        self._command_channel_reader = _RemoteExecutionMessageReader()
+
+    def _accept_before(self, deadline):
         '''
-        for _n in range(6):
-            broadcast_connection.broadcast_open_connection(self._remote_node_id)
-            try:
-                self._command_channel_socket = self._command_listen_socket.accept()[0]
-                self._command_channel_socket.setblocking(True)
-                return
-            except _socket.timeout:
-                continue
-        raise RuntimeError('Remote party failed to attempt the command socket connection!')
+        Wait to accept a connection on the TCP based command socket until the given deadline.
+
+        Args:
+            deadline (float): The timestamp to stop waiting at.
+
+        Returns:
+            socket.socket: The accepted connection, or None if no connection was made before the deadline.
+        '''
+        self._command_listen_socket.settimeout(max(deadline - _time_now(), 0))
+        try:
+            return self._command_listen_socket.accept()[0]
+        except (_socket.timeout, BlockingIOError):
+            return None
+
+
+class _RemoteExecutionHandshake(object):
+    '''
+    The schedule and timing of a command connection handshake, shared by the blocking and asyncio based clients (which each do their own listening and waiting).
+    The "open_connection" message is re-broadcast on an exponential schedule (starting at `_COMMAND_HANDSHAKE_RETRY_SECONDS`) until the remote party connects, so that a lost UDP packet only costs a fraction of a second.
+
+    Args:
+        timeout (float): The maximum number of seconds to wait for the remote party to connect.
+    '''
+
+    def __init__(self, timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
+        self._start_time = _time_now()
+        self._accept_start_time = self._start_time
+        self._deadline = self._start_time + timeout
+        self._retry_seconds = _COMMAND_HANDSHAKE_RETRY_SECONDS
+        self._attempts = 0
+        self._timing = {}
+
+    @property
+    def timing(self):
+        '''
+        Get the time taken by each phase of the handshake so far.
+
+        Returns:
+            dict: The number of seconds spent setting up the listen socket ("listen") and waiting for the remote party to connect ("accept"), along with the "total" (once accepted), and the number of "open_connection" broadcasts ("attempts").
+        '''
+        return dict(self._timing)
+
+    def listening(self):
+        '''
+        Record that the listen socket is set up, and waiting for the remote party to connect has started.
+        '''
+        self._accept_start_time = _time_now()
+        self._timing = {'listen': self._accept_start_time - self._start_time}
+
+    def next_attempt(self):
+        '''
+        Start the next attempt, which should broadcast "open_connection" and then wait for the remote party to connect.
+
+        Returns:
+            float: The timestamp to wait until before the next attempt.
+
+        Raises:
+            RuntimeError: If the remote party didn't connect before the timeout.
+        '''
+        now = _time_now()
+        if now >= self._deadline:
+            raise RuntimeError('Remote party failed to attempt the command socket connection!')
+        self._attempts += 1
+        self._timing['attempts'] = self._attempts
+        wait_deadline = min(now + self._retry_seconds, self._deadline)
+        self._retry_seconds = min(self._retry_seconds * 2, _COMMAND_HANDSHAKE_MAX_RETRY_SECONDS)
+        return wait_deadline
+
+    def accepted(self):
+        '''
+        Record that the remote party connected, and report the handshake to the metrics sink.
+        '''
+        now = _time_now()
+        self._timing.update({'accept': now - self._accept_start_time, 'attempts': self._attempts, 'total': now - self._start_time})
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_handshake_attempts_total', self._attempts)
+            _metrics_sink.observe('remote_execution_handshake_seconds', self._timing['total'])
+
+    def failed(self):
+        '''
+        Record that the handshake failed, and report it to the metrics sink.
+        '''
+        self._timing.update({'accept': _time_now() - self._accept_start_time, 'attempts': self._attempts})
+        if _metrics_sink is not None:
+            _metrics_sink.count('remote_execution_handshake_attempts_total', self._attempts)
+            _metrics_sink.count('remote_execution_handshake_failures_total')
 
 
 class _RemoteExecutionMessage(object):
@@ -569,8 +1997,12 @@ class _RemoteExecutionMessage(object):
         Returns:
             bytes: The JSON representation of this message as UTF-8 bytes.
         '''
-        json_str = self.to_json()
-        return json_str.encode('utf-8')
+        if _metrics_sink is None:
+            return self.to_json().encode('utf-8')
+        start_time = _time.perf_counter()
+        json_bytes = self.to_json().encode('utf-8')
+        _metrics_sink.observe('remote_execution_serialize_seconds', _time.perf_counter() - start_time)
+        return json_bytes
 
     def from_json(self, json_str):
         '''
@@ -583,7 +2015,7 @@ class _RemoteExecutionMessage(object):
             bool: True if this message could be parsed, False otherwise.
         '''
         try:
-            json_obj = _json.loads(json_str, encoding='utf-8')
+            json_obj = _json.loads(json_str)
             # Read and validate required protocol version information
             if json_obj['version'] != _PROTOCOL_VERSION:
                 raise ValueError(
@@ -614,9 +2046,121 @@ class _RemoteExecutionMessage(object):
         Returns:
             bool: True if this message could be parsed, False otherwise.
         '''
-        json_str = json_bytes.decode('utf-8')
-        return self.from_json(json_str)
+        if _metrics_sink is None:
+            return self.from_json(json_bytes.decode('utf-8'))
+        start_time = _time.perf_counter()
+        parsed = self.from_json(json_bytes.decode('utf-8'))
+        _metrics_sink.observe('remote_execution_deserialize_seconds', _time.perf_counter() - start_time)
+        return parsed
+
+
+class _RemoteExecutionMessageReader(object):
+    '''
+    An incremental reader that splits a TCP byte stream into complete UTF-8 encoded JSON documents.
+
+    The remote party sends each message as a bare JSON object with no length prefix, so a message may arrive split over any number of receive calls (or several messages may arrive in a single one).
+    Received bytes are appended to a growable buffer and only newly received bytes are scanned to track the nesting depth of the JSON document, so the message is only parsed once it is known to be complete.
+    '''
+
+    _STRING_RE = _re.compile(b'"[^"\\\\]*(?:\\\\.[^"\\\\]*)*"', _re.DOTALL)  # A complete JSON string
+    _STRING_BODY_RE = _re.compile(b'[^"\\\\]*(?:\\\\.[^"\\\\]*)*', _re.DOTALL)  # The body of a JSON string up to its closing quote
+    _OUTSIDE_STRING_RE = _re.compile(b'[^"]*(?:"[^"\\\\]*(?:\\\\.[^"\\\\]*)*"[^"]*)*', _re.DOTALL)  # Everything up to the start of an incomplete JSON string
+    _NON_BRACKET_RE = _re.compile(b'(?:"[^"\\\\]*(?:\\\\.[^"\\\\]*)*"|[^{}\\[\\]"]+)+', _re.DOTALL)  # Complete JSON strings and anything else that isn't a bracket
+    _STRUCTURE_RE = _re.compile(b'[{}\\[\\]"]')  # Structural characters outside of a JSON string
+    _WHITESPACE = b' \t\r\n'
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scan_pos = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        '''
+        Append data received from the stream.
+
+        Args:
+            data (bytes): The raw bytes received from the socket.
+        '''
+        self._buffer += data
+
+    def next_document(self):
+        '''
+        Extract the next complete JSON document from the buffered data.
+
+        Returns:
+            bytes: The bytes of the next complete JSON document, or None if no complete document has been received yet.
+        '''
+        buffer = self._buffer
+        end = len(buffer)
+        if self._depth == 0:
+            pos = 0
+            while pos < end and buffer[pos] in self._WHITESPACE:
+                pos += 1
+            if pos == end:
+                del buffer[:]
+                return None
+            if buffer[pos] != ord('{'):
+                raise RuntimeError('Remote party sent data that is not a JSON object!')
+            # Drop any whitespace between documents so that the document always starts at the front of the buffer
+            del buffer[:pos]
+            end = len(buffer)
+            self._scan_pos = 0
+        pos = self._scan_pos
+        if self._in_string:
+            # Finish the string that was split across receives before scanning any structure
+            pos = self._STRING_BODY_RE.match(buffer, pos).end()
+            if pos >= end or buffer[pos] != ord('"'):
+                self._scan_pos = pos
+                return None
+            self._in_string = False
+            pos += 1
+        # Strings are skipped and brackets are counted in bulk, and only the segment that closes the document is walked token by token
+        stop = self._OUTSIDE_STRING_RE.match(buffer, pos).end()
+        depth = self._depth
+        brackets = self._NON_BRACKET_RE.sub(b'', bytes(buffer[pos:stop]))
+        for char in bytearray(brackets):
+            depth += 1 if char in b'{[' else -1
+            if depth == 0:
+                document_end = self._find_document_end(pos, stop)
+                document = bytes(buffer[:document_end])
+                del buffer[:document_end]
+                self._scan_pos = 0
+                return document
+        self._depth = depth
+        if stop < end:
+            # An incomplete string starts at the stop position, so consume as much of its body as has been received
+            self._in_string = True
+            stop = self._STRING_BODY_RE.match(buffer, stop + 1).end()
+        self._scan_pos = stop
+        return None
+
+    def _find_document_end(self, pos, stop):
+        '''
+        Walk the structural characters of the buffered data to find where the current JSON document ends.
 
+        Args:
+            pos (int): The buffer position to start walking from (must be outside of a string).
+            stop (int): The buffer position that the document is known to end before.
+
+        Returns:
+            int: The buffer position immediately after the end of the current JSON document.
+        '''
+        buffer = self._buffer
+        while pos < stop:
+            index = self._STRUCTURE_RE.search(buffer, pos, stop).start()
+            char = buffer[index]
+            if char == ord('"'):
+                pos = self._STRING_RE.match(buffer, index).end()
+                continue
+            pos = index + 1
+            if char in b'{[':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    return pos
+        raise RuntimeError('Remote party sent malformed JSON data!')
 
 def _time_now(now=None):
     '''
@@ -631,6 +2175,107 @@ def _time_now(now=None):
     return _time.time() if now is None else now
 
 
+def _record_command_result(send_time, data):
+    '''
+    Utility function to report the round trip time of a command, and whether it failed, to the metrics sink (which must be set).
+
+    Args:
+        send_time (float): The `time.perf_counter` timestamp at which the command was sent.
+        data (dict): The result from running the remote command.
+    '''
+    _metrics_sink.observe('remote_execution_command_round_trip_seconds', _time.perf_counter() - send_time)
+    if not data.get('success'):
+        _metrics_sink.count('remote_execution_command_failures_total')
+
+
+def _make_node_dict(node_id, node_data):
+    '''
+    Utility function to make the dict describing a remote node, as returned by `remote_nodes`.
+
+    Args:
+        node_id (str): The ID of the remote node.
+        node_data (dict): The data representing this node (from its "pong" reponse).
+
+    Returns:
+        dict: A copy of the node data, with the node ID added as "node_id".
+    '''
+    remote_node_data = dict(node_data or {})
+    remote_node_data['node_id'] = node_id
+    return remote_node_data
+
+
+def _create_broadcast_socket(config):
+    '''
+    Utility function to create a UDP socket that has joined the multicast group used for messaging and discovery.
+
+    Args:
+        config (RemoteExecutionConfig): Configuration controlling the connection settings.
+
+    Returns:
+        socket.socket: The bound UDP socket.
+    '''
+    broadcast_socket = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM, _socket.IPPROTO_UDP)  # UDP/IP socket
+    if hasattr(_socket, 'SO_REUSEPORT'):
+        broadcast_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEPORT, 1)
+    else:
+        broadcast_socket.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
+    broadcast_socket.bind((config.multicast_bind_address, config.multicast_group_endpoint[1]))
+    broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_MULTICAST_LOOP, 1)
+    broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_MULTICAST_TTL, config.multicast_ttl)
+    broadcast_socket.setsockopt(_socket.IPPROTO_IP, _socket.IP_ADD_MEMBERSHIP, _socket.inet_aton(
+        config.multicast_group_endpoint[0]) + _socket.inet_aton('0.0.0.0'))
+    return broadcast_socket
+
+
+def _compress_command(command, exec_mode):
+    '''
+    Utility function to wrap a command in a small self-extracting bootstrap (zlib and base85), so that it crosses the socket compressed but still runs on a stock remote party.
+    For MODE_EVAL_STATEMENT the bootstrap is always used, as it also compresses the result on the remote party if it is large (see `_decompress_result`).
+
+    Args:
+        command (string): The Python command to run remotely.
+        exec_mode (string): The execution mode the command will be run with.
+
+    Returns:
+        string: The command to send in place of the given command.
+    '''
+    command_bytes = command.encode('utf-8')
+    if len(command_bytes) >= _COMPRESS_THRESHOLD_BYTES:
+        source = "__import__('zlib').decompress(__import__('base64').b85decode({0!r})).decode('utf-8')".format(
+            _base64.b85encode(_zlib.compress(command_bytes)).decode('ascii'))
+    elif exec_mode == MODE_EVAL_STATEMENT:
+        source = repr(command)
+    else:
+        return command
+    if exec_mode == MODE_EVAL_STATEMENT:
+        # Evaluates to the repr of the result, prefixed with "z" if it was compressed or "r" if it was small enough to send as-is
+        return ("(lambda _result: ('z' + __import__('base64').b85encode(__import__('zlib').compress(_result.encode('utf-8'))).decode('ascii')) "
+                "if len(_result) >= {0} else ('r' + _result))(repr(eval({1}, globals())))").format(_COMPRESS_THRESHOLD_BYTES, source)
+    return "exec(compile({0}, '<string>', {1!r}), globals())".format(source, 'single' if exec_mode == MODE_EXEC_STATEMENT else 'exec')
+
+
+def _decompress_result(data, exec_mode):
+    '''
+    Utility function to restore the result of a command that was wrapped by `_compress_command`, so that it matches the result the original command would have given.
+
+    Args:
+        data (dict): The result from running the wrapped command (see `command_result` from the protocol definition). This is updated in-place.
+        exec_mode (string): The execution mode the command was run with.
+
+    Returns:
+        dict: The given result.
+    '''
+    if exec_mode != MODE_EVAL_STATEMENT or not data.get('success'):
+        return data
+    result = _ast.literal_eval(data['result'])
+    if result[:1] == 'z':
+        result = _zlib.decompress(_base64.b85decode(result[1:])).decode('utf-8')
+    else:
+        result = result[1:]
+    data['result'] = result
+    return data
+
+
 # Log handling
 _logger = _logging.getLogger(__name__)
 _log_handler = _logging.StreamHandler()
@@ -640,3 +2285,18 @@ _logger.addHandler(_log_handler)
 def set_log_level(log_level):
     _logger.setLevel(log_level)
     _log_handler.setLevel(log_level)
+
+
+# Metrics handling
+_metrics_sink = None  # The sink that receives metrics, or None when metrics are disabled (each instrumented operation only checks this)
+
+
+def set_metrics_sink(sink):
+    '''
+    Set the sink that receives counters and timings for every remote execution operation (see remote_execution_metrics for the available sinks).
+
+    Args:
+        sink (object): An object with `count(name, value=1)` and `observe(name, value)` methods, or None to disable metrics.
+    '''
+    global _metrics_sink
+    _metrics_sink = sink
@@ -0,0 +1,305 @@
+import socket as _socket
+import asyncio as _asyncio
+import uuid as _uuid
+
+from remote_execution import (
+    _TYPE_PING,
+    _TYPE_PONG,
+    _TYPE_OPEN_CONNECTION,
+    _TYPE_CLOSE_CONNECTION,
+    _TYPE_COMMAND,
+    _TYPE_COMMAND_RESULT,
+    _NODE_PING_SECONDS,
+    _COMMAND_RECEIVE_CHUNK_BYTES,
+    _COMMAND_HANDSHAKE_TIMEOUT_SECONDS,
+    _RemoteExecutionBroadcastNodes,
+    _RemoteExecutionHandshake,
+    _RemoteExecutionMessage,
+    _RemoteExecutionMessageReader,
+    _create_broadcast_socket,
+    _time_now,
+    _logger,
+    RemoteExecutionConfig,
+    MODE_EXEC_FILE,
+)
+
+_NODE_TICK_SECONDS = 0.1  # Number of seconds between checks for timed-out remote nodes
+
+
+class AsyncRemoteExecution(object):
+    '''
+    An asyncio based remote execution session. This class can discover remote "nodes" (UE4 instances running Python), and open any number of concurrent command channels to them from a single event loop.
+
+    Args:
+        config (RemoteExecutionConfig): Configuration controlling the connection settings for this session. The command endpoint port is ignored, as each command channel listens on its own ephemeral port.
+    '''
+
+    def __init__(self, config=RemoteExecutionConfig()):
+        self._config = config
+        self._node_id = str(_uuid.uuid4())
+        self._nodes = None
+        self._transport = None
+        self._tick_task = None
+        self._sessions = set()
+
+    @property
+    def remote_nodes(self):
+        '''
+        Get the current set of discovered remote "nodes" (UE4 instances running Python).
+
+        Returns:
+            list: A list of dicts containg the node ID and the other data.
+        '''
+        return self._nodes.remote_nodes if self._nodes else []
+
+    async def start(self):
+        '''
+        Start the remote execution session. This will begin the discovey process for remote "nodes" (UE4 instances running Python).
+        '''
+        loop = _asyncio.get_running_loop()
+        self._nodes = _RemoteExecutionBroadcastNodes()
+        broadcast_socket = _create_broadcast_socket(self._config)
+        broadcast_socket.setblocking(False)
+        self._transport, _protocol = await loop.create_datagram_endpoint(
+            lambda: _AsyncBroadcastProtocol(self), sock=broadcast_socket)
+        self._tick_task = loop.create_task(self._run_tick())
+
+    async def stop(self):
+        '''
+        Stop the remote execution session. This will end the discovey process for remote "nodes" (UE4 instances running Python), and close any open command connections.
+        '''
+        for session in list(self._sessions):
+            await session.close()
+        if self._tick_task:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except _asyncio.CancelledError:
+                pass
+            self._tick_task = None
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+        self._nodes = None
+
+    async def open_command_connection(self, remote_node_id, timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
+        '''
+        Open a command connection to the given remote "node" (a UE4 instance running Python). Any number of command connections may be open at once.
+
+        Args:
+            remote_node_id (string): The ID of the remote node (this can be obtained by querying `remote_nodes`).
+            timeout (float): The maximum number of seconds to wait for the remote party to connect.
+
+        Returns:
+            AsyncRemoteExecutionSession: The open command connection (see `AsyncRemoteExecutionSession.handshake_timing` for the time taken to open it).
+        '''
+        session = AsyncRemoteExecutionSession(self, remote_node_id)
+        await session._open(timeout)
+        self._sessions.add(session)
+        return session
+
+    async def _run_tick(self):
+        '''
+        Main loop for the discovery task that sends "ping" messages and times out remote nodes.
+        '''
+        last_ping = None
+        loop = _asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if last_ping is None or (last_ping + _NODE_PING_SECONDS) < now:
+                last_ping = now
+                self._broadcast_message(_RemoteExecutionMessage(_TYPE_PING, self._node_id))
+            self._nodes.timeout_remote_nodes()
+            await _asyncio.sleep(_NODE_TICK_SECONDS)
+
+    def _broadcast_message(self, message):
+        '''
+        Broadcast the given message over the UDP socket to anything that might be listening.
+
+        Args:
+            message (_RemoteExecutionMessage): The message to broadcast.
+        '''
+        self._transport.sendto(message.to_json_bytes(), self._config.multicast_group_endpoint)
+
+    def _handle_data(self, data):
+        '''
+        Handle data received from the UDP broadcast socket.
+
+        Args:
+            data (bytes): The raw bytes received from the socket.
+        '''
+        message = _RemoteExecutionMessage(None, None)
+        if not message.from_json_bytes(data) or not message.passes_receive_filter(self._node_id):
+            return
+        if message.type_ == _TYPE_PONG:
+            self._nodes.update_remote_node(message.source, message.data)
+            return
+        _logger.debug('Unhandled remote execution message type "{0}"'.format(message.type_))
+
+
+class AsyncRemoteExecutionSession(object):
+    '''
+    An asyncio based command connection to a single remote "node" (a UE4 instance running Python).
+    Commands run on the same session are executed one at a time, while commands on different sessions run concurrently.
+
+    Args:
+        remote_execution (AsyncRemoteExecution): The session that discovered the remote node.
+        remote_node_id (string): The ID of the remote "node" (the UE4 instance running Python).
+    '''
+
+    def __init__(self, remote_execution, remote_node_id):
+        self._remote_execution = remote_execution
+        self._remote_node_id = remote_node_id
+        self._server = None
+        self._reader = None
+        self._writer = None
+        self._message_reader = _RemoteExecutionMessageReader()
+        self._command_lock = _asyncio.Lock()
+        self._handshake_timing = {}
+
+    @property
+    def remote_node_id(self):
+        '''
+        Get the ID of the remote "node" that this command connection is open with.
+
+        Returns:
+            string: The ID of the remote node.
+        '''
+        return self._remote_node_id
+
+    @property
+    def handshake_timing(self):
+        '''
+        Get the time taken by each phase of the handshake that opened this command connection.
+
+        Returns:
+            dict: The handshake timing (see `remote_execution._RemoteExecutionCommandConnection.handshake_timing`).
+        '''
+        return dict(self._handshake_timing)
+
+    async def _open(self, timeout=_COMMAND_HANDSHAKE_TIMEOUT_SECONDS):
+        '''
+        Listen on an ephemeral port, and re-broadcast "open_connection" on the same schedule as the blocking client until the remote party connects to it.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait for the remote party to connect.
+        '''
+        handshake = _RemoteExecutionHandshake(timeout)
+        connected = _asyncio.Event()
+        streams = []
+
+        def _on_connect(reader, writer):
+            # The remote party replaces its connection for each "open_connection" it handles, so the newest connection is the one to keep
+            if streams:
+                streams.pop()[1].close()
+            streams.append((reader, writer))
+            connected.set()
+
+        command_ip = self._remote_execution._config.command_endpoint[0]
+        try:
+            self._server = await _asyncio.start_server(_on_connect, command_ip, 0)
+            command_port = self._server.sockets[0].getsockname()[1]
+            handshake.listening()
+            while not connected.is_set():
+                wait_deadline = handshake.next_attempt()
+                self._remote_execution._broadcast_message(_RemoteExecutionMessage(_TYPE_OPEN_CONNECTION, self._remote_execution._node_id, self._remote_node_id, {
+                    'command_ip': command_ip,
+                    'command_port': command_port,
+                }))
+                try:
+                    await _asyncio.wait_for(connected.wait(), max(wait_deadline - _time_now(), 0))
+                except _asyncio.TimeoutError:
+                    continue
+            # Stop accepting (and re-broadcasting) once connected
+            self._server.close()
+            self._server = None
+            self._reader, self._writer = streams.pop()
+            handshake.accepted()
+        except Exception:
+            handshake.failed()
+            raise
+        finally:
+            self._handshake_timing = handshake.timing
+            if self._server:
+                self._server.close()
+                self._server = None
+        self._writer.get_extra_info('socket').setsockopt(_socket.SOL_SOCKET, _socket.SO_RCVBUF, self._remote_execution._config.receive_buffer_size)
+
+    async def close(self):
+        '''
+        Close the command connection, attempting to notify the remote party.
+        '''
+        self._remote_execution._sessions.discard(self)
+        if self._remote_execution._transport:
+            self._remote_execution._broadcast_message(_RemoteExecutionMessage(_TYPE_CLOSE_CONNECTION, self._remote_execution._node_id, self._remote_node_id))
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+    async def run_command(self, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False):
+        '''
+        Run a command remotely on this command connection.
+
+        Args:
+            command (string): The Python command to run remotely.
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            raise_on_failure (bool): True to raise a RuntimeError if the command fails on the remote target.
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition).
+        '''
+        async with self._command_lock:
+            self._writer.write(_RemoteExecutionMessage(_TYPE_COMMAND, self._remote_execution._node_id, self._remote_node_id, {
+                'command': command,
+                'unattended': unattended,
+                'exec_mode': exec_mode,
+            }).to_json_bytes())
+            await self._writer.drain()
+            data = (await self._receive_message(_TYPE_COMMAND_RESULT)).data
+        if raise_on_failure and not data['success']:
+            raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
+        return data
+
+    async def _receive_message(self, expected_type):
+        '''
+        Receive a message over the TCP socket from the remote party.
+
+        Args:
+            expected_type (string): The type of message we expect to receive.
+
+        Returns:
+            The message that was received.
+        '''
+        json_bytes = self._message_reader.next_document()
+        while json_bytes is None:
+            data = await self._reader.read(_COMMAND_RECEIVE_CHUNK_BYTES)
+            if not data:
+                break
+            self._message_reader.feed(data)
+            json_bytes = self._message_reader.next_document()
+        if json_bytes is not None:
+            message = _RemoteExecutionMessage(None, None)
+            if message.from_json_bytes(json_bytes) and message.passes_receive_filter(
+                    self._remote_execution._node_id) and message.type_ == expected_type:
+                return message
+        raise RuntimeError('Remote party failed to send a valid response!')
+
+
+class _AsyncBroadcastProtocol(_asyncio.DatagramProtocol):
+    '''
+    The datagram protocol that forwards data received on the UDP broadcast socket to its remote execution session.
+
+    Args:
+        remote_execution (AsyncRemoteExecution): The session to forward received data to.
+    '''
+
+    def __init__(self, remote_execution):
+        self._remote_execution = remote_execution
+
+    def datagram_received(self, data, addr):
+        self._remote_execution._handle_data(data)
+
+    def error_received(self, exc):
+        _logger.debug('Remote execution broadcast socket error: {0}'.format(exc))
@@ -0,0 +1,256 @@
+import sys as _sys
+import json as _json
+import time as _time
+import argparse as _argparse
+import platform as _platform
+import threading as _threading
+
+import remote_execution as _remote_execution
+import remote_execution_mock as _remote_execution_mock
+from remote_execution import (
+    RemoteExecution,
+    RemoteExecutionConfig,
+    MODE_EXEC_FILE,
+    MODE_EXEC_STATEMENT,
+    MODE_EVAL_STATEMENT,
+)
+
+DEFAULT_ITERATIONS = 200  # Number of commands to time for each execution mode
+DEFAULT_PAYLOAD_SIZES = (1024, 16384, 262144, 1048576, 4194304)  # Result payload sizes (in bytes) to measure throughput for
+DEFAULT_NODE_COUNTS = (1, 10, 50, 100, 200)  # Numbers of mock nodes to measure discovery time for
+DEFAULT_HANDSHAKES = 20  # Number of command connection handshakes to time
+DISCOVERY_TIMEOUT_SECONDS = 30  # Number of seconds to wait for every mock node to be discovered
+
+# The commands timed for each execution mode (each does as little work as possible, so the time measured is the protocol overhead)
+_LATENCY_COMMANDS = {
+    MODE_EXEC_FILE: 'pass',
+    MODE_EXEC_STATEMENT: 'None',
+    MODE_EVAL_STATEMENT: 'None',
+}
+
+
+def percentiles(samples):
+    '''
+    Summarize a set of timing samples.
+
+    Args:
+        samples (list): The timing samples (in seconds).
+
+    Returns:
+        dict: The count, min, mean, p50, p95, p99 and max of the samples (in seconds).
+    '''
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def _percentile(fraction):
+        return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+    return {
+        'count': len(ordered),
+        'min': ordered[0],
+        'mean': sum(ordered) / len(ordered),
+        'p50': _percentile(0.50),
+        'p95': _percentile(0.95),
+        'p99': _percentile(0.99),
+        'max': ordered[-1],
+    }
+
+
+def benchmark_latency(remote_execution, iterations=DEFAULT_ITERATIONS):
+    '''
+    Time `run_command` for each execution mode on the open command connection.
+
+    Args:
+        remote_execution (RemoteExecution): The remote execution session, with an open command connection.
+        iterations (int): The number of commands to time for each execution mode.
+
+    Returns:
+        dict: The latency percentiles (see `percentiles`), keyed by execution mode.
+    '''
+    results = {}
+    for exec_mode, command in _LATENCY_COMMANDS.items():
+        samples = []
+        for _n in range(iterations):
+            start_time = _time.perf_counter()
+            remote_execution.run_command(command, exec_mode=exec_mode, raise_on_failure=True)
+            samples.append(_time.perf_counter() - start_time)
+        results[exec_mode] = percentiles(samples)
+    return results
+
+
+def benchmark_throughput(remote_execution, payload_sizes=DEFAULT_PAYLOAD_SIZES, iterations=5):
+    '''
+    Measure the throughput of commands that return a result payload of increasing size, and of commands that send a payload of increasing size.
+
+    Args:
+        remote_execution (RemoteExecution): The remote execution session, with an open command connection.
+        payload_sizes (list): The payload sizes (in bytes) to measure.
+        iterations (int): The number of commands to time for each payload size.
+
+    Returns:
+        list: A dict for each payload size, with the percentiles of the time taken to receive ("receive") and send ("send") the payload, and the median throughput of each (in bytes per second).
+    '''
+    results = []
+    for payload_size in payload_sizes:
+        receive_samples = []
+        send_samples = []
+        for _n in range(iterations):
+            start_time = _time.perf_counter()
+            remote_execution.run_command("'x' * {0}".format(payload_size), exec_mode=MODE_EVAL_STATEMENT, raise_on_failure=True)
+            receive_samples.append(_time.perf_counter() - start_time)
+            start_time = _time.perf_counter()
+            remote_execution.run_command("len('{0}')".format('x' * payload_size), exec_mode=MODE_EVAL_STATEMENT, raise_on_failure=True)
+            send_samples.append(_time.perf_counter() - start_time)
+        receive = percentiles(receive_samples)
+        send = percentiles(send_samples)
+        results.append({
+            'payload_bytes': payload_size,
+            'receive': receive,
+            'receive_bytes_per_second': payload_size / receive['p50'] if receive['p50'] else None,
+            'send': send,
+            'send_bytes_per_second': payload_size / send['p50'] if send['p50'] else None,
+        })
+    return results
+
+
+def benchmark_handshake(remote_execution, remote_node_id, handshakes=DEFAULT_HANDSHAKES):
+    '''
+    Time opening a command connection to a remote node.
+
+    Args:
+        remote_execution (RemoteExecution): The started remote execution session.
+        remote_node_id (string): The ID of the remote node to connect to.
+        handshakes (int): The number of handshakes to time.
+
+    Returns:
+        dict: The percentiles of the total handshake time ("total"), and of the time spent waiting for the remote node to connect ("accept"), along with the mean number of "open_connection" broadcasts ("attempts").
+    '''
+    total_samples = []
+    accept_samples = []
+    attempts = []
+    for _n in range(handshakes):
+        timing = remote_execution.open_command_connection(remote_node_id)
+        total_samples.append(timing['total'])
+        accept_samples.append(timing['accept'])
+        attempts.append(timing['attempts'])
+        remote_execution.close_command_connection()
+    return {
+        'total': percentiles(total_samples),
+        'accept': percentiles(accept_samples),
+        'attempts': sum(attempts) / float(len(attempts)) if attempts else 0,
+    }
+
+
+def benchmark_discovery(node_counts=DEFAULT_NODE_COUNTS, config=RemoteExecutionConfig(), **node_kwargs):
+    '''
+    Time how long a new remote execution session takes to discover the first, and every, mock node as the number of nodes on the multicast group grows.
+
+    Args:
+        node_counts (list): The numbers of mock nodes to measure.
+        config (RemoteExecutionConfig): Configuration controlling the connection settings.
+        **node_kwargs: Further arguments for each mock node (eg, latency or packet_loss).
+
+    Returns:
+        list: A dict for each node count, with the seconds taken to discover the first node ("first_node") and every node ("all_nodes"), or None for "all_nodes" if they weren't all discovered in time.
+    '''
+    results = []
+    for node_count in node_counts:
+        nodes = _remote_execution_mock.start_mock_nodes(node_count, config, **node_kwargs)
+        remote_execution = RemoteExecution(config)
+        mock_node_ids = set(node.node_id for node in nodes)
+        found_times = []
+        all_found = _threading.Event()
+        found_lock = _threading.Lock()
+
+        def _on_node_found(node):
+            if node['node_id'] not in mock_node_ids:
+                return
+            with found_lock:
+                found_times.append(_time.perf_counter())
+                if len(found_times) == node_count:
+                    all_found.set()
+
+        remote_execution.add_node_found_callback(_on_node_found)
+        try:
+            start_time = _time.perf_counter()
+            remote_execution.start()
+            all_found.wait(DISCOVERY_TIMEOUT_SECONDS)
+        finally:
+            remote_execution.stop()
+            for node in nodes:
+                node.stop()
+        results.append({
+            'nodes': node_count,
+            'discovered': len(found_times),
+            'first_node': found_times[0] - start_time if found_times else None,
+            'all_nodes': found_times[-1] - start_time if all_found.is_set() else None,
+        })
+    return results
+
+
+def run_benchmarks(iterations=DEFAULT_ITERATIONS, payload_sizes=DEFAULT_PAYLOAD_SIZES, node_counts=DEFAULT_NODE_COUNTS, handshakes=DEFAULT_HANDSHAKES,
+                   config=RemoteExecutionConfig(), **node_kwargs):
+    '''
+    Run the full benchmark suite against local mock nodes.
+
+    Args:
+        iterations (int): The number of commands to time for each execution mode.
+        payload_sizes (list): The payload sizes (in bytes) to measure throughput for.
+        node_counts (list): The numbers of mock nodes to measure discovery time for.
+        handshakes (int): The number of command connection handshakes to time.
+        config (RemoteExecutionConfig): Configuration controlling the connection settings.
+        **node_kwargs: Further arguments for each mock node (eg, latency or packet_loss).
+
+    Returns:
+        dict: The benchmark results, suitable for serializing as JSON.
+    '''
+    results = {
+        'environment': {
+            'python': _sys.version.split()[0],
+            'platform': _platform.platform(),
+            'node_options': node_kwargs,
+        },
+    }
+    node = _remote_execution_mock.MockRemoteExecutionNode(config, {'project_name': 'Benchmark'}, **node_kwargs)
+    node.start()
+    remote_execution = RemoteExecution(config)
+    remote_execution.start()
+    try:
+        remote_node = remote_execution.wait_for_node(lambda remote_node: remote_node['node_id'] == node.node_id, DISCOVERY_TIMEOUT_SECONDS)
+        if not remote_node:
+            raise RuntimeError('Failed to discover the mock node!')
+        results['handshake'] = benchmark_handshake(remote_execution, node.node_id, handshakes)
+        remote_execution.open_command_connection(node.node_id)
+        results['latency'] = benchmark_latency(remote_execution, iterations)
+        results['throughput'] = benchmark_throughput(remote_execution, payload_sizes)
+    finally:
+        remote_execution.stop()
+        node.stop()
+    results['discovery'] = benchmark_discovery(node_counts, config, **node_kwargs)
+    return results
+
+
+def main(argv=None):
+    parser = _argparse.ArgumentParser(description='Benchmark remote execution against local mock UE4 nodes, writing the results as JSON.')
+    parser.add_argument('--output', default='', help='Path of the JSON file to write (defaults to stdout).')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help='Commands to time for each execution mode.')
+    parser.add_argument('--payload-sizes', type=int, nargs='+', default=DEFAULT_PAYLOAD_SIZES, help='Payload sizes (in bytes) to measure throughput for.')
+    parser.add_argument('--node-counts', type=int, nargs='+', default=DEFAULT_NODE_COUNTS, help='Numbers of nodes to measure discovery time for.')
+    parser.add_argument('--handshakes', type=int, default=DEFAULT_HANDSHAKES, help='Command connection handshakes to time.')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds each mock node delays its responses by.')
+    parser.add_argument('--packet-loss', type=float, default=0, help='Probability of each mock node ignoring a UDP message.')
+    args = parser.parse_args(argv)
+    _remote_execution.set_log_level('WARNING')
+    results = run_benchmarks(args.iterations, args.payload_sizes, args.node_counts, args.handshakes,
+                             latency=args.latency, packet_loss=args.packet_loss)
+    json_str = _json.dumps(results, sort_keys=True, indent=4, separators=(',', ': '))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json_str)
+    else:
+        print(json_str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import io as _io
+import os as _os
+import mmap as _mmap
+import zlib as _zlib
+import weakref as _weakref
+import tempfile as _tempfile
+
+from remote_execution import _logger
+from remote_execution_functions import RemoteFunction
+
+_CHECKSUM_CHUNK_BYTES = 1048576  # Number of bytes to checksum at a time
+_BULK_FILE_PREFIX = 'remote_execution_bulk_'  # Prefix of the names of the files written by the remote party
+_NPY_PREFIX_BYTES = 8  # Number of bytes of magic string and version at the start of a .npy file, before the header length
+
+LAYOUT_RAW = 'raw'  # The file holds the raw bytes of a buffer (eg, bytes, bytearray, array.array or memoryview)
+LAYOUT_NPY = 'npy'  # The file holds a NumPy array in the .npy format
+
+# Runs in the editor: writes a value to a new file in the shared directory, and describes the file
+_WRITE_BULK_SOURCE = '''
+def _write_bulk(value, directory, prefix, chunk_bytes):
+    import os
+    import zlib
+    import tempfile
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    fd, path = tempfile.mkstemp(prefix=prefix, dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if hasattr(value, 'dtype') and hasattr(value, 'shape'):
+                import numpy
+                numpy.save(f, value, allow_pickle=False)
+                layout = 'npy'
+            else:
+                f.write(value)
+                layout = 'raw'
+        checksum = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_bytes), b''):
+                checksum = zlib.crc32(chunk, checksum)
+    except Exception:
+        os.remove(path)
+        raise
+    return {'path': path, 'size': os.path.getsize(path), 'checksum': checksum & 0xffffffff, 'layout': layout}
+'''
+
+
+class RemoteBulkTransfer(object):
+    '''
+    Fetches large values from a co-located remote "node" (a UE4 instance running Python) through a shared file, rather than through the `command_result` JSON.
+    The remote party writes the value to a file in a directory shared with this machine, and returns only its path, size and checksum, which is then memory-mapped without copying.
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession).
+        directory (str): The directory to write the files to, which must be reachable by both parties at the same path (defaults to the temporary directory of this machine).
+    '''
+
+    def __init__(self, runner, directory=None):
+        self._write_bulk = RemoteFunction(runner, _WRITE_BULK_SOURCE, '_write_bulk')
+        self._directory = directory or _tempfile.gettempdir()
+
+    def fetch(self, expression, verify=False):
+        '''
+        Evaluate an expression on the remote party, and map its value.
+
+        Args:
+            expression (str): The Python expression to evaluate (in the namespace of the commands run on the remote party). This must give a str, an object supporting the buffer protocol (eg, bytes, array.array or memoryview) or a NumPy array.
+            verify (bool): True to check the file against the checksum reported by the remote party before returning it.
+
+        Returns:
+            RemoteBulkData: The mapped value (its file is deleted once it is closed or released).
+        '''
+        info = self._write_bulk.call_with_expressions(expression, repr(self._directory), repr(_BULK_FILE_PREFIX), repr(_CHECKSUM_CHUNK_BYTES))
+        bulk_data = RemoteBulkData(info['path'], info['size'], info['checksum'], info['layout'])
+        if verify and not bulk_data.verify():
+            bulk_data.close()
+            raise RuntimeError('Bulk data file "{0}" does not match its checksum!'.format(info['path']))
+        return bulk_data
+
+
+class RemoteBulkData(object):
+    '''
+    A read-only memory map of a file written by the remote party. The file is deleted when this is closed, or when it is garbage collected.
+
+    Args:
+        path (str): The path of the file.
+        size (int): The size of the file (in bytes), as reported by the remote party.
+        checksum (int): The CRC-32 of the file, as reported by the remote party.
+        layout (str): The layout of the file (LAYOUT_RAW or LAYOUT_NPY).
+    '''
+
+    def __init__(self, path, size, checksum, layout=LAYOUT_RAW):
+        self._path = path
+        self._size = size
+        self._checksum = checksum
+        self._layout = layout
+        self._file = open(path, 'rb')
+        self._mmap = _mmap.mmap(self._file.fileno(), 0, access=_mmap.ACCESS_READ) if size else None
+        self._finalizer = _weakref.finalize(self, _release_bulk_file, path, self._file, self._mmap)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def path(self):
+        '''
+        Get the path of the mapped file.
+
+        Returns:
+            str: The path of the file.
+        '''
+        return self._path
+
+    @property
+    def size(self):
+        '''
+        Get the size of the mapped file.
+
+        Returns:
+            int: The size of the file (in bytes).
+        '''
+        return self._size
+
+    @property
+    def checksum(self):
+        '''
+        Get the checksum of the mapped file.
+
+        Returns:
+            int: The CRC-32 of the file, as reported by the remote party.
+        '''
+        return self._checksum
+
+    @property
+    def layout(self):
+        '''
+        Get the layout of the mapped file.
+
+        Returns:
+            str: The layout of the file (LAYOUT_RAW or LAYOUT_NPY).
+        '''
+        return self._layout
+
+    @property
+    def data(self):
+        '''
+        Get the contents of the file, without copying them. Views of this must be released before the data is closed.
+
+        Returns:
+            memoryview: A read-only view of the mapped file.
+        '''
+        return memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+
+    def verify(self):
+        '''
+        Check the contents of the file against the checksum reported by the remote party.
+
+        Returns:
+            bool: True if the file matches its checksum.
+        '''
+        checksum = 0
+        with self.data as data:
+            size = len(data)
+            for offset in range(0, size, _CHECKSUM_CHUNK_BYTES):
+                checksum = _zlib.crc32(data[offset:offset + _CHECKSUM_CHUNK_BYTES], checksum)
+        return size == self._size and (checksum & 0xffffffff) == self._checksum
+
+    def as_array(self, dtype='uint8'):
+        '''
+        Get the contents of the file as a read-only NumPy array, without copying them (requires NumPy).
+
+        Args:
+            dtype (str): The data type of the elements, for LAYOUT_RAW files (the type of LAYOUT_NPY files is stored in the file).
+
+        Returns:
+            numpy.ndarray: The array.
+        '''
+        import numpy
+        if self._layout == LAYOUT_NPY:
+            # The array is built on the memory map of this object (rather than with numpy.load, which would map the file again), so closing this object releases it
+            shape, fortran_order, npy_dtype, offset = _read_npy_header(self.data)
+            count = 1
+            for dimension in shape:
+                count *= dimension
+            array = numpy.frombuffer(self.data, dtype=npy_dtype, count=count, offset=offset)
+            return array.reshape(shape, order='F' if fortran_order else 'C')
+        return numpy.frombuffer(self.data, dtype=dtype)
+
+    def close(self):
+        '''
+        Unmap the file and delete it.
+        '''
+        self._finalizer()
+
+
+def _read_npy_header(data):
+    '''
+    Utility function to read the header of a .npy file.
+
+    Args:
+        data (memoryview): The contents of the file.
+
+    Returns:
+        tuple: The shape, whether the array is in Fortran order, the data type, and the offset of the array data.
+    '''
+    from numpy.lib import format as npy_format
+    version = npy_format.read_magic(_io.BytesIO(data[:_NPY_PREFIX_BYTES].tobytes()))
+    length_bytes = 2 if version == (1, 0) else 4
+    offset = _NPY_PREFIX_BYTES + length_bytes + int.from_bytes(data[_NPY_PREFIX_BYTES:_NPY_PREFIX_BYTES + length_bytes].tobytes(), 'little')
+    header = _io.BytesIO(data[:offset].tobytes())
+    npy_format.read_magic(header)
+    read_array_header = npy_format.read_array_header_1_0 if version == (1, 0) else npy_format.read_array_header_2_0
+    shape, fortran_order, dtype = read_array_header(header)
+    if dtype.hasobject:
+        raise ValueError('Bulk data arrays of Python objects are not supported!')
+    return shape, fortran_order, dtype, offset
+
+
+def _release_bulk_file(path, file_, mapping):
+    '''
+    Utility function to unmap and delete a bulk data file (this must not reference the RemoteBulkData, so that it can run when that is garbage collected).
+
+    Args:
+        path (str): The path of the file.
+        file_ (file): The open file.
+        mapping (mmap.mmap): The memory map of the file, or None if the file was empty.
+    '''
+    if mapping is not None:
+        try:
+            mapping.close()
+        except BufferError:
+            _logger.warning('Bulk data file "{0}" is still in use, so its memory map was left open'.format(path))
+    file_.close()
+    try:
+        _os.remove(path)
+    except OSError as e:
+        _logger.warning('Failed to delete bulk data file "{0}": {1}'.format(path, e))
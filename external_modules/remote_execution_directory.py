@@ -0,0 +1,330 @@
+import json as _json
+import time as _time
+import uuid as _uuid
+import socket as _socket
+import argparse as _argparse
+import threading as _threading
+
+import remote_execution as _remote_execution
+from remote_execution import (
+    _TYPE_OPEN_CONNECTION,
+    _TYPE_CLOSE_CONNECTION,
+    _TYPE_DIRECTORY_REGISTER,
+    _TYPE_DIRECTORY_QUERY,
+    _TYPE_DIRECTORY_NODES,
+    _NODE_TIMEOUT_SECONDS,
+    _BROADCAST_RECEIVE_BYTES,
+    _RemoteExecutionMessage,
+    _logger,
+    RemoteExecution,
+    RemoteExecutionConfig,
+)
+
+DEFAULT_DIRECTORY_PORT = 6767  # The UDP port that the directory service listens on by default
+DEFAULT_REGISTER_SECONDS = 1  # Number of seconds between registrations of the nodes discovered by a registrar
+DEFAULT_NODE_TTL_SECONDS = _NODE_TIMEOUT_SECONDS  # Number of seconds a registered node stays in the directory without being registered again
+_DIRECTORY_TICK_SECONDS = 0.1  # Number of seconds between checks for the directory service or registrar being stopped
+_DIRECTORY_MAX_DATAGRAM_BYTES = 8192  # Number of bytes of node entries to pack into each registration or query response
+
+
+class RemoteExecutionDirectory(object):
+    '''
+    A lightweight directory service for remote "nodes" (UE4 instances running Python), for discovery across subnets where multicast doesn't reach.
+    Registrars (see `RemoteExecutionDirectoryRegistrar`) register the nodes on their machine, and clients query the directory over unicast (see `RemoteExecutionConfig.directory_endpoint`), so discovery traffic scales with the number of clients rather than clients times nodes.
+    For tests, the directory can run on the loopback address with an ephemeral port.
+
+    A registered node is reached through the registrar that registered it, so only registrations sent from the loopback address or from `allowed_registrars` are accepted
+    (otherwise any host could register forged nodes, and have clients open command connections to it).
+
+    Clients on another machine must set `RemoteExecutionConfig.command_endpoint` to an address of theirs that the nodes can route to, as the nodes connect back to it to open a command connection (with the default of 127.0.0.1, the nodes would
+    connect to their own machine and the connection silently fails). The client's address must also be allowed by the registrar relaying to the nodes.
+
+    Args:
+        endpoint (tuple): The endpoint to listen on (use port 0 to have the OS pick a port).
+        node_ttl (float): The number of seconds a registered node stays in the directory without being registered again.
+        allowed_registrars (iterable): The addresses (or host names) of the registrars allowed to register nodes, in addition to the loopback address.
+    '''
+
+    def __init__(self, endpoint=('0.0.0.0', DEFAULT_DIRECTORY_PORT), node_ttl=DEFAULT_NODE_TTL_SECONDS, allowed_registrars=()):
+        self._endpoint = endpoint
+        self._node_ttl = node_ttl
+        self._allowed_registrars = frozenset(_socket.gethostbyname(address) for address in ('127.0.0.1',) + tuple(allowed_registrars))
+        self._node_id = str(_uuid.uuid4())
+        self._entries = {}  # The registered nodes, keyed by node ID (each is the node data, the relay endpoint, and the expiry timestamp)
+        self._entries_lock = _threading.Lock()
+        self._socket = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def endpoint(self):
+        '''
+        Get the endpoint that the directory service is listening on (with the port picked by the OS, once started).
+
+        Returns:
+            tuple: The endpoint.
+        '''
+        return self._endpoint
+
+    @property
+    def registered_nodes(self):
+        '''
+        Get the nodes currently registered with the directory service.
+
+        Returns:
+            list: A dict for each node, with its "node_id", "data" and "relay_endpoint".
+        '''
+        return self._get_entries(_time.time())
+
+    def start(self):
+        '''
+        Start listening for registrations and queries.
+        '''
+        self._socket = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM, _socket.IPPROTO_UDP)
+        self._socket.bind(self._endpoint)
+        self._socket.settimeout(_DIRECTORY_TICK_SECONDS)
+        self._endpoint = self._socket.getsockname()
+        self._running = True
+        self._thread = _threading.Thread(target=self._run_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop the directory service.
+        '''
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def _run_thread(self):
+        '''
+        Main loop for the thread that handles registrations and queries.
+        '''
+        while self._running:
+            try:
+                data, address = self._socket.recvfrom(_BROADCAST_RECEIVE_BYTES)
+            except (_socket.timeout, _socket.error, OSError):
+                continue
+            message = _RemoteExecutionMessage(None, None)
+            if not message.from_json_bytes(data) or not message.passes_receive_filter(self._node_id):
+                continue
+            if message.type_ == _TYPE_DIRECTORY_REGISTER:
+                self._handle_register_message(message, address)
+            elif message.type_ == _TYPE_DIRECTORY_QUERY:
+                self._handle_query_message(message, address)
+
+    def _handle_register_message(self, message, address):
+        '''
+        Handle a "directory_register" message, adding or refreshing the nodes it lists.
+
+        Args:
+            message (_RemoteExecutionMessage): The message received.
+            address (tuple): The endpoint of the registrar that sent the message, which relays messages to the nodes.
+        '''
+        if address[0] not in self._allowed_registrars:
+            _logger.debug('Refused registration from {0}'.format(address[0]))
+            return
+        expiry = _time.time() + self._node_ttl
+        with self._entries_lock:
+            for entry in (message.data or {}).get('nodes', ()):
+                self._entries[entry['node_id']] = (entry.get('data'), address, expiry)
+
+    def _handle_query_message(self, message, address):
+        '''
+        Handle a "directory_query" message, sending back the registered nodes.
+
+        Args:
+            message (_RemoteExecutionMessage): The message received.
+            address (tuple): The endpoint of the client that sent the message.
+        '''
+        for nodes in _pack_entries(self._get_entries(_time.time())):
+            self._socket.sendto(_RemoteExecutionMessage(_TYPE_DIRECTORY_NODES, self._node_id, message.source, {'nodes': nodes}).to_json_bytes(), address)
+
+    def _get_entries(self, now):
+        '''
+        Remove any expired nodes, and get the rest.
+
+        Args:
+            now (float): The current timestamp.
+
+        Returns:
+            list: A dict for each node, with its "node_id", "data" and "relay_endpoint".
+        '''
+        entries = []
+        with self._entries_lock:
+            for node_id, (node_data, relay_endpoint, expiry) in list(self._entries.items()):
+                if expiry < now:
+                    del self._entries[node_id]
+                    continue
+                entries.append({'node_id': node_id, 'data': node_data, 'relay_endpoint': list(relay_endpoint)})
+        return entries
+
+
+class RemoteExecutionDirectoryRegistrar(object):
+    '''
+    Runs on a machine alongside its remote "nodes": registers the nodes that it discovers over multicast with a directory service, and relays the "open_connection" and "close_connection" messages that clients send it onto the local multicast group.
+    Relaying (rather than having clients message the nodes directly) is needed as every node on a machine shares the multicast port, so a unicast message to that port would only reach one of them.
+
+    Relaying lets clients off this machine control the nodes, which a multicast TTL of 0 otherwise prevents, so only messages sent from the address of the directory service or from `allowed_addresses` are relayed,
+    and an "open_connection" is only relayed if it asks the nodes to connect back to one of those addresses. Clients must set `RemoteExecutionConfig.command_endpoint` to their allowed address (see `RemoteExecutionDirectory`).
+
+    Args:
+        remote_execution (RemoteExecution): The started remote execution session that discovers the local nodes.
+        directory_endpoint (tuple): The endpoint of the directory service.
+        register_seconds (float): The number of seconds between registrations.
+        allowed_addresses (iterable): The addresses (or host names) of the clients allowed to open command connections to the nodes, in addition to the address of the directory service.
+    '''
+
+    def __init__(self, remote_execution, directory_endpoint, register_seconds=DEFAULT_REGISTER_SECONDS, allowed_addresses=()):
+        self._remote_execution = remote_execution
+        self._directory_endpoint = directory_endpoint
+        self._register_seconds = register_seconds
+        self._allowed_addresses = frozenset(_socket.gethostbyname(address) for address in (directory_endpoint[0],) + tuple(allowed_addresses))
+        self._socket = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        '''
+        Start registering nodes and relaying messages.
+        '''
+        self._socket = _socket.socket(_socket.AF_INET, _socket.SOCK_DGRAM, _socket.IPPROTO_UDP)
+        self._socket.bind(('0.0.0.0', 0))
+        self._socket.settimeout(_DIRECTORY_TICK_SECONDS)
+        self._running = True
+        self._thread = _threading.Thread(target=self._run_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop registering nodes and relaying messages (the nodes expire from the directory service once their time-to-live has passed).
+        '''
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def _run_thread(self):
+        '''
+        Main loop for the thread that registers the local nodes and relays messages to them.
+        '''
+        next_register_time = 0
+        while self._running:
+            now = _time.time()
+            if now >= next_register_time:
+                next_register_time = now + self._register_seconds
+                self._register_nodes()
+            try:
+                data, address = self._socket.recvfrom(_BROADCAST_RECEIVE_BYTES)
+            except (_socket.timeout, _socket.error, OSError):
+                continue
+            message = _RemoteExecutionMessage(None, None)
+            if message.from_json_bytes(data) and message.type_ in (_TYPE_OPEN_CONNECTION, _TYPE_CLOSE_CONNECTION):
+                if not self._should_relay(message, address):
+                    _logger.debug('Refused to relay "{0}" from {1}'.format(message.type_, address[0]))
+                    continue
+                broadcast_connection = self._remote_execution._broadcast_connection
+                if broadcast_connection:
+                    broadcast_connection._broadcast_message(message)
+
+    def _should_relay(self, message, address):
+        '''
+        Check whether a message sent to this registrar may be relayed to the local nodes.
+
+        Args:
+            message (_RemoteExecutionMessage): The message received.
+            address (tuple): The endpoint that sent the message.
+
+        Returns:
+            bool: True if the message was sent from an allowed address (and, for "open_connection", asks the nodes to connect back to one), False otherwise.
+        '''
+        if address[0] not in self._allowed_addresses:
+            return False
+        if message.type_ == _TYPE_OPEN_CONNECTION:
+            return (message.data or {}).get('command_ip') in self._allowed_addresses
+        return True
+
+    def _register_nodes(self):
+        '''
+        Register the nodes discovered over multicast with the directory service (nodes that were themselves found through a directory service are skipped).
+        '''
+        broadcast_connection = self._remote_execution._broadcast_connection
+        nodes = broadcast_connection.nodes if broadcast_connection else None
+        if nodes is None:
+            return
+        entries = []
+        for node in nodes.remote_nodes:
+            if nodes.get_relay_endpoint(node['node_id']) is None:
+                node_data = dict(node)
+                entries.append({'node_id': node_data.pop('node_id'), 'data': node_data})
+        for packed_entries in _pack_entries(entries):
+            try:
+                self._socket.sendto(_RemoteExecutionMessage(_TYPE_DIRECTORY_REGISTER, self._remote_execution._node_id, data={'nodes': packed_entries}).to_json_bytes(), self._directory_endpoint)
+            except (_socket.error, OSError) as e:
+                _logger.debug('Failed to register nodes with the directory service: {0}'.format(str(e)))
+
+
+def _pack_entries(entries):
+    '''
+    Utility function to split node entries into batches that fit in a datagram.
+
+    Args:
+        entries (list): The node entries.
+
+    Returns:
+        generator: A list of entries for each datagram.
+    '''
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        entry_bytes = len(_json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        if batch and batch_bytes + entry_bytes > _DIRECTORY_MAX_DATAGRAM_BYTES:
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+    if batch:
+        yield batch
+
+
+def main(argv=None):
+    parser = _argparse.ArgumentParser(description='Run a remote execution directory service, or a registrar that registers the UE4 instances on this machine with one.')
+    parser.add_argument('--bind', default='0.0.0.0', help='Address the directory service listens on.')
+    parser.add_argument('--port', type=int, default=DEFAULT_DIRECTORY_PORT, help='Port the directory service listens on.')
+    parser.add_argument('--register-with', default='', help='Run a registrar for the directory service at this "host:port", rather than a directory service.')
+    parser.add_argument('--allow', action='append', default=[], help='Address of a registrar the directory service accepts registrations from (in addition to the loopback address), or with --register-with, of a client the registrar may relay commands from (in addition to the directory service); may be given more than once.')
+    args = parser.parse_args(argv)
+    _remote_execution.set_log_level('INFO')
+    if args.register_with:
+        host, port = args.register_with.rsplit(':', 1)
+        remote_execution = RemoteExecution(RemoteExecutionConfig())
+        remote_execution.start()
+        service = RemoteExecutionDirectoryRegistrar(remote_execution, (host, int(port)), allowed_addresses=args.allow)
+    else:
+        remote_execution = None
+        service = RemoteExecutionDirectory((args.bind, args.port), allowed_registrars=args.allow)
+    service.start()
+    _logger.info('Running (press Ctrl+C to stop)')
+    try:
+        while True:
+            _time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        if remote_execution:
+            remote_execution.stop()
+
+
+if __name__ == '__main__':
+    main()
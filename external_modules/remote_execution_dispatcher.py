@@ -0,0 +1,186 @@
+import time as _time
+import threading as _threading
+import collections as _collections
+from concurrent import futures as _futures
+
+import remote_execution as _remote_execution
+from remote_execution import (
+    _logger,
+    RemoteExecutionCancelledError,
+    MODE_EXEC_FILE,
+)
+
+PRIORITY_INTERACTIVE = 'interactive'  # User-facing commands (eg, from a UI action) that someone is waiting on
+PRIORITY_NORMAL = 'normal'  # Commands from scripts and tools that aren't time critical
+PRIORITY_BULK = 'bulk'  # Background batch commands (eg, reimports), that can wait behind everything else
+
+DEFAULT_PRIORITY_WEIGHTS = {  # Number of commands run from each priority class per scheduling round, while other classes are waiting
+    PRIORITY_INTERACTIVE: 16,
+    PRIORITY_NORMAL: 4,
+    PRIORITY_BULK: 1,
+}
+DEFAULT_MAX_QUEUE_DEPTH = 256  # Default number of commands that may be queued in each priority class before submitting blocks
+
+_PRIORITY_ORDER = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK)
+
+
+class RemoteExecutionQueueFullError(RuntimeError):
+    '''
+    Raised when a command can't be queued because its priority class stayed full.
+    '''
+
+
+class RemoteExecutionDispatcher(object):
+    '''
+    A prioritized queue in front of a command connection, shared by interactive and batch callers.
+    Commands are run one at a time by a worker thread, which picks the next command by weighted round-robin across the priority classes: each class may run up to its weight in commands per round while others are waiting, so interactive commands jump ahead of queued batch work without starving it.
+
+    A command that is already running can't be preempted, so long batch jobs should be submitted as many small commands.
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession). Only the dispatcher should use it while the dispatcher is open.
+        weights (dict): The weight of each priority class (each must be at least 1).
+        max_queue_depth (int): The number of commands that may be queued in each priority class before submitting blocks.
+    '''
+
+    def __init__(self, runner, weights=DEFAULT_PRIORITY_WEIGHTS, max_queue_depth=DEFAULT_MAX_QUEUE_DEPTH):
+        if any(weights.get(priority, 0) < 1 for priority in _PRIORITY_ORDER):
+            raise ValueError('Every command priority must have a weight of at least 1!')
+        self._runner = runner
+        self._weights = dict(weights)
+        self._max_queue_depth = max_queue_depth
+        self._queues = dict((priority, _collections.deque()) for priority in _PRIORITY_ORDER)
+        self._credits = dict(self._weights)
+        self._condition = _threading.Condition()
+        self._running = True
+        self._worker_thread = _threading.Thread(target=self._run_worker_thread)
+        self._worker_thread.daemon = True
+        self._worker_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def queue_depths(self):
+        '''
+        Get the number of commands waiting in each priority class.
+
+        Returns:
+            dict: The number of queued commands, keyed by priority class.
+        '''
+        with self._condition:
+            return dict((priority, len(queue)) for priority, queue in self._queues.items())
+
+    def submit(self, command, priority=PRIORITY_NORMAL, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, timeout=None, cancel_token=None,
+               queue_timeout=None):
+        '''
+        Queue a command to run remotely, blocking while its priority class is full.
+
+        Args:
+            command (string): The Python command to run remotely.
+            priority (string): The priority class of the command (must be one of PRIORITY_INTERACTIVE, PRIORITY_NORMAL, or PRIORITY_BULK).
+            unattended (bool): True to run this command in "unattended" mode (suppressing some UI).
+            exec_mode (string): The execution mode to use as a string value (must be one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+            raise_on_failure (bool): True for the future to raise a RuntimeError if the command fails on the remote target.
+            timeout (float): The maximum number of seconds to wait for the command to complete once it starts running, or None to wait forever.
+            cancel_token (CancellationToken): A token that can cancel the command while it is queued or waiting for its result, or None.
+            queue_timeout (float): The maximum number of seconds to wait for room in the queue, or None to wait forever.
+
+        Returns:
+            concurrent.futures.Future: The future result from running the remote command (see `command_result` from the protocol definition), with the number of seconds it spent queued added as "queue_wait_seconds".
+        '''
+        if priority not in self._queues:
+            raise ValueError('Unknown command priority "{0}"!'.format(priority))
+        future = _futures.Future()
+        request = (future, command, unattended, exec_mode, raise_on_failure, timeout, cancel_token, priority)
+        with self._condition:
+            queue = self._queues[priority]
+            deadline = _time.time() + queue_timeout if queue_timeout is not None else None
+            while self._running and len(queue) >= self._max_queue_depth:
+                remaining = deadline - _time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise RemoteExecutionQueueFullError('The "{0}" command queue is full!'.format(priority))
+                self._condition.wait(remaining)
+            if not self._running:
+                raise RuntimeError('Remote execution dispatcher is closed!')
+            queue.append((_time.perf_counter(), request))
+            self._condition.notify_all()
+        return future
+
+    def run_command(self, command, priority=PRIORITY_NORMAL, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, timeout=None, cancel_token=None,
+                    queue_timeout=None):
+        '''
+        Queue a command to run remotely, and wait for its result (see `submit`).
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition), with the number of seconds it spent queued added as "queue_wait_seconds".
+        '''
+        return self.submit(command, priority, unattended, exec_mode, raise_on_failure, timeout, cancel_token, queue_timeout).result()
+
+    def close(self, cancel_pending=False):
+        '''
+        Stop accepting commands, and stop the worker thread once the queued commands have run.
+
+        Args:
+            cancel_pending (bool): True to cancel the queued commands rather than running them.
+        '''
+        with self._condition:
+            self._running = False
+            if cancel_pending:
+                for queue in self._queues.values():
+                    while queue:
+                        queue.popleft()[1][0].cancel()
+            self._condition.notify_all()
+        self._worker_thread.join()
+
+    def _next_request(self):
+        '''
+        Take the next command to run from the queues (the lock must be held).
+
+        Returns:
+            tuple: The time the command was queued and the request, or None if every queue is empty.
+        '''
+        waiting = [priority for priority in _PRIORITY_ORDER if self._queues[priority]]
+        if not waiting:
+            return None
+        if not any(self._credits[priority] > 0 for priority in waiting):
+            # Every waiting class has used its share of this round, so start a new one
+            self._credits = dict(self._weights)
+        for priority in waiting:
+            if self._credits[priority] > 0:
+                self._credits[priority] -= 1
+                return self._queues[priority].popleft()
+
+    def _run_worker_thread(self):
+        '''
+        Main loop for the worker thread that runs the queued commands in priority order.
+        '''
+        while True:
+            with self._condition:
+                entry = self._next_request()
+                while entry is None:
+                    if not self._running:
+                        return
+                    self._condition.wait()
+                    entry = self._next_request()
+                self._condition.notify_all()
+            queued_time, (future, command, unattended, exec_mode, raise_on_failure, timeout, cancel_token, priority) = entry
+            queue_wait = _time.perf_counter() - queued_time
+            metrics_sink = _remote_execution._metrics_sink
+            if metrics_sink is not None:
+                metrics_sink.observe('remote_execution_queue_wait_seconds_{0}'.format(priority), queue_wait)
+            if not future.set_running_or_notify_cancel():
+                continue
+            if cancel_token is not None and cancel_token.cancelled:
+                future.set_exception(RemoteExecutionCancelledError('Command was cancelled while it was queued!'))
+                continue
+            try:
+                data = self._runner.run_command(command, unattended, exec_mode, raise_on_failure, timeout=timeout, cancel_token=cancel_token)
+            except Exception as e:
+                _logger.debug('Queued {0} command failed: {1}'.format(priority, str(e)))
+                future.set_exception(e)
+                continue
+            data['queue_wait_seconds'] = queue_wait
+            future.set_result(data)
@@ -0,0 +1,178 @@
+import ast as _ast
+import json as _json
+import hashlib as _hashlib
+import inspect as _inspect
+import textwrap as _textwrap
+
+from remote_execution import (
+    _logger,
+    MODE_EXEC_FILE,
+    MODE_EVAL_STATEMENT,
+)
+
+_CACHE_MODULE_NAME = '_remote_execution_function_cache'  # The name of the module (in sys.modules of the editor) that holds the installed functions
+_MISSING_MARKER = 'RemoteFunctionMissing'  # The value returned by the editor when the requested function isn't installed
+
+# Installs the cache module in the editor (if needed), then the function source keyed by its hash
+_INSTALL_TEMPLATE = '''
+import sys as _sys
+import json as _json
+_cache = _sys.modules.get({module_name!r})
+if _cache is None:
+    import types as _types
+    _cache = _types.ModuleType({module_name!r})
+    _cache.functions = {{}}
+    def _call(function_hash, args_json):
+        function = _cache.functions.get(function_hash)
+        if function is None:
+            return {missing_marker!r}
+        args, kwargs = _json.loads(args_json)
+        return _json.dumps(function(*args, **kwargs))
+    _cache.call = _call
+    _sys.modules[{module_name!r}] = _cache
+_namespace = {{'__name__': {module_name!r}}}
+exec(compile({source!r}, {filename!r}, 'exec'), _namespace)
+_cache.functions[{function_hash!r}] = _namespace[{name!r}]
+'''
+
+# Calls an installed function by its hash, evaluating to its JSON encoded result (or the missing marker if the editor doesn't have it)
+_CALL_TEMPLATE = "(lambda _cache: _cache.call({function_hash!r}, {args_json!r}) if _cache else {missing_marker!r})(__import__('sys').modules.get({module_name!r}))"
+
+# Calls an installed function by its hash with arguments given as Python expressions, which are evaluated in the namespace of the command (only if the function is installed)
+_EVALUATE_TEMPLATE = "(lambda _function: __import__('json').dumps(_function({arguments})) if _function else {missing_marker!r})(getattr(__import__('sys').modules.get({module_name!r}), 'functions', {{}}).get({function_hash!r}))"
+
+
+class RemoteFunction(object):
+    '''
+    A Python function that runs inside a remote editor, and is sent there only once.
+    The first call installs the function source into a registry in the editor keyed by its content hash, and each call after that only sends the hash and the JSON encoded arguments.
+    If the editor has lost the function (eg, because it was restarted), the function is installed again and the call is retried.
+
+    Arguments and return values must be JSON serializable.
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession).
+        source (str): The Python source that defines the function.
+        name (str): The name of the function defined by the source.
+    '''
+
+    def __init__(self, runner, source, name):
+        self._runner = runner
+        self._source = source
+        self._name = name
+        self._hash = _hashlib.sha1((name + '\0' + source).encode('utf-8')).hexdigest()
+        self._installed = False
+
+    @classmethod
+    def from_callable(cls, runner, function):
+        '''
+        Make a remote function from a local function, using its source code. The function must be self-contained (any imports or helpers it needs must be inside it).
+
+        Args:
+            runner (object): The object used to run commands.
+            function (callable): The local function.
+
+        Returns:
+            RemoteFunction: The remote function.
+        '''
+        source_lines = _textwrap.dedent(_inspect.getsource(function)).splitlines()
+        # Drop any decorators, as they won't exist in the editor
+        while source_lines and source_lines[0].startswith('@'):
+            source_lines.pop(0)
+        return cls(runner, '\n'.join(source_lines) + '\n', function.__name__)
+
+    @property
+    def hash(self):
+        '''
+        Get the content hash that identifies this function in the editor.
+
+        Returns:
+            str: The hex digest of the function name and source.
+        '''
+        return self._hash
+
+    def install(self):
+        '''
+        Install this function into the registry of the editor (replacing any function with the same hash).
+        '''
+        self._runner.run_command(_INSTALL_TEMPLATE.format(
+            module_name=_CACHE_MODULE_NAME,
+            missing_marker=_MISSING_MARKER,
+            source=self._source,
+            filename='<remote function {0}>'.format(self._name),
+            function_hash=self._hash,
+            name=self._name,
+        ), exec_mode=MODE_EXEC_FILE, raise_on_failure=True)
+        self._installed = True
+
+    def __call__(self, *args, **kwargs):
+        return self._call(_CALL_TEMPLATE.format(
+            function_hash=self._hash,
+            args_json=_json.dumps([args, kwargs]),
+            missing_marker=_MISSING_MARKER,
+            module_name=_CACHE_MODULE_NAME,
+        ))
+
+    def call_with_expressions(self, *expressions):
+        '''
+        Call this function with arguments given as Python expressions, which are evaluated in the editor (in the namespace of the command), so that values that can't be JSON encoded can be passed to it.
+
+        Args:
+            *expressions (str): The Python expressions giving the positional arguments.
+
+        Returns:
+            object: The JSON decoded return value of the function.
+        '''
+        return self._call(_EVALUATE_TEMPLATE.format(
+            arguments=', '.join('({0})'.format(expression) for expression in expressions),
+            missing_marker=_MISSING_MARKER,
+            module_name=_CACHE_MODULE_NAME,
+            function_hash=self._hash,
+        ))
+
+    def _call(self, command):
+        '''
+        Run a command that calls this function, installing the function first if needed.
+
+        Args:
+            command (str): The Python statement that calls the function.
+
+        Returns:
+            object: The JSON decoded return value of the function.
+        '''
+        if not self._installed:
+            self.install()
+        result = self._evaluate(command)
+        if result == _MISSING_MARKER:
+            _logger.debug('Remote function {0} ({1}) is missing from the editor, reinstalling'.format(self._name, self._hash))
+            self.install()
+            result = self._evaluate(command)
+        return _json.loads(result)
+
+    def _evaluate(self, command):
+        '''
+        Evaluate a command in the editor, and decode the string it returns.
+
+        Args:
+            command (str): The Python statement to evaluate.
+
+        Returns:
+            str: The string returned by the statement.
+        '''
+        data = self._runner.run_command(command, exec_mode=MODE_EVAL_STATEMENT, raise_on_failure=True)
+        return _ast.literal_eval(data['result'])
+
+
+def remote_function(runner):
+    '''
+    Decorator that turns a local function into a `RemoteFunction` run by the given runner.
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession).
+
+    Returns:
+        callable: The decorator.
+    '''
+    def _decorator(function):
+        return RemoteFunction.from_callable(runner, function)
+    return _decorator
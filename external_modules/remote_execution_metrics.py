@@ -0,0 +1,201 @@
+import json as _json
+import time as _time
+import threading as _threading
+
+# Upper bounds (in seconds) of the histogram buckets used for timings
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Histogram(object):
+    '''
+    A histogram of observed values, with cumulative-ready bucket counts.
+
+    Args:
+        buckets (tuple): The sorted upper bounds of the buckets.
+    '''
+
+    __slots__ = ('buckets', 'bucket_counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, fraction):
+        '''
+        Estimate a quantile from the bucket counts (as the upper bound of the bucket containing it).
+
+        Args:
+            fraction (float): The quantile to estimate (eg, 0.95).
+
+        Returns:
+            float: The estimated quantile, or None if nothing has been observed.
+        '''
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(upper_bound, self.max)
+        return self.max
+
+
+class InMemoryMetricsSink(object):
+    '''
+    A metrics sink that accumulates counters and timing histograms in memory.
+
+    Args:
+        buckets (tuple): The upper bounds (in seconds) of the histogram buckets.
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._histograms = {}
+        self._lock = _threading.Lock()
+
+    def count(self, name, value=1):
+        '''
+        Add to a counter.
+
+        Args:
+            name (string): The name of the counter.
+            value (int): The amount to add.
+        '''
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        '''
+        Record a timing in a histogram.
+
+        Args:
+            name (string): The name of the histogram.
+            value (float): The timing (in seconds).
+        '''
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram(self._buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        '''
+        Clear all counters and histograms.
+        '''
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def snapshot(self):
+        '''
+        Get the current value of every counter, and a summary of every histogram.
+
+        Returns:
+            dict: The "counters" (keyed by name), and the "histograms" (keyed by name, with the count, sum, min, max, and estimated p50, p95 and p99 of each).
+        '''
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': dict((name, {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'min': histogram.min,
+                    'max': histogram.max,
+                    'p50': histogram.quantile(0.50),
+                    'p95': histogram.quantile(0.95),
+                    'p99': histogram.quantile(0.99),
+                }) for name, histogram in self._histograms.items()),
+            }
+
+
+class PrometheusMetricsSink(InMemoryMetricsSink):
+    '''
+    A metrics sink that accumulates metrics in memory, and can dump them in the Prometheus text exposition format (eg, for the node exporter textfile collector).
+
+    Args:
+        buckets (tuple): The upper bounds (in seconds) of the histogram buckets.
+    '''
+
+    def dump(self):
+        '''
+        Get the current metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        '''
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append('# TYPE {0} counter'.format(name))
+                lines.append('{0} {1}'.format(name, self._counters[name]))
+            for name in sorted(self._histograms):
+                histogram = self._histograms[name]
+                lines.append('# TYPE {0} histogram'.format(name))
+                cumulative = 0
+                for upper_bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append('{0}_bucket{{le="{1}"}} {2}'.format(name, upper_bound, cumulative))
+                lines.append('{0}_bucket{{le="+Inf"}} {1}'.format(name, histogram.count))
+                lines.append('{0}_sum {1}'.format(name, repr(histogram.sum)))
+                lines.append('{0}_count {1}'.format(name, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filepath):
+        '''
+        Write the current metrics to a file in the Prometheus text exposition format.
+
+        Args:
+            filepath (str): The path of the file to write.
+        '''
+        with open(filepath, 'w') as f:
+            f.write(self.dump())
+
+
+class JsonLinesMetricsSink(object):
+    '''
+    A metrics sink that appends every counter increment and timing to a file as a line of JSON, for offline analysis.
+
+    Args:
+        filepath (str): The path of the file to append to.
+    '''
+
+    def __init__(self, filepath):
+        self._file = open(filepath, 'a')
+        self._lock = _threading.Lock()
+
+    def count(self, name, value=1):
+        self._write({'time': _time.time(), 'type': 'counter', 'name': name, 'value': value})
+
+    def observe(self, name, value):
+        self._write({'time': _time.time(), 'type': 'timing', 'name': name, 'value': value})
+
+    def close(self):
+        '''
+        Close the file.
+        '''
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _write(self, event):
+        line = _json.dumps(event) + '\n'
+        with self._lock:
+            if self._file:
+                self._file.write(line)
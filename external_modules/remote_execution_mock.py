@@ -0,0 +1,399 @@
+import io as _io
+import os as _os
+import sys as _sys
+import uuid as _uuid
+import time as _time
+import random as _random
+import shlex as _shlex
+import socket as _socket
+import getpass as _getpass
+import argparse as _argparse
+import selectors as _selectors
+import threading as _threading
+import traceback as _traceback
+
+from remote_execution import (
+    _TYPE_PING,
+    _TYPE_PONG,
+    _TYPE_OPEN_CONNECTION,
+    _TYPE_CLOSE_CONNECTION,
+    _TYPE_COMMAND,
+    _TYPE_COMMAND_RESULT,
+    _COMMAND_RECEIVE_CHUNK_BYTES,
+    _RemoteExecutionMessage,
+    _RemoteExecutionMessageReader,
+    _create_broadcast_socket,
+    _logger,
+    RemoteExecutionConfig,
+    MODE_EXEC_FILE,
+    MODE_EXEC_STATEMENT,
+    MODE_EVAL_STATEMENT,
+)
+
+_MOCK_ENGINE_VERSION = '4.26.0-mock'  # The engine version reported in the "pong" data of mock nodes
+
+
+class _ThreadOutputStream(object):
+    '''
+    A stream that replaces sys.stdout and sys.stderr, so that each mock node can capture the output of its own commands while other nodes run commands on other threads.
+
+    Args:
+        stream (file): The original stream, written to by any thread that isn't capturing output.
+    '''
+
+    _local = _threading.local()
+    _install_lock = _threading.Lock()
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        capture = getattr(self._local, 'capture', None)
+        return (capture if capture is not None else self._stream).write(text)
+
+    def flush(self):
+        capture = getattr(self._local, 'capture', None)
+        (capture if capture is not None else self._stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    @classmethod
+    def capture(cls, output):
+        '''
+        Capture stdout and stderr of the current thread into the given stream, or stop capturing.
+
+        Args:
+            output (io.StringIO): The stream to capture into, or None to stop capturing.
+        '''
+        with cls._install_lock:
+            if not isinstance(_sys.stdout, cls):
+                _sys.stdout = cls(_sys.stdout)
+            if not isinstance(_sys.stderr, cls):
+                _sys.stderr = cls(_sys.stderr)
+        cls._local.capture = output
+
+
+class MockRemoteExecutionNode(object):
+    '''
+    A stand-in for a UE4 instance running Python, that speaks the remote execution protocol without Unreal.
+    It answers "ping" with "pong" on the multicast group, honors "open_connection" and "close_connection", and runs "command" messages in its own Python namespace, replying with "command_result".
+
+    Commands run in-process, in a namespace private to this node, with stdout and stderr captured as the command output. This isolates nodes from each other, but is not a security boundary.
+
+    Args:
+        config (RemoteExecutionConfig): Configuration controlling the connection settings (only the multicast settings are used).
+        node_data (dict): Extra "pong" data for this node, overriding the defaults (eg, "project_name" or "engine_version").
+        latency (float): The number of seconds to delay each "pong" and "command_result" by, to simulate a busy editor tick or a remote machine.
+        packet_loss (float): The probability (from 0 to 1) of ignoring each received UDP message, to simulate a lossy network.
+        extra_output_bytes (int): The number of bytes of filler output to add to each command result, to simulate commands with large outputs.
+    '''
+
+    def __init__(self, config=RemoteExecutionConfig(), node_data=None, latency=0, packet_loss=0, extra_output_bytes=0):
+        self._config = config
+        self._node_id = str(_uuid.uuid4())
+        self._node_data = {
+            'user': _getpass.getuser(),
+            'machine': _socket.gethostname(),
+            'engine_version': _MOCK_ENGINE_VERSION,
+            'engine_root': '',
+            'project_root': '',
+            'project_name': 'MockProject',
+        }
+        self._node_data.update(node_data or {})
+        self.latency = latency
+        self.packet_loss = packet_loss
+        self.extra_output_bytes = extra_output_bytes
+        self._namespace = {'__name__': '__main__'}
+        self._running = False
+        self._broadcast_socket = None
+        self._broadcast_thread = None
+        self._wake_sockets = None
+        self._command_socket = None
+        self._command_lock = _threading.Lock()
+        self.commands_received = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def node_id(self):
+        '''
+        Get the ID of this mock node (as sent in its "pong" responses).
+
+        Returns:
+            string: The ID of this node.
+        '''
+        return self._node_id
+
+    def start(self):
+        '''
+        Start answering discovery and connection requests on the multicast group.
+        '''
+        self._running = True
+        self._broadcast_socket = _create_broadcast_socket(self._config)
+        self._broadcast_socket.setblocking(False)
+        self._wake_sockets = _socket.socketpair()
+        self._broadcast_thread = _threading.Thread(target=self._run_broadcast_thread)
+        self._broadcast_thread.daemon = True
+        self._broadcast_thread.start()
+
+    def stop(self):
+        '''
+        Stop this mock node, dropping any open command connection (as if the editor had exited).
+        '''
+        self._running = False
+        if self._wake_sockets:
+            self._wake_sockets[1].send(b'\0')
+        if self._broadcast_thread:
+            self._broadcast_thread.join()
+            self._broadcast_thread = None
+        if self._wake_sockets:
+            for wake_socket in self._wake_sockets:
+                wake_socket.close()
+            self._wake_sockets = None
+        if self._broadcast_socket:
+            self._broadcast_socket.close()
+            self._broadcast_socket = None
+        self._close_command_connection()
+
+    def _run_broadcast_thread(self):
+        '''
+        Main loop for the thread that handles UDP messages.
+        '''
+        selector = _selectors.DefaultSelector()
+        selector.register(self._broadcast_socket, _selectors.EVENT_READ)
+        selector.register(self._wake_sockets[0], _selectors.EVENT_READ)
+        try:
+            while self._running:
+                for key, _events in selector.select():
+                    if key.fileobj is not self._broadcast_socket:
+                        continue
+                    while self._running:
+                        try:
+                            data = self._broadcast_socket.recv(4096)
+                        except (_socket.error, OSError):
+                            break
+                        if self.packet_loss and _random.random() < self.packet_loss:
+                            continue
+                        self._handle_data(data)
+        finally:
+            selector.close()
+
+    def _handle_data(self, data):
+        '''
+        Handle data received from the UDP broadcast socket.
+
+        Args:
+            data (bytes): The raw bytes received from the socket.
+        '''
+        message = _RemoteExecutionMessage(None, None)
+        if not message.from_json_bytes(data) or not message.passes_receive_filter(self._node_id):
+            return
+        if message.type_ == _TYPE_PING:
+            self._delay()
+            self._broadcast_socket.sendto(_RemoteExecutionMessage(_TYPE_PONG, self._node_id, message.source, self._node_data).to_json_bytes(),
+                                          self._config.multicast_group_endpoint)
+        elif message.type_ == _TYPE_OPEN_CONNECTION:
+            self._open_command_connection(message.source, (message.data['command_ip'], message.data['command_port']))
+        elif message.type_ == _TYPE_CLOSE_CONNECTION:
+            self._close_command_connection()
+
+    def _open_command_connection(self, remote_node_id, command_endpoint):
+        '''
+        Connect to the command endpoint of a client, replacing any open command connection (as the editor only supports one at a time).
+
+        Args:
+            remote_node_id (string): The ID of the client node that requested the connection.
+            command_endpoint (tuple): The endpoint tuple to connect to.
+        '''
+        self._close_command_connection()
+        try:
+            command_socket = _socket.create_connection(command_endpoint)
+        except (_socket.error, OSError) as e:
+            _logger.debug('Mock node failed to connect to {0}: {1}'.format(command_endpoint, str(e)))
+            return
+        self._command_socket = command_socket
+        command_thread = _threading.Thread(target=self._run_command_thread, args=(command_socket, remote_node_id))
+        command_thread.daemon = True
+        command_thread.start()
+
+    def _close_command_connection(self):
+        '''
+        Close the command connection, if it is open.
+        '''
+        command_socket, self._command_socket = self._command_socket, None
+        if command_socket:
+            try:
+                command_socket.shutdown(_socket.SHUT_RDWR)
+            except (_socket.error, OSError):
+                pass
+            command_socket.close()
+
+    def _run_command_thread(self, command_socket, remote_node_id):
+        '''
+        Main loop for the thread that handles "command" messages on a command connection.
+
+        Args:
+            command_socket (socket.socket): The connected command socket.
+            remote_node_id (string): The ID of the client node on the other end of the connection.
+        '''
+        reader = _RemoteExecutionMessageReader()
+        while True:
+            try:
+                data = command_socket.recv(_COMMAND_RECEIVE_CHUNK_BYTES)
+            except (_socket.error, OSError):
+                return
+            if not data:
+                return
+            reader.feed(data)
+            json_bytes = reader.next_document()
+            while json_bytes is not None:
+                message = _RemoteExecutionMessage(None, None)
+                if message.from_json_bytes(json_bytes) and message.passes_receive_filter(self._node_id) and message.type_ == _TYPE_COMMAND:
+                    result = self._run_command(message.data['command'], message.data.get('exec_mode', MODE_EXEC_FILE))
+                    self._delay()
+                    try:
+                        command_socket.sendall(_RemoteExecutionMessage(_TYPE_COMMAND_RESULT, self._node_id, remote_node_id, result).to_json_bytes())
+                    except (_socket.error, OSError):
+                        return
+                json_bytes = reader.next_document()
+
+    def _run_command(self, command, exec_mode):
+        '''
+        Run a command in the namespace of this node, following the semantics of the editor's execution modes.
+
+        Args:
+            command (string): The Python command to run.
+            exec_mode (string): The execution mode (one of MODE_EXEC_FILE, MODE_EXEC_STATEMENT, or MODE_EVAL_STATEMENT).
+
+        Returns:
+            dict: The "command_result" data.
+        '''
+        self.commands_received += 1
+        output = _io.StringIO()
+        result = 'None'
+        success = True
+        with self._command_lock:
+            _ThreadOutputStream.capture(output)
+            try:
+                if exec_mode == MODE_EVAL_STATEMENT:
+                    result = repr(eval(compile(command, '<string>', 'eval'), self._namespace))
+                elif exec_mode == MODE_EXEC_STATEMENT:
+                    exec(compile(command, '<string>', 'single'), self._namespace)
+                else:
+                    self._exec_file(command)
+            except SystemExit:
+                pass
+            except Exception:
+                success = False
+                result = _traceback.format_exc()
+            finally:
+                _ThreadOutputStream.capture(None)
+        command_output = [{'type': 'Info', 'output': line} for line in output.getvalue().splitlines()]
+        if self.extra_output_bytes:
+            command_output.append({'type': 'Info', 'output': 'x' * self.extra_output_bytes})
+        return {
+            'success': success,
+            'command': command,
+            'result': result,
+            'output': command_output,
+        }
+
+    def _exec_file(self, command):
+        '''
+        Run a command in "ExecuteFile" mode, which is either a literal Python script, or a path to a Python file with optional arguments.
+
+        Args:
+            command (string): The Python script, or file path and arguments (quoted if they contain spaces).
+        '''
+        args = _split_command_line(command)
+        if args and args[0].endswith('.py') and _os.path.isfile(args[0]):
+            with open(args[0]) as script_file:
+                code = compile(script_file.read(), args[0], 'exec')
+            namespace = dict(self._namespace, __file__=args[0])
+            saved_argv = _sys.argv
+            _sys.argv = args
+            try:
+                exec(code, namespace)
+            finally:
+                _sys.argv = saved_argv
+            return
+        exec(compile(command, '<string>', 'exec'), self._namespace)
+
+    def _delay(self):
+        '''
+        Sleep for the simulated latency of this node.
+        '''
+        if self.latency:
+            _time.sleep(self.latency)
+
+
+def _split_command_line(command):
+    '''
+    Utility function to split an "ExecuteFile" command into a file path and arguments, honoring quotes but (like the editor) not backslash escapes, so Windows paths survive.
+
+    Args:
+        command (string): The command to split.
+
+    Returns:
+        list: The file path and arguments, or an empty list if the command can't be split (eg, a Python script with unbalanced quotes).
+    '''
+    lexer = _shlex.shlex(command, posix=True)
+    lexer.whitespace_split = True
+    lexer.escape = ''
+    try:
+        return list(lexer)
+    except ValueError:
+        return []
+
+
+def start_mock_nodes(count, config=RemoteExecutionConfig(), node_data=None, **kwargs):
+    '''
+    Start a number of mock nodes on the same multicast group.
+
+    Args:
+        count (int): The number of mock nodes to start.
+        config (RemoteExecutionConfig): Configuration controlling the connection settings.
+        node_data (dict): Extra "pong" data for every node. A "project_name" of "MockProject<index>" is used unless one is given.
+        **kwargs: Further arguments for each `MockRemoteExecutionNode` (eg, latency, packet_loss, or extra_output_bytes).
+
+    Returns:
+        list: The started mock nodes.
+    '''
+    nodes = []
+    for index in range(count):
+        data = {'project_name': 'MockProject{0}'.format(index)}
+        data.update(node_data or {})
+        node = MockRemoteExecutionNode(config, data, **kwargs)
+        node.start()
+        nodes.append(node)
+    return nodes
+
+
+def main(argv=None):
+    parser = _argparse.ArgumentParser(description='Run mock UE4 remote execution nodes.')
+    parser.add_argument('--nodes', type=int, default=1, help='Number of mock nodes to run.')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds to delay each response by.')
+    parser.add_argument('--packet-loss', type=float, default=0, help='Probability of ignoring each UDP message.')
+    parser.add_argument('--extra-output-bytes', type=int, default=0, help='Bytes of filler output to add to each command result.')
+    args = parser.parse_args(argv)
+    nodes = start_mock_nodes(args.nodes, latency=args.latency, packet_loss=args.packet_loss, extra_output_bytes=args.extra_output_bytes)
+    for node in nodes:
+        print('Mock node {0}'.format(node.node_id))
+    try:
+        while True:
+            _time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for node in nodes:
+            node.stop()
+
+
+if __name__ == '__main__':
+    main()
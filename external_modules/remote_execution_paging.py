@@ -0,0 +1,166 @@
+from remote_execution import _logger
+from remote_execution_functions import RemoteFunction
+
+DEFAULT_PAGE_SIZE = 2000  # Default number of items fetched from the editor per command
+
+# Runs in the editor: holds a cursor (an iterator) per paged query, and returns the next page of items from one
+# Assets are found one package path at a time (walking the sub-paths lazily), so a page only queries the asset registry for the paths it reaches, rather than for every asset up front
+_CURSOR_SOURCE = '''
+_CURSORS = {}
+
+def _iter_assets(path, class_names, recursive):
+    import unreal
+    registry = unreal.AssetRegistryHelpers.get_asset_registry()
+    package_paths = [path]
+    while package_paths:
+        package_path = package_paths.pop()
+        for asset in registry.get_assets(unreal.ARFilter(package_paths=[package_path], class_names=class_names, recursive_paths=False)):
+            yield dict(object_path=str(asset.object_path), package_name=str(asset.package_name), package_path=str(asset.package_path),
+                       asset_name=str(asset.asset_name), asset_class=str(asset.asset_class))
+        if recursive:
+            package_paths.extend(reversed(registry.get_sub_paths(package_path, False)))
+
+def _remote_cursor(action, cursor_id, page_size, iterable=None):
+    import uuid
+    import itertools
+    if action == 'close':
+        _CURSORS.pop(cursor_id, None)
+        return None
+    if action == 'open':
+        cursor_id = uuid.uuid4().hex
+        _CURSORS[cursor_id] = iter(iterable)
+    elif action == 'open_assets':
+        cursor_id = uuid.uuid4().hex
+        _CURSORS[cursor_id] = _iter_assets(*iterable)
+    cursor = _CURSORS.get(cursor_id)
+    if cursor is None:
+        raise KeyError('Remote cursor {0} does not exist (it may have been closed, or the editor restarted)'.format(cursor_id))
+    items = list(itertools.islice(cursor, page_size))
+    done = len(items) < page_size
+    if done:
+        del _CURSORS[cursor_id]
+    return {'cursor_id': cursor_id, 'items': items, 'done': done}
+'''
+
+# Lazily describes each actor in the current editor level(s)
+_ACTORS_EXPRESSION = ("(dict(name=actor.get_name(), label=actor.get_actor_label(), actor_class=actor.get_class().get_name(), path_name=actor.get_path_name()) "
+                      "for actor in __import__('unreal').EditorLevelLibrary.get_all_level_actors() "
+                      "if not {class_names!r} or actor.get_class().get_name() in {class_names!r})")
+
+
+class RemotePager(object):
+    '''
+    Pages through large collections in a remote "node" (a UE4 instance running Python), a fixed number of items per command.
+    The editor holds a cursor over the collection between commands, so each page only costs the work for the items on it, and the items of each page can be processed before the next page is fetched.
+
+    Items must be JSON serializable.
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession).
+        page_size (int): The default number of items to fetch per command.
+    '''
+
+    def __init__(self, runner, page_size=DEFAULT_PAGE_SIZE):
+        self._cursor = RemoteFunction(runner, _CURSOR_SOURCE, '_remote_cursor')
+        self._page_size = page_size
+
+    def iter_pages(self, expression, page_size=None):
+        '''
+        Page through the items of an iterable in the editor.
+        The cursor is closed in the editor once it is exhausted, or when the generator is closed early.
+
+        Args:
+            expression (str): The Python expression giving the iterable (evaluated in the namespace of the commands run on the remote party). A generator expression keeps any per-item work lazy.
+            page_size (int): The number of items to fetch per command, or None for the default.
+
+        Returns:
+            generator: A list of items for each page.
+        '''
+        page_size = page_size or self._page_size
+        return self._iter_cursor_pages(lambda: self._cursor.call_with_expressions(repr('open'), 'None', repr(page_size), expression), page_size)
+
+    def iterate(self, expression, page_size=None):
+        '''
+        Iterate the items of an iterable in the editor, fetching them a page at a time (see `iter_pages`).
+
+        Args:
+            expression (str): The Python expression giving the iterable.
+            page_size (int): The number of items to fetch per command, or None for the default.
+
+        Returns:
+            generator: The items.
+        '''
+        return self._iter_items(self.iter_pages(expression, page_size))
+
+    def iter_assets(self, path='/Game', class_filter=None, recursive=True, page_size=None):
+        '''
+        Iterate the assets found by the asset registry of the editor.
+
+        Args:
+            path (str): The package path to search (eg, "/Game/Characters").
+            class_filter (list): The names of the asset classes to include (eg, ["StaticMesh", "Skeleton"]), or None for every class.
+            recursive (bool): True to include the assets in sub-paths.
+            page_size (int): The number of assets to fetch per command, or None for the default.
+
+        Returns:
+            generator: A dict for each asset, with its "object_path", "package_name", "package_path", "asset_name" and "asset_class".
+        '''
+        page_size = page_size or self._page_size
+        return self._iter_items(self._iter_cursor_pages(lambda: self._cursor('open_assets', None, page_size, [path, list(class_filter or []), recursive]), page_size))
+
+    def iter_actors(self, class_filter=None, page_size=None):
+        '''
+        Iterate the actors in the levels open in the editor.
+
+        Args:
+            class_filter (list): The names of the actor classes to include (eg, ["CameraActor"]), or None for every class.
+            page_size (int): The number of actors to fetch per command, or None for the default.
+
+        Returns:
+            generator: A dict for each actor, with its "name", "label", "actor_class" and "path_name".
+        '''
+        return self.iterate(_ACTORS_EXPRESSION.format(class_names=list(class_filter or [])), page_size)
+
+    def _iter_cursor_pages(self, open_cursor, page_size):
+        '''
+        Page through the items of a cursor in the editor, closing it if the generator is closed early.
+
+        Args:
+            open_cursor (callable): Opens the cursor, returning its first page.
+            page_size (int): The number of items to fetch per command.
+
+        Returns:
+            generator: A list of items for each page.
+        '''
+        page = open_cursor()
+        try:
+            while True:
+                if page['items']:
+                    yield page['items']
+                if page['done']:
+                    break
+                page = self._cursor('next', page['cursor_id'], page_size)
+        finally:
+            if not page['done']:
+                try:
+                    self._cursor('close', page['cursor_id'], page_size)
+                except Exception as e:
+                    # Closing is only tidying up, so it mustn't hide the error that stopped the paging (if any)
+                    _logger.warning('Failed to close remote cursor {0}: {1}'.format(page['cursor_id'], e))
+
+    def _iter_items(self, pages):
+        '''
+        Iterate the items of each page, closing the pages when the generator is closed early.
+
+        Args:
+            pages (generator): A list of items for each page.
+
+        Returns:
+            generator: The items.
+        '''
+        try:
+            for items in pages:
+                for item in items:
+                    yield item
+        finally:
+            pages.close()
@@ -0,0 +1,332 @@
+import json as _json
+import gzip as _gzip
+import zlib as _zlib
+import time as _time
+import argparse as _argparse
+import threading as _threading
+
+import remote_execution as _remote_execution
+import remote_execution_mock as _remote_execution_mock
+from remote_execution import (
+    _logger,
+    RemoteExecution,
+    RemoteExecutionConfig,
+    MODE_EXEC_FILE,
+)
+
+RECORDING_VERSION = 1  # Version of the recording format, written to the header of each recording
+DISCOVERY_TIMEOUT_SECONDS = 30  # Number of seconds to wait for a node to replay against to be discovered
+
+EVENT_HEADER = 'header'  # The first event of every recording
+EVENT_COMMAND = 'command'  # A command and its result
+EVENT_BATCH = 'batch'  # A batch of pipelined commands (see `RemoteExecution.run_commands`) and their results
+EVENT_NODE_FOUND = 'node_found'  # A remote node was discovered
+EVENT_NODE_LOST = 'node_lost'  # A remote node timed out
+EVENT_OPEN_CONNECTION = 'open_connection'  # A command connection was opened to a remote node
+EVENT_CLOSE_CONNECTION = 'close_connection'  # The command connection was closed
+
+
+class RemoteExecutionRecorder(object):
+    '''
+    Records the remote execution traffic of a session to a compact file (gzipped JSON lines), for replaying later with `RemoteExecutionReplayer`.
+    This wraps the object used to run commands, so is used in its place (eg, as the runner of a `RemoteFunction` or a `RemoteExecutionDispatcher`). Every command, its result and its timing is recorded, along with node events when given the RemoteExecution.
+    Each event is flushed as it is written, so a recording cut short by a crash still replays up to its last event. A batch run on a runner without `run_commands` (eg, a RemoteExecutionSession) runs one command at a time.
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession).
+        path (str): The path of the recording to write.
+        remote_execution (RemoteExecution): The remote execution session to record the node and command connection events of, or None to only record commands (defaults to the runner, if it is a RemoteExecution).
+    '''
+
+    def __init__(self, runner, path, remote_execution=None):
+        self._runner = runner
+        self._remote_execution = remote_execution if remote_execution is not None else (runner if isinstance(runner, RemoteExecution) else None)
+        self._file = _gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = _threading.Lock()
+        self._start_time = _time.perf_counter()
+        self._write_event(EVENT_HEADER, version=RECORDING_VERSION, start_time=_time.time())
+        if self._remote_execution is not None:
+            self._remote_execution.add_node_found_callback(self._handle_node_found)
+            self._remote_execution.add_node_lost_callback(self._handle_node_lost)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        Stop recording, and close the recording.
+        '''
+        if self._remote_execution is not None:
+            self._remote_execution.remove_node_found_callback(self._handle_node_found)
+            self._remote_execution.remove_node_lost_callback(self._handle_node_lost)
+        with self._lock:
+            self._file.close()
+
+    def open_command_connection(self, remote_node_id, **kwargs):
+        '''
+        Open a command connection to the given remote node, recording the event (see `RemoteExecution.open_command_connection`).
+        '''
+        self._check_remote_execution()
+        start_time = _time.perf_counter()
+        handshake_timing = self._remote_execution.open_command_connection(remote_node_id, **kwargs)
+        self._write_event(EVENT_OPEN_CONNECTION, start_time, node_id=remote_node_id, duration=_time.perf_counter() - start_time)
+        return handshake_timing
+
+    def close_command_connection(self):
+        '''
+        Close any command connection that may currently be open, recording the event (see `RemoteExecution.close_command_connection`).
+        '''
+        self._check_remote_execution()
+        self._remote_execution.close_command_connection()
+        self._write_event(EVENT_CLOSE_CONNECTION)
+
+    def run_command(self, command, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, **kwargs):
+        '''
+        Run a command remotely, recording it along with its result and timing (see `RemoteExecution.run_command`).
+
+        Returns:
+            dict: The result from running the remote command (see `command_result` from the protocol definition).
+        '''
+        start_time = _time.perf_counter()
+        try:
+            data = self._runner.run_command(command, unattended, exec_mode, False, **kwargs)
+        except Exception as e:
+            self._write_event(EVENT_COMMAND, start_time, command=command, unattended=unattended, exec_mode=exec_mode, compress=kwargs.get('compress', False),
+                              duration=_time.perf_counter() - start_time, error='{0}: {1}'.format(type(e).__name__, e))
+            raise
+        self._write_event(EVENT_COMMAND, start_time, command=command, unattended=unattended, exec_mode=exec_mode, compress=kwargs.get('compress', False),
+                          duration=_time.perf_counter() - start_time, result=data)
+        if raise_on_failure and not data['success']:
+            raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
+        return data
+
+    def run_commands(self, commands, unattended=True, exec_mode=MODE_EXEC_FILE, raise_on_failure=False, **kwargs):
+        '''
+        Run a batch of commands remotely, recording them along with their results and the timing of the batch (see `RemoteExecution.run_commands`).
+
+        Returns:
+            generator: The results from running the remote commands, in the same order as the commands.
+        '''
+        commands = list(commands)
+        results = []
+        start_time = _time.perf_counter()
+        try:
+            for data in _run_commands(self._runner, commands, unattended, exec_mode, **kwargs):
+                results.append(data)
+                if raise_on_failure and not data['success']:
+                    raise RuntimeError('Remote Python Command failed! {0}'.format(data['result']))
+                yield data
+        finally:
+            self._write_event(EVENT_BATCH, start_time, commands=commands[:len(results)], unattended=unattended, exec_mode=exec_mode,
+                              duration=_time.perf_counter() - start_time, results=results)
+
+    def _check_remote_execution(self):
+        '''
+        Check there is a RemoteExecution to manage the command connection of.
+        '''
+        if self._remote_execution is None:
+            raise RuntimeError('The recorder has no RemoteExecution to manage the command connection of (pass remote_execution)!')
+
+    def _handle_node_found(self, node):
+        self._write_event(EVENT_NODE_FOUND, node=dict(node))
+
+    def _handle_node_lost(self, node):
+        self._write_event(EVENT_NODE_LOST, node=dict(node))
+
+    def _write_event(self, event, start_time=None, **fields):
+        '''
+        Write an event to the recording.
+
+        Args:
+            event (str): The type of the event.
+            start_time (float): The perf_counter time the event started at, or None for now.
+            **fields: The data of the event.
+        '''
+        fields['event'] = event
+        fields['time'] = (start_time if start_time is not None else _time.perf_counter()) - self._start_time
+        line = _json.dumps(fields, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                # Sync flush, so the events so far can be read even if the recording is never closed
+                self._file.flush()
+
+
+class RemoteExecutionReplayer(object):
+    '''
+    Replays the commands of a recording made by `RemoteExecutionRecorder`, against a mock node or a real editor, and compares the results and timings with the recorded ones.
+    Commands are replayed one at a time in the order they started, so commands that were run concurrently when recorded are serialized.
+    A batch is replayed one command at a time when the runner has no `run_commands` (eg, a RemoteExecutionSession).
+
+    Args:
+        runner (object): The object used to run commands (a RemoteExecution with an open command connection, or a RemoteExecutionSession).
+        speed (float): The speed to replay at relative to the recording (eg, 1 for the original pacing, or 2 for twice as fast), or None to replay each command as soon as the last one completes.
+    '''
+
+    def __init__(self, runner, speed=1.0):
+        self._runner = runner
+        self._speed = speed
+
+    def replay(self, path, on_command=None):
+        '''
+        Replay the commands of a recording.
+
+        Args:
+            path (str): The path of the recording.
+            on_command (callable): A function to call after each command is replayed, with the recorded event and the replayed result (or the exception raised), or None.
+
+        Returns:
+            dict: A report of the replay, with the number of "commands" replayed, the indices of the commands whose success or result differ from the recording as "mismatches", the "recorded_seconds" and "replayed_seconds" from the first to the last command, the "recorded_command_seconds" and "replayed_command_seconds" spent running commands, and the recorded and replayed duration of each command as "timings".
+        '''
+        report = {
+            'commands': 0,
+            'mismatches': [],
+            'recorded_seconds': 0.0,
+            'replayed_seconds': 0.0,
+            'recorded_command_seconds': 0.0,
+            'replayed_command_seconds': 0.0,
+            'timings': [],
+        }
+        first_event_time = None
+        replay_start_time = _time.perf_counter()
+        # Events are written as commands complete, so commands that overlapped need putting back in the order they started
+        events = sorted((event for event in read_recording(path) if event['event'] in (EVENT_COMMAND, EVENT_BATCH)), key=lambda event: event['time'])
+        for event in events:
+            if first_event_time is None:
+                first_event_time = event['time']
+                replay_start_time = _time.perf_counter()
+            elif self._speed:
+                delay = (event['time'] - first_event_time) / self._speed - (_time.perf_counter() - replay_start_time)
+                if delay > 0:
+                    _time.sleep(delay)
+            start_time = _time.perf_counter()
+            try:
+                if event['event'] == EVENT_COMMAND:
+                    replayed = self._runner.run_command(event['command'], event['unattended'], event['exec_mode'], compress=event.get('compress', False))
+                    matched = _results_match(event.get('result'), replayed)
+                else:
+                    replayed = list(_run_commands(self._runner, event['commands'], event['unattended'], event['exec_mode']))
+                    matched = len(replayed) == len(event['results']) and all(_results_match(a, b) for a, b in zip(event['results'], replayed))
+            except Exception as e:
+                _logger.debug('Replayed command failed: {0}'.format(str(e)))
+                replayed = e
+                matched = 'error' in event
+            duration = _time.perf_counter() - start_time
+            if not matched:
+                report['mismatches'].append(report['commands'])
+            report['commands'] += 1
+            report['recorded_seconds'] = event['time'] + event['duration'] - first_event_time
+            report['replayed_seconds'] = _time.perf_counter() - replay_start_time
+            report['recorded_command_seconds'] += event['duration']
+            report['replayed_command_seconds'] += duration
+            report['timings'].append((event['duration'], duration))
+            if on_command is not None:
+                on_command(event, replayed)
+        return report
+
+
+def read_recording(path):
+    '''
+    Read the events of a recording made by `RemoteExecutionRecorder`.
+    A recording that was never closed (eg, when the recording process crashed) is read up to its last complete event.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        generator: A dict for each event, with its "event" type and its "time" (in seconds since the recording started).
+    '''
+    with _gzip.open(path, 'rt', encoding='utf-8') as f:
+        while True:
+            try:
+                line = f.readline()
+            except (EOFError, _zlib.error):
+                _logger.warning('Recording "{0}" is truncated, reading the events before the truncation'.format(path))
+                return
+            if not line:
+                return
+            if not line.endswith('\n'):
+                _logger.warning('Recording "{0}" ends with a partial event, which is skipped'.format(path))
+                return
+            if line.strip():
+                event = _json.loads(line)
+                if event['event'] == EVENT_HEADER and event.get('version', RECORDING_VERSION) > RECORDING_VERSION:
+                    raise ValueError('Recording "{0}" has an unsupported version ({1})!'.format(path, event['version']))
+                yield event
+
+
+def _run_commands(runner, commands, unattended, exec_mode, **kwargs):
+    '''
+    Utility function to run a batch of commands, one at a time when the runner has no `run_commands` (eg, a RemoteExecutionSession).
+
+    Args:
+        runner (object): The object used to run commands.
+        commands (list): The commands to run.
+        unattended (bool): True to run the commands in unattended mode.
+        exec_mode (string): The execution mode of the commands.
+        **kwargs: The other arguments of `RemoteExecution.run_commands`, which are ignored when running one command at a time.
+
+    Returns:
+        generator: The results from running the remote commands, in the same order as the commands.
+    '''
+    if hasattr(runner, 'run_commands'):
+        return runner.run_commands(commands, unattended, exec_mode, False, **kwargs)
+    return (runner.run_command(command, unattended, exec_mode, False) for command in commands)
+
+
+def _results_match(recorded, replayed):
+    '''
+    Utility function to check whether a replayed command gave the same outcome as when it was recorded (its output isn't compared, as it often includes timings or paths).
+
+    Args:
+        recorded (dict): The recorded result, or None if the command raised when it was recorded.
+        replayed (dict): The replayed result.
+
+    Returns:
+        bool: True if the outcomes match.
+    '''
+    return recorded is not None and recorded['success'] == replayed['success'] and recorded['result'] == replayed['result']
+
+
+def main(argv=None):
+    parser = _argparse.ArgumentParser(description='Replay a recorded remote execution session against a local mock UE4 node or a running editor, writing a report as JSON.')
+    parser.add_argument('recording', help='Path of the recording to replay.')
+    parser.add_argument('--output', default='', help='Path of the JSON file to write (defaults to stdout).')
+    parser.add_argument('--speed', type=float, default=1.0, help='Speed to replay at relative to the recording (0 to replay as fast as possible).')
+    parser.add_argument('--mock', action='store_true', help='Replay against a local mock node, rather than the first editor discovered.')
+    parser.add_argument('--project', default='', help='Replay against the first editor discovered with this project name.')
+    args = parser.parse_args(argv)
+    _remote_execution.set_log_level('WARNING')
+    config = RemoteExecutionConfig()
+    node = None
+    if args.mock:
+        node = _remote_execution_mock.MockRemoteExecutionNode(config, {'project_name': 'Replay'})
+        node.start()
+    remote_execution = RemoteExecution(config)
+    remote_execution.start()
+    try:
+        if node is not None:
+            remote_node = remote_execution.wait_for_node(lambda remote_node: remote_node['node_id'] == node.node_id, DISCOVERY_TIMEOUT_SECONDS)
+        else:
+            remote_node = remote_execution.wait_for_node(lambda remote_node: not args.project or remote_node.get('project_name') == args.project, DISCOVERY_TIMEOUT_SECONDS)
+        if not remote_node:
+            raise RuntimeError('Failed to discover a node to replay against!')
+        remote_execution.open_command_connection(remote_node['node_id'])
+        report = RemoteExecutionReplayer(remote_execution, args.speed or None).replay(args.recording)
+    finally:
+        remote_execution.stop()
+        if node is not None:
+            node.stop()
+    json_str = _json.dumps(report, sort_keys=True, indent=4, separators=(',', ': '))
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json_str)
+    else:
+        print(json_str)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,22 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
+import io
 import os
+import sys
+import re
 import glob
+import calendar
+import time
+import hashlib
+import threading
 from os.path import basename, dirname, splitext
 from subprocess import Popen
 import json
 from functools import partial
+from concurrent import futures
+import queue
+
+import remote_execution
 
 def get_temp_path():
     p = os.path.join(os.getenv("TMP"), os.path.splitext(os.path.basename(__file__))[0])
@@ -114,7 +125,7 @@ class FBXImportSettings(object):
     def _add_group(self, setting_group):
         self.settings["ImportGroups"].append(setting_group)
 
-    def addGroup(self, group_name, files_path, destination, import_setting, is_reimport=False):
+    def addGroup(self, group_name, files_path, destination, import_setting, is_reimport=False, manifest=None):
         if not issubclass(import_setting.__class__, ImportData):
             print("import_setting input should be of class ImportSetting")
         setting_group = {
@@ -133,6 +144,10 @@ class FBXImportSettings(object):
         if is_reimport:
             setting_group["ImportSettings"]["bIsReimport"] = True
         setting_group["ImportSettings"][import_setting.__class__.__name__] = raw_setting
+        if manifest is not None:
+            setting_group["Filenames"] = manifest.getChanged(setting_group)
+            if not setting_group["Filenames"]:
+                return None
 
         self._add_group(setting_group)
         return setting_group
@@ -157,6 +172,131 @@ class FBXImportSettings(object):
             print("Failed to export setting as json")
         return filepath
 
+class ImportManifest(object):
+    """
+    Remembers the source files that have been imported (path, size, mtime and content hash), with the import settings and destination asset of each,
+    so that only new or changed files are imported again (pass the manifest to FBXImportSettings.addGroup).
+    A file whose size and mtime match the manifest isn't hashed again, and the other files are hashed in parallel.
+    Call update with the import settings once they have imported successfully, then save.
+    Pass the Content folder of the project as content_dir to also import again the files whose destination asset was deleted,
+    without it a deleted asset is only imported again once its source file or import settings change.
+    """
+    version = 1
+    hash_workers = 8
+    hash_chunk_bytes = 1048576
+
+    def __init__(self, filepath, content_dir=None):
+        """
+        /** content_dir: Content folder of the project, mapped to /Game to find the destination assets */
+        """
+        self.filepath = filepath
+        self.content_dir = content_dir
+        self.files = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+        if os.path.exists(filepath):
+            try:
+                with io.open(filepath, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.version:
+                    self.files = data["files"]
+            except Exception as why:
+                print("Failed to read import manifest {}, importing everything\n{}".format(filepath, why))
+
+    @staticmethod
+    def getKey(filepath):
+        return os.path.normcase(os.path.abspath(filepath))
+
+    @staticmethod
+    def getSettingsHash(setting_group):
+        settings = dict((key, value) for key, value in setting_group.items() if key not in ("GroupName", "Filenames"))
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def hashFile(self, filepath):
+        content_hash = hashlib.sha1()
+        with open(filepath, "rb") as f:
+            for chunk in iter(partial(f.read, self.hash_chunk_bytes), b""):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def getChanged(self, setting_group):
+        """
+        Get the files of an import group that are new, have changed, or were imported with other settings
+        """
+        settings_hash = self.getSettingsHash(setting_group)
+        files_path = list(setting_group["Filenames"])
+        executor = futures.ThreadPoolExecutor(self.hash_workers)
+        try:
+            changed = list(executor.map(partial(self._isChanged, settings_hash=settings_hash), files_path))
+        finally:
+            executor.shutdown()
+        return [filepath for filepath, is_changed in zip(files_path, changed) if is_changed]
+
+    def update(self, importsettings):
+        """
+        Record the files of import settings (filtered by getChanged) as imported
+        """
+        for setting_group in importsettings.settings["ImportGroups"]:
+            settings_hash = self.getSettingsHash(setting_group)
+            for filepath in setting_group["Filenames"]:
+                key = self.getKey(filepath)
+                with self._lock:
+                    entry = self._checked.pop(key, None)
+                    recorded = self.files.get(key)
+                if entry is None:
+                    stat = os.stat(filepath)
+                    if recorded and recorded["size"] == stat.st_size and recorded["mtime"] == stat.st_mtime:
+                        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": recorded["hash"]}
+                    else:
+                        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": self.hashFile(filepath)}
+                entry["settings"] = settings_hash
+                entry["destination"] = "{}/{}".format(setting_group["DestinationPath"].rstrip("/"), splitext(basename(filepath))[0])
+                with self._lock:
+                    self.files[key] = entry
+
+    def save(self):
+        tmp_path = self.filepath + ".tmp"
+        with self._lock:
+            data = json.dumps({"version": self.version, "files": self.files}, sort_keys=True, indent=1, ensure_ascii=False)
+        with io.open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.filepath)
+
+    def _isChanged(self, filepath, settings_hash):
+        key = self.getKey(filepath)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return True  # Let the import report the missing file
+        with self._lock:
+            recorded = self.files.get(key)
+            if recorded:
+                recorded = dict(recorded)
+        if recorded and not self.hasDestination(recorded):
+            recorded = None
+        if recorded and recorded["size"] == stat.st_size and recorded["mtime"] == stat.st_mtime:
+            return recorded["settings"] != settings_hash
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": self.hashFile(filepath)}
+        with self._lock:
+            if recorded and recorded["hash"] == entry["hash"]:
+                # Only touched, so remember the new mtime to skip hashing it next time
+                self.files[key].update(size=entry["size"], mtime=entry["mtime"])
+                return recorded["settings"] != settings_hash
+            self._checked[key] = entry
+        return True
+
+    def hasDestination(self, recorded):
+        """
+        Check that the destination asset of a recorded file still exists in the project,
+        always true without content_dir or for a destination outside of /Game
+        """
+        destination = recorded.get("destination")
+        if not self.content_dir or not destination or not destination.startswith("/Game/"):
+            return True
+        asset_path = os.path.join(self.content_dir, *destination[len("/Game/"):].split("/"))
+        return os.path.exists(asset_path + ".uasset")
+
+
 class NoEditorException(Exception):
     pass
 
@@ -260,10 +400,9 @@ class Unreal4CMD(object):
         projectfile_path = self.getProject()
         if projectfile_path:
             try:
-                from StringIO import StringIO
                 print(projectfile_path)
-                data = str.decode(open(projectfile_path, 'r').read(), encoding='utf-8-sig')
-                return json.loads(data)
+                with io.open(projectfile_path, 'r', encoding='utf-8-sig') as f:
+                    return json.loads(f.read())
             except Exception as why:
                 print("Failed to parse project {} as json!\n{}".format(projectfile_path, why))
         else:
@@ -324,7 +463,9 @@ class Unreal4CMD(object):
         custom_project_path= "",
         UserConfig = UserEngine.asConfig(),
         as_cmd= False,
-        communicate = False
+        communicate = False,
+        progress_callback = None,
+        total_frames = None
     ):
         getEditor = self.getCMD if as_cmd else self.getEditor
         editor_path = getEditor() or custom_editor_path
@@ -358,11 +499,27 @@ class Unreal4CMD(object):
         cmd.extend(argv)
         cmd.append("EDITORUSERSETTINGSINI={}".format(UserConfig))
         print("Run Unreal Editor with commands: {}".format(" ".join(cmd)))
+        tailer = None
+        if progress_callback and isinstance(log, str):
+            # Created before launching, so the log left by an earlier run isn't mistaken for this one
+            tailer = Unreal4LogTailer(self.getLogPath(log, project_path), total_frames=total_frames, callback=progress_callback)
         p = run_process_callable(cmd)
+        if tailer:
+            tailer.process = p
+            tailer.start()
+            p.log_tailer = tailer
         if run_process_callable == Popen and communicate:
             p.communicate()
+            if tailer:
+                tailer.join()
         return p
 
+    def getLogPath(self, log, project_path=""):
+        if os.path.split(log)[0]:
+            return log
+        project_path = project_path or self.getProject() or ""
+        return os.path.join(os.path.dirname(project_path), "Saved", "Logs", log)
+
     def run_render(
         self,
         map_path,
@@ -385,7 +542,10 @@ class Unreal4CMD(object):
         useburnin=False,
         write_editdecisionlist=None,
         write_finalcutxml=None,
-        log=True
+        log=True,
+        run_process_callable=Popen,
+        communicate=True,
+        progress_callback=None
     ):
         cmds = [
             "-game",
@@ -428,7 +588,20 @@ class Unreal4CMD(object):
             "r.MotionBlurSeparable=1",
             "r.MotionBlurQuality=4"
         ]
-        return self.run_editor(map_path= map_path, argv=cmds, consolevariables=console_commands, as_cmd=True, log=log, communicate=True)
+        total_frames = None
+        if end_frame:
+            total_frames = end_frame - start_frame + 1
+        if progress_callback and not isinstance(log, str):
+            log = os.path.join(get_temp_path(), "render.{}.log".format(time.strftime("%d%m%Y%H%M%S")))
+        return self.run_editor(map_path= map_path, argv=cmds, consolevariables=console_commands, as_cmd=True, log=log,
+                               run_process_callable=run_process_callable, communicate=communicate,
+                               progress_callback=progress_callback, total_frames=total_frames)
+
+    def run_render_distributed(self, map_path, sequence_path, output_folder, executor=None, chunk_frames=100, shots=None, handle_frames=8,
+                               chunk_timeout=3600, max_attempts=3, **render_kwargs):
+        orchestrator = RenderOrchestrator(self, executor, chunk_frames=chunk_frames, handle_frames=handle_frames,
+                                          chunk_timeout=chunk_timeout, max_attempts=max_attempts)
+        return orchestrator.run(map_path, sequence_path, output_folder, shots=shots, **render_kwargs)
 
     def run_python(
         self,
@@ -436,7 +609,11 @@ class Unreal4CMD(object):
         fully_initialize = False,
         log = False,
         timeout = None,
+        worker_pool = None,
     ):
+        if worker_pool:
+            return worker_pool.run_python(python_file, timeout=timeout)
+
         use_cmd = True
         cmd = ["-run=pythonscript", r"-script={}".format(python_file)]
 
@@ -451,16 +628,844 @@ class Unreal4CMD(object):
                 communicate=True
             )
 
+    def start_worker_pool(self, workers=2, **kwargs):
+        return Unreal4WorkerPool(self, workers=workers, **kwargs)
+
+    def getImportArgs(self, importsettings, use_source_control = False, submit_desc=""):
+        cmd = ["-run=ImportAssets"]
+        cmd.append(r'-importsettings="{}"'.format(importsettings))
+        cmd.append("-replaceexisting")
+        if not use_source_control:
+            cmd.append("-nosourcecontrol")
+        else:
+            if submit_desc:
+                cmd.append(r'-submitdesc="{}"'.format(submit_desc))
+        return cmd
+
     def run_import(self, importsettings, use_source_control = False, submit_desc="", log=False):
+        cmd = self.getImportArgs(importsettings, use_source_control, submit_desc)
+        self.run_editor(argv=cmd, as_cmd=True, communicate=True, log=log)
+
+    def run_import_parallel(self, importsettings, max_processes=4, shard_count=None, log_dir="", use_source_control=False, submit_desc="", run_process_callable=Popen,
+                            manifest=None):
+        scheduler = FBXImportScheduler(self, max_processes, shard_count, run_process_callable)
+        return scheduler.run(importsettings, log_dir, use_source_control, submit_desc, manifest)
+
+
+def get_process_memory(pid):
+    """
+    Resident memory of a process in bytes, or None if it can't be measured (uses psutil when it is installed)
+    """
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage"
+                )
+            ]
+
+        kernel32 = ctypes.windll.kernel32
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        handle = kernel32.OpenProcess(0x1000 | 0x0010, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_VM_READ
+        if not handle:
+            return None
         try:
-            cmd = ["-run=ImportAssets"]
-            cmd.append(r'-importsettings="{}"'.format(importsettings))
-            cmd.append("-replaceexisting")
-            if not use_source_control:
-                cmd.append("-nosourcecontrol")
-            else:
-                if submit_desc:
-                    cmd.append(r'-submitdesc="{}"'.format(submit_desc))
-        except:
-            print("OK")
-        self.run_editor(argv=cmd, as_cmd=True, communicate=True, log=log)
\ No newline at end of file
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        finally:
+            kernel32.CloseHandle(handle)
+        return None
+    try:
+        with open("/proc/{}/statm".format(pid)) as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class NoWorkerException(Exception):
+    pass
+
+
+class Unreal4Worker(object):
+    def __init__(self, process, existing_node_ids=()):
+        self.process = process
+        self.existing_node_ids = frozenset(existing_node_ids)  # Nodes discovered before this editor was launched, which can't be it
+        self.node_id = None
+        self.jobs = 0
+
+
+class Unreal4WorkerPool(object):
+    """
+    Keeps headless editors running for a project, and runs python scripts in them over remote execution,
+    rather than booting a new UE4Editor-Cmd (and scanning the asset registry) for every script.
+        workers /** Number of editors to keep running */
+        max_jobs /** Number of scripts an editor runs before it is restarted */
+        max_memory_mb /** Restart an editor after a script once it uses more memory than this */
+        startup_timeout /** Seconds to wait for a new editor to start remote execution */
+        launch_attempts /** Number of times a worker is launched (backing off between attempts) before the pool gives up on it */
+        run_process_callable /** Launches each editor from its command line (as for Unreal4CMD.run_editor), returning a Popen-like object.
+                                 This can launch a fake editor, eg: a remote_execution_mock node */
+    Scripts run with the editor state left behind by earlier scripts, so they shouldn't rely on a fresh editor.
+    Once no worker is running or being launched, scripts fail with NoWorkerException instead of waiting for startup_timeout.
+    Remote execution doesn't report which process a node is, so each editor of the project that appears while a worker is starting is probed for its process ID.
+    Editors that were already running when a worker was launched (eg, an artist's) are never contacted, but one opened while a worker is starting is probed,
+    which briefly takes over its command connection. Nothing is probed when the project has no name to match.
+    """
+    worker_args = ["-nullrhi", "-nosound", "-nopause"]
+    probe_timeout = 30
+    launch_backoff_seconds = 5  # Seconds to wait before launching a worker again, doubled after each failed attempt
+    poll_seconds = 0.5
+    discovery_seconds = 2  # Seconds to discover the editors already running before the first launch, so that they are never probed
+
+    def __init__(self, unreal4cmd, workers=2, max_jobs=50, max_memory_mb=None, startup_timeout=600, run_process_callable=Popen, log=False,
+                 launch_attempts=3):
+        self._cmd = unreal4cmd
+        self._max_jobs = max_jobs
+        self._max_memory_mb = max_memory_mb
+        self._startup_timeout = startup_timeout
+        self._launch_attempts = max(1, launch_attempts)
+        self._run_process_callable = run_process_callable
+        self._log = log
+        self._project_name = splitext(basename(unreal4cmd.getProject() or ""))[0]
+        self._workers = []
+        self._node_pids = {}
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._launch_lock = threading.Lock()
+        self._launch_threads = []
+        self._launching = 0
+        self._closed = False
+        self._remote_execution = remote_execution.RemoteExecution()
+        self._remote_execution.start()
+        self._discovered_time = time.time() + self.discovery_seconds
+        self._connections = remote_execution.RemoteExecutionPool(self._remote_execution, workers)
+        self._executor = futures.ThreadPoolExecutor(workers)
+        for _ in range(workers):
+            self._start_worker()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def workers(self):
+        with self._lock:
+            return list(self._workers)
+
+    def run_python(self, python_file, timeout=None):
+        """
+        Run a python script in the next idle editor, and return its result (see `command_result` from the remote execution protocol)
+        """
+        worker = self._acquire()
+        command = '"{}"'.format(python_file) if " " in python_file else python_file
+        try:
+            data = self._connections.run_command(worker.node_id, command, exec_mode=remote_execution.MODE_EXEC_FILE, timeout=timeout)
+        except Exception:
+            self._replace(worker)
+            raise
+        worker.jobs += 1
+        if self._should_recycle(worker):
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+        return data
+
+    def submit(self, python_file, timeout=None):
+        """
+        Queue a python script to run in the next idle editor, returning a future of its result
+        """
+        return self._executor.submit(self.run_python, python_file, timeout)
+
+    def close(self):
+        self._closed = True
+        self._executor.shutdown()
+        # Editors still being launched retire themselves once they see the pool is closed
+        with self._lock:
+            launch_threads = list(self._launch_threads)
+        for thread in launch_threads:
+            thread.join()
+        for worker in self.workers:
+            self._retire(worker)
+        self._connections.close()
+        self._remote_execution.stop()
+
+    def _acquire(self):
+        deadline = time.time() + self._startup_timeout
+        while True:
+            if self._closed:
+                raise NoWorkerException("Worker pool is closed")
+            try:
+                worker = self._idle.get(timeout=max(min(self.poll_seconds, deadline - time.time()), 0))
+            except queue.Empty:
+                with self._lock:
+                    has_workers = bool(self._workers) or self._launching > 0
+                if not has_workers:
+                    raise NoWorkerException("No editor worker is running or being launched")
+                if time.time() >= deadline:
+                    raise NoWorkerException("No editor worker became available within {}s".format(self._startup_timeout))
+                continue
+            if worker.process.poll() is None:
+                return worker
+            print("Editor worker {} exited, starting a new one".format(worker.process.pid))
+            self._replace(worker)
+
+    def _should_recycle(self, worker):
+        if self._max_jobs and worker.jobs >= self._max_jobs:
+            return True
+        if self._max_memory_mb:
+            memory = get_process_memory(worker.process.pid)
+            return memory is not None and memory > self._max_memory_mb * 1048576
+        return False
+
+    def _start_worker(self, reserved=False):
+        """
+        /** reserved: The launch was already counted in _launching (see _retire) */
+        """
+        thread = threading.Thread(target=self._launch_worker)
+        thread.daemon = True
+        with self._lock:
+            if not reserved:
+                self._launching += 1
+            self._launch_threads = [t for t in self._launch_threads if t.is_alive()] + [thread]
+        thread.start()
+
+    def _launch_worker(self):
+        try:
+            for attempt in range(self._launch_attempts):
+                if attempt:
+                    backoff_time = time.time() + self.launch_backoff_seconds * 2 ** (attempt - 1)
+                    while time.time() < backoff_time and not self._closed:
+                        time.sleep(self.poll_seconds)
+                if self._closed or self._try_launch_worker():
+                    return
+            print("Gave up launching an editor worker after {} attempts".format(self._launch_attempts))
+        finally:
+            with self._lock:
+                self._launching -= 1
+
+    def _try_launch_worker(self):
+        try:
+            # Launching rewrites the project file (see Unreal4CMD.setPlugins), so editors are launched one at a time
+            with self._launch_lock:
+                time.sleep(max(self._discovered_time - time.time(), 0))
+                existing_node_ids = [node["node_id"] for node in self._remote_execution.remote_nodes]
+                process = self._cmd.run_editor(argv=list(self.worker_args), as_cmd=True, log=self._log, run_process_callable=self._run_process_callable)
+        except Exception as why:
+            print("Failed to launch editor worker: {}".format(why))
+            return False
+        worker = Unreal4Worker(process, existing_node_ids)
+        with self._lock:
+            self._workers.append(worker)
+        worker.node_id = self._find_worker_node(worker)
+        if worker.node_id is None or self._closed:
+            if not self._closed:
+                print("Editor worker {} did not start remote execution within {}s".format(process.pid, self._startup_timeout))
+            self._retire(worker)
+            return self._closed
+        self._idle.put(worker)
+        return True
+
+    def _find_worker_node(self, worker):
+        # Remote execution doesn't report the process of a node, so each node of the project first seen after the editor was launched is asked for its process ID.
+        # Probing takes over the node's only command connection, so editors that were already running (eg, an artist's) are never probed,
+        # but one opened since the launch can't be told apart from the worker until it answers
+        process = worker.process
+        deadline = time.time() + self._startup_timeout
+        while time.time() < deadline and process.poll() is None and not self._closed:
+            for node in self._remote_execution.remote_nodes:
+                if node["node_id"] in worker.existing_node_ids:
+                    continue
+                if self._get_node_pid(node) == process.pid:
+                    return node["node_id"]
+            time.sleep(0.5)
+        return None
+
+    def _get_node_pid(self, node):
+        if not self._project_name or node.get("project_name") != self._project_name:
+            return None
+        node_id = node["node_id"]
+        with self._lock:
+            if node_id in self._node_pids:
+                return self._node_pids[node_id]
+            self._node_pids[node_id] = None
+        try:
+            data = self._connections.run_command(node_id, "__import__('os').getpid()", exec_mode=remote_execution.MODE_EVAL_STATEMENT,
+                                                 raise_on_failure=True, timeout=self.probe_timeout)
+            pid = int(data["result"])
+        except Exception as why:
+            print("Failed to query editor {}: {}".format(node_id, why))
+            with self._lock:
+                del self._node_pids[node_id]
+            return None
+        with self._lock:
+            self._node_pids[node_id] = pid
+            is_worker = any(worker.process.pid == pid for worker in self._workers)
+        if not is_worker:
+            self._connections.close_command_connection(node_id)
+        return pid
+
+    def _replace(self, worker):
+        if self._retire(worker, replace=not self._closed):
+            self._start_worker(reserved=True)
+
+    def _retire(self, worker, replace=False):
+        """
+        Stop a worker, returning whether it was still in the pool
+            replace /** Count the launch of its replacement at once, so the pool never looks empty in between */
+        """
+        with self._lock:
+            if worker not in self._workers:
+                return False
+            self._workers.remove(worker)
+            if replace:
+                self._launching += 1
+        if worker.node_id:
+            self._connections.close_command_connection(worker.node_id)
+        if worker.process.poll() is None:
+            worker.process.terminate()
+            try:
+                worker.process.wait(30)
+            except Exception:
+                worker.process.kill()
+        return True
+
+
+
+class FBXImportScheduler(object):
+    """
+    Splits the import groups of FBXImportSettings into shards of about equal weight, and imports them with parallel ImportAssets commandlets.
+        max_processes /** Number of commandlets to run at once */
+        shard_count /** Number of shards to split each phase into (defaults to max_processes) */
+        run_process_callable /** Launches each commandlet from its command line (as for Unreal4CMD.run_editor), returning a Popen-like object */
+    Each file is weighted by its size (plus a fixed cost per file), scaled by the kind of asset it imports as (kind_weights).
+    Groups are split by file, so one large group can be spread over several shards.
+    Animation groups need the skeletons they target, so animation shards run only once every skeletal mesh shard has finished, and are skipped if any of them failed.
+    """
+    kind_weights = {
+        "SkeletalMeshImportData": 2.0,
+        "AnimSequenceImportData": 1.5,
+        "StaticMeshImportData": 1.0,
+        "TextureImportData": 0.25,
+    }
+    file_overhead_bytes = 1048576
+    poll_seconds = 0.5
+
+    def __init__(self, unreal4cmd, max_processes=4, shard_count=None, run_process_callable=Popen):
+        self._cmd = unreal4cmd
+        self._max_processes = max(1, max_processes)
+        self._shard_count = shard_count or self._max_processes
+        self._run_process_callable = run_process_callable
+
+    @staticmethod
+    def getGroupKind(setting_group):
+        for kind in ("AnimSequenceImportData", "SkeletalMeshImportData", "StaticMeshImportData", "TextureImportData"):
+            if kind in setting_group.get("ImportSettings", {}):
+                return kind
+        return "StaticMeshImportData"
+
+    def getFileWeight(self, filepath, kind):
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            size = 0
+        return (size + self.file_overhead_bytes) * self.kind_weights.get(kind, 1.0)
+
+    def split(self, importsettings):
+        """
+        Split the import groups into shards, returning the shards of each phase
+        (a list per phase of dicts, with the "importsettings" of the shard, its total "weight" and the "kinds" of asset it imports)
+        """
+        phases = [[], []]
+        items = [[], []]
+        for setting_group in importsettings.settings["ImportGroups"]:
+            kind = self.getGroupKind(setting_group)
+            phase = 1 if kind == "AnimSequenceImportData" else 0
+            for filepath in setting_group["Filenames"]:
+                items[phase].append((self.getFileWeight(filepath, kind), filepath, setting_group))
+        for phase, phase_items in enumerate(items):
+            # Longest processing time first: the heaviest remaining file goes to the lightest shard
+            bins = [[0, []] for _ in range(min(self._shard_count, len(phase_items)))]
+            for weight, filepath, setting_group in sorted(phase_items, key=lambda item: -item[0]):
+                lightest = min(bins, key=lambda b: b[0])
+                lightest[0] += weight
+                lightest[1].append((filepath, setting_group))
+            for weight, files in bins:
+                shard = {"importsettings": FBXImportSettings(), "weight": weight, "kinds": set()}
+                for filepath, setting_group in files:
+                    shard_group = shard["importsettings"].getGroup(setting_group["GroupName"])
+                    if shard_group is None:
+                        shard_group = dict(setting_group, Filenames=[])
+                        shard["importsettings"]._add_group(shard_group)
+                        shard["kinds"].add(self.getGroupKind(setting_group))
+                    shard_group["Filenames"].append(filepath)
+                phases[phase].append(shard)
+        return phases
+
+    def run(self, importsettings, log_dir="", use_source_control=False, submit_desc="", manifest=None):
+        """
+        Import every group, returning a report of each shard and the merged log
+            importsettings /** FBXImportSettings, or the path of its json file */
+            manifest /** ImportManifest to record the files of each successful shard in (and save) */
+        """
+        if not isinstance(importsettings, FBXImportSettings):
+            with io.open(importsettings, "r", encoding="utf-8-sig") as f:
+                settings = json.load(f)
+            importsettings = FBXImportSettings()
+            importsettings.settings = settings
+        log_dir = log_dir or os.path.join(get_temp_path(), "import.{}".format(time.strftime("%d%m%Y%H%M%S")))
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        start_time = time.time()
+        shards = []
+        shard_settings = []
+        for phase, phase_shards in enumerate(self.split(importsettings)):
+            for shard in phase_shards:
+                index = len(shards)
+                shard_settings.append(shard["importsettings"])
+                shards.append({
+                    "index": index,
+                    "phase": phase,
+                    "kinds": sorted(shard["kinds"]),
+                    "files": sum(len(setting_group["Filenames"]) for setting_group in shard["importsettings"].settings["ImportGroups"]),
+                    "weight": shard["weight"],
+                    "settings": shard["importsettings"].asJson(os.path.join(log_dir, "shard{}.json".format(index))),
+                    "log": os.path.join(log_dir, "shard{}.log".format(index)),
+                })
+
+        pending = list(shards)
+        running = []
+        while pending or running:
+            for shard in list(running):
+                if shard["process"].poll() is not None:
+                    shard["returncode"] = shard.pop("process").returncode
+                    shard["seconds"] = time.time() - shard["start_time"]
+                    running.remove(shard)
+            skeletons_pending = any("SkeletalMeshImportData" in shard["kinds"] for shard in pending + running)
+            skeletons_failed = any("SkeletalMeshImportData" in shard["kinds"] and shard.get("returncode", 0) != 0 for shard in shards if shard["phase"] == 0)
+            while pending and len(running) < self._max_processes:
+                if pending[0]["phase"] == 1 and skeletons_pending:
+                    break
+                shard = pending.pop(0)
+                if shard["phase"] == 1 and skeletons_failed:
+                    # The skeletons the animations target may be missing, so importing them would only fail (or import them unskinned)
+                    shard["returncode"] = None
+                    shard["skipped"] = True
+                    continue
+                argv = self._cmd.getImportArgs(shard["settings"], use_source_control, submit_desc)
+                shard["start_time"] = time.time()
+                shard["process"] = self._cmd.run_editor(argv=argv, as_cmd=True, log=shard["log"], run_process_callable=self._run_process_callable)
+                running.append(shard)
+            if running:
+                time.sleep(self.poll_seconds)
+
+        merged_log = os.path.join(log_dir, "import.log")
+        with io.open(merged_log, "w", encoding="utf-8") as merged:
+            for shard in shards:
+                shard["errors"] = []
+                shard["warnings"] = 0
+                shard.pop("start_time", None)
+                if shard.get("skipped"):
+                    merged.write(u"==== Shard {} ({} files, skipped as a skeletal mesh shard failed) ====\n".format(shard["index"], shard["files"]))
+                    continue
+                merged.write(u"==== Shard {} ({} files, exit code {}) ====\n".format(shard["index"], shard["files"], shard["returncode"]))
+                if not os.path.exists(shard["log"]):
+                    continue
+                with io.open(shard["log"], "r", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        merged.write(line)
+                        if "Error:" in line:
+                            shard["errors"].append(line.strip())
+                        elif "Warning:" in line:
+                            shard["warnings"] += 1
+
+        if manifest is not None:
+            for shard, settings in zip(shards, shard_settings):
+                if shard["returncode"] == 0 and not shard["errors"]:
+                    manifest.update(settings)
+            manifest.save()
+
+        return {
+            "succeeded": all(shard["returncode"] == 0 and not shard["errors"] for shard in shards),
+            "seconds": time.time() - start_time,
+            "log": merged_log,
+            "shards": shards,
+        }
+
+
+
+class LocalRenderExecutor(object):
+    """
+    Runs render chunks as processes on this machine
+        processes /** Number of chunks to render at once */
+    An executor has a slot for each chunk it can render at once, and launches a chunk's command line on a slot, returning a Popen-like object.
+    """
+    def __init__(self, processes=2):
+        self.slots = list(range(processes))
+
+    def launch(self, slot, cmd):
+        return Popen(cmd)
+
+
+class HostRenderExecutor(object):
+    """
+    Runs render chunks on other machines through a remote shell (eg, ssh), one chunk per host at a time.
+    The editor, project and output folder must be at the same paths on every host (eg, on a shared drive).
+    """
+    def __init__(self, hosts, remote_shell=("ssh",)):
+        self.slots = list(hosts)
+        self._remote_shell = list(remote_shell)
+
+    def launch(self, slot, cmd):
+        return Popen(self._remote_shell + [slot] + list(cmd))
+
+
+class RenderOrchestrator(object):
+    """
+    Renders a LevelSequence in chunks across the slots of an executor, then stitches the frames of every chunk into one sequence in the output folder.
+        chunk_frames /** Number of frames per chunk, when splitting the frame range */
+        handle_frames /** Extra frames rendered (then discarded) before each chunk, so effects that depend on earlier frames (motion blur, temporal AA, particles) match an unchunked render */
+        chunk_timeout /** Seconds a chunk may take before it is stopped and rendered again */
+        max_attempts /** Number of times a chunk is rendered before the render fails */
+    A chunk whose process dies (or exits without all of its frames) is rendered again, on another slot when there is one.
+    Chunks are split from the frame range, or are one per shot when shots are given. Video output can't be stitched, so image formats must be used.
+    Each attempt renders into its own folder, so a stopped chunk that is still running on a remote host can't mix its frames with the next attempt's.
+    """
+    poll_seconds = 1.0
+
+    def __init__(self, unreal4cmd, executor=None, chunk_frames=100, handle_frames=8, chunk_timeout=3600, max_attempts=3):
+        self._cmd = unreal4cmd
+        self._executor = executor or LocalRenderExecutor()
+        self._chunk_frames = max(1, chunk_frames)
+        self._handle_frames = max(0, handle_frames)
+        self._chunk_timeout = chunk_timeout
+        self._max_attempts = max_attempts
+
+    def split(self, start_frame, end_frame, shots=None):
+        if shots:
+            return [{"index": index, "shot": shot, "start": None, "end": None, "capture_start": None} for index, shot in enumerate(shots)]
+        if end_frame <= start_frame:
+            raise ValueError("Distributed rendering needs a frame range (end_frame {} isn't after start_frame {})".format(end_frame, start_frame))
+        chunks = []
+        for chunk_start in range(start_frame, end_frame + 1, self._chunk_frames):
+            chunks.append({
+                "index": len(chunks),
+                "shot": None,
+                "start": chunk_start,
+                "end": min(chunk_start + self._chunk_frames - 1, end_frame),
+                "capture_start": max(start_frame, chunk_start - self._handle_frames),
+            })
+        return chunks
+
+    def run(self, map_path, sequence_path, output_folder, start_frame=0, end_frame=0, shots=None, output_name=r"Render.{frame}",
+            output_format=RenderOutputFormat.PNG, **render_kwargs):
+        """
+        Render every chunk and stitch their frames into output_folder (which must be absolute), returning a report of each chunk
+        """
+        if output_format == RenderOutputFormat.Video:
+            raise ValueError("Distributed rendering can't stitch video, render an image format instead")
+        if shots and "{shot}" not in output_name:
+            raise ValueError("Rendering shots needs {shot} in output_name, or the frames of each shot would overwrite each other")
+        chunks = self.split(start_frame, end_frame, shots)
+        chunks_folder = os.path.join(output_folder, "_chunks")
+        start_time = time.time()
+
+        pending = list(chunks)
+        running = {}
+        for chunk in chunks:
+            chunk["attempts"] = 0
+            chunk["failed_slots"] = []
+        while pending or running:
+            for slot, chunk in list(running.items()):
+                process = chunk["process"]
+                timed_out = self._chunk_timeout and time.time() - chunk["start_time"] > self._chunk_timeout
+                if process.poll() is None and not timed_out:
+                    continue
+                del running[slot]
+                if process.poll() is None:
+                    process.terminate()
+                    process.wait()
+                chunk.pop("process")
+                chunk["returncode"] = process.returncode
+                chunk["seconds"] = time.time() - chunk["start_time"]
+                chunk["frames"] = self._getChunkFrames(chunk)
+                if not timed_out and process.returncode == 0 and self._isComplete(chunk):
+                    continue
+                print("Render chunk {} failed on {} (exit code {}{})".format(chunk["index"], slot, process.returncode, ", timed out" if timed_out else ""))
+                chunk["failed_slots"].append(slot)
+                if chunk["attempts"] >= self._max_attempts:
+                    for other in running.values():
+                        other["process"].terminate()
+                    raise RuntimeError("Render chunk {} failed {} times".format(chunk["index"], chunk["attempts"]))
+                pending.insert(0, chunk)
+
+            for slot in self._executor.slots:
+                if not pending:
+                    break
+                if slot in running:
+                    continue
+                # Prefer a chunk that hasn't already failed on this slot
+                chunk = next((c for c in pending if slot not in c["failed_slots"]), pending[0])
+                pending.remove(chunk)
+                running[slot] = chunk
+                self._launch(chunk, slot, map_path, sequence_path, chunks_folder, output_name, output_format, render_kwargs)
+            if running:
+                time.sleep(self.poll_seconds)
+
+        frames = self._stitch(chunks, output_folder, output_name)
+        return {
+            "seconds": time.time() - start_time,
+            "output_folder": output_folder,
+            "frames": frames,
+            "chunks": [dict((key, value) for key, value in chunk.items() if key not in ("start_time", "frames")) for chunk in chunks],
+        }
+
+    def _getChunkFolder(self, chunks_folder, chunk):
+        return os.path.join(chunks_folder, "chunk{}.{}".format(chunk["index"], chunk["attempts"]))
+
+    def _launch(self, chunk, slot, map_path, sequence_path, chunks_folder, output_name, output_format, render_kwargs):
+        chunk["attempts"] += 1
+        chunk["slot"] = slot
+        chunk["folder"] = self._getChunkFolder(chunks_folder, chunk)
+        if os.path.exists(chunk["folder"]):
+            # Left by an earlier run, whose frames would be mistaken for this attempt's frames
+            for filename in os.listdir(chunk["folder"]):
+                os.remove(os.path.join(chunk["folder"], filename))
+        else:
+            os.makedirs(chunk["folder"])
+        kwargs = dict(render_kwargs, output_folder=chunk["folder"], output_name=output_name, output_format=output_format, communicate=False,
+                      log=os.path.join(chunk["folder"], "render.log"), run_process_callable=partial(self._executor.launch, slot))
+        if chunk["shot"]:
+            kwargs["shot"] = chunk["shot"]
+        else:
+            kwargs["start_frame"] = chunk["capture_start"]
+            kwargs["end_frame"] = chunk["end"]
+        chunk["start_time"] = time.time()
+        chunk["process"] = self._cmd.run_render(map_path, sequence_path, **kwargs)
+
+    @staticmethod
+    def _getChunkFrames(chunk):
+        frames = []
+        for filename in os.listdir(chunk["folder"]):
+            if filename.endswith(".log"):
+                continue
+            numbers = re.findall(r"\d+", filename)
+            if numbers:
+                frames.append((int(numbers[-1]), filename))
+        return [filename for number, filename in sorted(frames)]
+
+    @staticmethod
+    def _isComplete(chunk):
+        if chunk["shot"]:
+            return bool(chunk["frames"])
+        return len(chunk["frames"]) >= chunk["end"] - chunk["capture_start"] + 1
+
+    def _stitch(self, chunks, output_folder, output_name):
+        frames = 0
+        for chunk in chunks:
+            if chunk["shot"]:
+                # Shots are named by the render itself, with {shot} in output_name
+                for filename in chunk["frames"]:
+                    os.replace(os.path.join(chunk["folder"], filename), os.path.join(output_folder, filename))
+                    frames += 1
+                continue
+            # The frames are numbered from wherever the capture started, so they're matched up by order, dropping the handle frames
+            handle_count = chunk["start"] - chunk["capture_start"]
+            for frame, filename in enumerate(chunk["frames"][handle_count:handle_count + chunk["end"] - chunk["start"] + 1], chunk["start"]):
+                extension = splitext(filename)[1]
+                target = output_name.replace("{frame}", "{:04d}".format(frame)) + extension
+                os.replace(os.path.join(chunk["folder"], filename), os.path.join(output_folder, target))
+                frames += 1
+        return frames
+
+
+
+class Unreal4LogTailer(object):
+    """
+    Follows an editor log (ABSLOG/LOG) as it is written, parsing frame captures, shader compiles, errors and warnings into events,
+    and keeping live progress stats (see stats).
+        total_frames /** Number of frames being rendered, for the ETA */
+        callback /** Called from the tailer thread (see start) with each event and the stats */
+        process /** Popen-like object writing the log: following stops once it has exited and the log is read to the end */
+    The log is polled, reading only what was appended since the last poll (UE runs on Windows, so there is no inotify to wait on).
+    A log that already exists when the tailer is created is skipped until it is replaced, as UE moves the previous log aside on startup
+    (pass skip_existing=False to follow the log of an editor that is already running).
+    Each event is a dict with its "type" (frame, shader, error or warning), "time" and "line", and "frame" or "shaders_remaining" for those types.
+    """
+    frame_pattern = re.compile(r"LogMovieSceneCapture.*?\bframe\b\D*(\d+)", re.IGNORECASE)
+    shader_pattern = re.compile(r"LogShaderCompilers.*?(?:shaders left to compile|compiling) (\d+)", re.IGNORECASE)
+    error_pattern = re.compile(r": (?:Error|Fatal error): ")
+    warning_pattern = re.compile(r": Warning: ")
+    timestamp_pattern = re.compile(r"^\[(\d{4})\.(\d{2})\.(\d{2})-(\d{2})\.(\d{2})\.(\d{2}):(\d{3})\]")
+    fps_window = 30
+    poll_seconds = 0.25
+
+    def __init__(self, log_path, total_frames=None, callback=None, process=None, skip_existing=True):
+        self.log_path = log_path
+        self.total_frames = total_frames
+        self.callback = callback
+        self.process = process
+        self.frame_seconds = []
+        self._frame_times = []
+        self._frames = set()
+        self._shaders_remaining = None
+        self._errors = []
+        self._warnings = 0
+        self._last_progress_time = time.time()
+        self._offset = 0
+        self._partial = b""
+        self._inode = None
+        self._stale = self._getIdentity() if skip_existing else None
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def stats(self):
+        """
+        Live progress: frames captured, fps (over the last fps_window frames), eta (seconds), last_frame_seconds,
+        shaders_remaining, errors, warnings and seconds_since_progress (to spot stuck renders)
+        """
+        fps = None
+        if len(self._frame_times) > 1 and self._frame_times[-1] > self._frame_times[0]:
+            fps = (len(self._frame_times) - 1) / (self._frame_times[-1] - self._frame_times[0])
+        eta = None
+        if fps and self.total_frames:
+            eta = max(0, self.total_frames - len(self._frames)) / fps
+        return {
+            "frames": len(self._frames),
+            "total_frames": self.total_frames,
+            "fps": fps,
+            "eta": eta,
+            "last_frame_seconds": self.frame_seconds[-1] if self.frame_seconds else None,
+            "shaders_remaining": self._shaders_remaining,
+            "errors": len(self._errors),
+            "warnings": self._warnings,
+            "seconds_since_progress": time.time() - self._last_progress_time,
+        }
+
+    @property
+    def errors(self):
+        return list(self._errors)
+
+    def follow(self):
+        """
+        Iterate the events of the log as they are written, until stopped or the process has exited
+        """
+        while True:
+            finished = self._stopped or (self.process is not None and self.process.poll() is not None)
+            for event in self.poll():
+                yield event
+            if finished:
+                # One last poll after the process exited picks up its final lines
+                return
+            time.sleep(self.poll_seconds)
+
+    def poll(self):
+        """
+        Read what was appended to the log since the last poll, returning its events
+        """
+        identity = self._getIdentity()
+        if identity is None or identity == self._stale:
+            return []
+        self._stale = None
+        inode, size = identity[0], identity[1]
+        if inode != self._inode or size < self._offset:
+            # Replaced (even by a log that has grown past the offset) or truncated, so start again from the beginning
+            self._inode = inode
+            self._offset = 0
+            self._partial = b""
+        if size == self._offset:
+            return []
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        self._offset += len(data)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        events = []
+        for line in lines:
+            event = self.parse(line.decode("utf-8", "replace").lstrip(u"\ufeff").rstrip())
+            if event:
+                events.append(event)
+                if self.callback:
+                    self.callback(event, self.stats)
+        return events
+
+    def parse(self, line):
+        """
+        Parse a log line into an event (updating the stats), or None if it isn't one
+        """
+        event_time = self._getLineTime(line)
+        match = self.frame_pattern.search(line)
+        if match:
+            frame = int(match.group(1))
+            if frame in self._frames:
+                return None
+            if self._frame_times:
+                self.frame_seconds.append(event_time - self._frame_times[-1])
+            self._frames.add(frame)
+            self._frame_times = (self._frame_times + [event_time])[-self.fps_window:]
+            self._last_progress_time = time.time()
+            return {"type": "frame", "time": event_time, "line": line, "frame": frame}
+        match = self.shader_pattern.search(line)
+        if match:
+            self._shaders_remaining = int(match.group(1))
+            self._last_progress_time = time.time()
+            return {"type": "shader", "time": event_time, "line": line, "shaders_remaining": self._shaders_remaining}
+        if self.error_pattern.search(line):
+            self._errors.append(line)
+            return {"type": "error", "time": event_time, "line": line}
+        if self.warning_pattern.search(line):
+            self._warnings += 1
+            return {"type": "warning", "time": event_time, "line": line}
+        return None
+
+    def start(self):
+        """
+        Follow the log from a background thread, reporting each event to the callback
+        """
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self.join()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        for _ in self.follow():
+            pass
+
+    def _getIdentity(self):
+        try:
+            stat = os.stat(self.log_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+    def _getLineTime(self, line):
+        # UE stamps each line with the time it was logged (in UTC by default), which is more accurate than when the line was read
+        match = self.timestamp_pattern.match(line)
+        if not match:
+            return time.time()
+        year, month, day, hour, minute, second, millisecond = (int(value) for value in match.groups())
+        return calendar.timegm((year, month, day, hour, minute, second)) + millisecond / 1000.0